@@ -0,0 +1,396 @@
+"""Render the GUI's sweep animation offscreen to a GIF or video file, frame by frame.
+
+The same timeline and cell colors as MorphologicalGUI are replayed into numpy
+frames, which are quantized to a palette and streamed to the encoder one at a
+time, so no display is needed and memory does not grow with the length of
+the animation. GIFs are written by a small built-in encoder; other
+extensions go through OpenCV's VideoWriter, which is only imported then.
+
+Example:
+    python animation.py text:A assets/erosion.gif --operation Erosion --size 300 300
+    python animation.py mask.npy opening.mp4 --operation Opening --structure cross:5 --fps 60
+"""
+import argparse
+import functools
+import math
+import os
+import sys
+
+import numpy as np
+
+import engine
+import grayscale
+import structures
+
+
+# Seconds a cell takes to fade to its new state
+FADE_DURATION = 0.05
+
+GRID_LINE_COLOR = (128, 128, 128)  # Qt's "gray"
+
+# Cells smaller than this many pixels are drawn without borders
+MIN_GRID_LINE_CELL = 6
+
+
+def sweep_timeline(input_grid, result, structure_shape, duration):
+    """(start times, rows, cols) of every cell the sweep changes, sorted by time
+
+    A cell starts fading when the raster-order sweep first covers it with
+    the element's window; only positions where some cell starts are kept,
+    spread evenly over duration, so the sweep takes the same time on any
+    grid and never waits on positions with nothing to show.
+    """
+    cols = np.shape(input_grid)[1]
+    half_row, half_col = np.array(structure_shape) // 2
+    changed_rows, changed_cols = np.nonzero(np.asarray(input_grid) != np.asarray(result))
+    positions = (np.maximum(changed_rows - half_row, 0) * cols
+                 + np.maximum(changed_cols - half_col, 0))
+    order = np.argsort(positions, kind="stable")
+    unique_positions, ranks = np.unique(positions[order], return_inverse=True)
+    times = duration * (ranks + 1) / max(len(unique_positions), 1)
+    return times, changed_rows[order], changed_cols[order]
+
+
+def cell_colors(state, levels, processing=None, target_state=None, progress=None):
+    """0xAARRGGBB color of every cell; processing cells blend towards target_state"""
+    # Level 0 is white and the top level black
+    top = levels - 1
+    intensity = 255 - state.astype(np.uint32) * 255 // top
+    rgb = np.repeat(intensity[..., None], 3, axis=2)
+
+    if processing is not None and processing.any():
+        fraction = progress[processing].astype(np.float64)
+        start = intensity[processing].astype(np.float64)
+        end = 255 - target_state[processing].astype(np.float64) * 255 / top
+        # Transitioning to darker blends with blue, to lighter with orange
+        gray = start + (end - start) * fraction
+        highlight = np.where((end < start)[:, None], [0, 100, 255], [255, 100, 0])
+        blend = (np.abs(np.sin(fraction * math.pi)) * 0.5)[:, None]
+        rgb[processing] = (gray[:, None] * (1 - blend) + highlight * blend).astype(np.uint32)
+
+    return 0xFF000000 | (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def levels_for(grid):
+    """Intensity levels the GUI would use for a grid of this dtype"""
+    grid = np.asarray(grid)
+    if grid.dtype == bool or grid.max(initial=0) <= 1:
+        return 2
+    if grid.dtype.kind == "u":
+        return int(np.iinfo(grid.dtype).max) + 1
+    return 65536 if grid.max() > 255 else 256
+
+
+def sweep_frames(input_grid, structure, operation, fps=30, duration=0.5, hold=1.0, levels=None):
+    """Yield the result grid's cell colors frame by frame, as the GUI shows them
+
+    The display starts from the input, replays the timeline at a fixed
+    1 / fps step, and stays on the final result for hold seconds.
+    """
+    levels = levels or levels_for(input_grid)
+    dtype = grayscale.dtype_for_levels(levels)
+    input_grid = np.clip(input_grid, 0, levels - 1).astype(dtype)
+    structure = np.asarray(structure) != 0
+    if levels == 2:
+        result = engine.apply_operation(input_grid, structure, operation)
+    else:
+        result = grayscale.apply_operation(input_grid, structure, operation)
+    times, rows, cols = sweep_timeline(input_grid, result, structure.shape, duration)
+
+    state = input_grid.copy()
+    target_state = np.zeros_like(state)
+    processing = np.zeros(state.shape, dtype=bool)
+    progress = np.zeros(state.shape, dtype=np.float32)
+    step = 1.0 / fps
+    sweep_time = 0.0
+    index = 0
+    yield cell_colors(state, levels)
+    while index < len(times) or processing.any():
+        sweep_time += step
+        end = int(np.searchsorted(times, sweep_time, side="right"))
+        if end > index:
+            started = rows[index:end], cols[index:end]
+            processing[started] = True
+            target_state[started] = result[started]
+            progress[started] = 0.0
+            index = end
+        progress[processing] += step / FADE_DURATION
+        done = processing & (progress >= 1.0)
+        state[done] = target_state[done]
+        progress[done] = 0.0
+        processing[done] = False
+        yield cell_colors(state, levels, processing, target_state, progress)
+    state[:] = result
+    final = cell_colors(state, levels)
+    for _ in range(int(round(hold * fps))):
+        yield final
+
+
+def palette_colors(name):
+    """(256, 3) uint8 RGB palette: "color" or "gray" """
+    if name == "gray":
+        return np.repeat(np.arange(256, dtype=np.uint8)[:, None], 3, axis=1)
+    if name == "color":
+        # 6x6x6 color cube plus 40 extra grays for the grayscale levels
+        steps = np.arange(6) * 51
+        cube = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1).reshape(-1, 3)
+        grays = np.linspace(0, 255, 42)[1:-1].round()
+        return np.concatenate([cube, np.repeat(grays[:, None], 3, axis=1)]).astype(np.uint8)
+    raise ValueError(f"unknown palette: {name!r}")
+
+
+PALETTES = ("color", "gray")
+
+
+def _cv2():
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError("video output and image input need OpenCV (opencv-python)") from None
+    return cv2
+
+
+@functools.lru_cache(maxsize=None)
+def _palette_array(name):
+    return palette_colors(name).astype(np.int32)
+
+
+def quantize(colors, palette="color"):
+    """Nearest palette index of every 0xAARRGGBB color
+
+    Frames hold few distinct colors, so only those are matched against the
+    palette.
+    """
+    unique, inverse = np.unique(colors, return_inverse=True)
+    rgb = np.stack([(unique >> 16) & 0xFF, (unique >> 8) & 0xFF, unique & 0xFF], axis=-1)
+    if palette == "gray":
+        indices = (rgb @ np.array([299, 587, 114]) + 500) // 1000
+    else:
+        difference = rgb[:, None, :].astype(np.int32) - _palette_array(palette)[None, :, :]
+        indices = np.argmin((difference * difference).sum(axis=2), axis=1)
+    return indices.astype(np.uint8)[inverse.reshape(colors.shape)]
+
+
+def frame_pixels(indices, size, grid_lines=True):
+    """Scale a rows x cols index grid to a size = (width, height) image
+
+    Cells are stretched with nearest-neighbour sampling; like the widget,
+    borders are only drawn when cells are large enough to show them, using
+    grid_lines as the palette index of the border color.
+    """
+    width, height = size
+    rows, cols = indices.shape
+    row_of = np.arange(height) * rows // height
+    col_of = np.arange(width) * cols // width
+    pixels = indices[row_of[:, None], col_of[None, :]]
+    if grid_lines is not None and min(height / rows, width / cols) >= MIN_GRID_LINE_CELL:
+        pixels[np.flatnonzero(np.diff(row_of, prepend=-1))] = grid_lines
+        pixels[:, np.flatnonzero(np.diff(col_of, prepend=-1))] = grid_lines
+        pixels[-1] = grid_lines
+        pixels[:, -1] = grid_lines
+    return pixels
+
+
+def _lzw_encode(data, min_code_size=8):
+    """GIF flavoured LZW of a bytes object, as the sub-block payload"""
+    clear = 1 << min_code_size
+    stop = clear + 1
+    output = bytearray()
+    buffer = bits = 0
+
+    def emit(code):
+        nonlocal buffer, bits
+        buffer |= code << bits
+        bits += code_size
+        while bits >= 8:
+            output.append(buffer & 0xFF)
+            buffer >>= 8
+            bits -= 8
+
+    code_size = min_code_size + 1
+    table = {}
+    next_code = stop + 1
+    emit(clear)
+    prefix = data[0] if data else None
+    for value in data[1:]:
+        key = (prefix, value)
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        emit(prefix)
+        if next_code == 4096:
+            # Table full: start over with single-byte codes
+            emit(clear)
+            table.clear()
+            code_size = min_code_size + 1
+            next_code = stop + 1
+        else:
+            table[key] = next_code
+            if next_code == 1 << code_size:
+                code_size += 1
+            next_code += 1
+        prefix = value
+    if prefix is not None:
+        emit(prefix)
+    emit(stop)
+    if bits:
+        output.append(buffer & 0xFF)
+    return bytes(output)
+
+
+class GifWriter:
+    """Animated GIF written one frame at a time
+
+    Only the bounding box of the pixels that changed since the previous
+    frame is stored, and runs of identical frames become one longer frame.
+    Only the pending frame is held in memory. GIF delays are hundredths of a
+    second, so fps above 50 plays slower in most viewers.
+    """
+
+    def __init__(self, path, size, fps, palette="color", loop=0):
+        self.size = size
+        self.fps = fps
+        self.handle = open(path, "wb")
+        self.previous = None
+        self.pending = None
+        self.frames = 0
+        self.written_time = 0
+        width, height = size
+        self.handle.write(b"GIF89a")
+        # Global color table of 256 entries (size field 7), no background
+        self.handle.write(np.array([width, height], "<u2").tobytes() + bytes([0xF7, 0, 0]))
+        self.handle.write(palette_colors(palette).tobytes())
+        # NETSCAPE2.0 extension: loop count, 0 loops forever
+        self.handle.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01"
+                          + np.array([loop], "<u2").tobytes() + b"\x00")
+
+    def write(self, pixels):
+        self.frames += 1
+        if self.previous is not None:
+            changed = pixels != self.previous
+            if not changed.any():
+                return
+            rows = np.flatnonzero(changed.any(axis=1))
+            cols = np.flatnonzero(changed.any(axis=0))
+            box = (rows[0], cols[0], rows[-1] + 1, cols[-1] + 1)
+        else:
+            box = (0, 0) + pixels.shape
+        self._flush()
+        self.pending = (self.frames - 1, box, pixels)
+        self.previous = pixels
+
+    def _flush(self):
+        """Write the pending frame, shown until the current one"""
+        if self.pending is None:
+            return
+        _, (top, left, bottom, right), pixels = self.pending
+        # Delays are rounded on the running total so the average frame rate stays exact
+        end_time = int(round((self.frames - 1) * 100 / self.fps))
+        delay = max(1, end_time - self.written_time)
+        self.written_time += delay
+        # Graphic control extension: keep the previous frame under this one
+        self.handle.write(b"\x21\xF9\x04\x04" + np.array([delay], "<u2").tobytes() + b"\x00\x00")
+        self.handle.write(b"\x2C" + np.array([left, top, right - left, bottom - top], "<u2").tobytes()
+                          + b"\x00\x08")
+        data = _lzw_encode(np.ascontiguousarray(pixels[top:bottom, left:right]).tobytes())
+        for start in range(0, len(data), 255):
+            block = data[start : start + 255]
+            self.handle.write(bytes([len(block)]) + block)
+        self.handle.write(b"\x00")
+        self.pending = None
+
+    def close(self):
+        self.frames += 1
+        self._flush()
+        self.handle.write(b"\x3B")
+        self.handle.close()
+
+
+class VideoWriter:
+    """Video file through OpenCV; the codec follows the file extension"""
+
+    fourccs = {".mp4": "mp4v", ".avi": "MJPG", ".mkv": "mp4v", ".mov": "mp4v"}
+
+    def __init__(self, path, size, fps, palette="color"):
+        cv2 = _cv2()
+        codec = self.fourccs.get(os.path.splitext(path)[1].lower(), "mp4v")
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, tuple(size))
+        if not self.writer.isOpened():
+            raise RuntimeError(f"OpenCV cannot write {path}")
+        # Palette as BGR, so frames stay identical to the GIF output
+        self.colors = np.ascontiguousarray(palette_colors(palette)[:, ::-1])
+
+    def write(self, pixels):
+        self.writer.write(self.colors[pixels])
+
+    def close(self):
+        self.writer.release()
+
+
+def open_writer(path, size, fps, palette="color"):
+    if path.lower().endswith(".gif"):
+        return GifWriter(path, size, fps, palette)
+    return VideoWriter(path, size, fps, palette)
+
+
+def render_animation(input_grid, structure, operation, path, size=(300, 300), fps=30,
+                     duration=0.5, hold=1.0, palette="color", levels=None, grid_lines=True):
+    """Write the sweep animation of operation on input_grid to path; returns the frame count"""
+    line_index = None
+    if grid_lines:
+        color = 0xFF000000 | (GRID_LINE_COLOR[0] << 16) | (GRID_LINE_COLOR[1] << 8) | GRID_LINE_COLOR[2]
+        line_index = quantize(np.array([color], dtype=np.uint32), palette)[0]
+    writer = open_writer(path, size, fps, palette)
+    frames = 0
+    try:
+        for colors in sweep_frames(input_grid, structure, operation, fps, duration, hold, levels):
+            writer.write(frame_pixels(quantize(colors, palette), size, line_index))
+            frames += 1
+    finally:
+        writer.close()
+    return frames
+
+
+def load_grid(path):
+    """Grid from "text:STRING", a .npy file or an image, where dark pixels are foreground"""
+    if path.startswith("text:"):
+        from text_patterns import TextPatternGenerator
+        return TextPatternGenerator().generate_pattern(path[len("text:"):])
+    if path.endswith(".npy"):
+        return np.load(path)
+    cv2 = _cv2()
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"cannot read {path}")
+    return image < 128
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help='"text:STRING", a .npy grid or an image (dark pixels are foreground)')
+    parser.add_argument("output", help=".gif, or a video file such as .mp4 or .avi")
+    parser.add_argument("--operation", default="Erosion", type=engine.operation_name,
+                        help="operation name, case-insensitive (default: Erosion)")
+    parser.add_argument("--structure", default="rect:3x3",
+                        help='"rect:HxW", "cross:N", "diamond:R" or a .npy/.txt file')
+    parser.add_argument("--size", type=int, nargs=2, default=(300, 300), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds the sweep takes")
+    parser.add_argument("--hold", type=float, default=1.0,
+                        help="seconds to keep showing the result at the end")
+    parser.add_argument("--palette", default="color", choices=PALETTES)
+    parser.add_argument("--levels", type=int, default=None,
+                        help="intensity levels of the grid (default: from its dtype)")
+    parser.add_argument("--no-grid", action="store_true", help="do not draw cell borders")
+    args = parser.parse_args(argv)
+
+    frames = render_animation(load_grid(args.input), structures.from_spec(args.structure), args.operation,
+                              args.output, tuple(args.size), args.fps, args.duration, args.hold,
+                              args.palette, args.levels, not args.no_grid)
+    print(f"{args.output}: {frames} frames")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
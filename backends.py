@@ -0,0 +1,326 @@
+"""Run the binary operations on scipy.ndimage, OpenCV or the bit-packed engine, and pick the fastest.
+
+Every backend returns the same boolean result as scipy.ndimage.binary_* with
+the default zero border; "distance" thresholds a distance transform for disk,
+diamond and square elements. Only engine.BASIC_OPERATIONS have several backends;
+the extended operators always run on the engine. Run ``python backends.py`` to (re)calibrate the
+dispatch table for this machine.
+"""
+import argparse
+import importlib.metadata
+import importlib.util
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+import distance
+import engine
+import separable
+from structures import disk
+
+# scipy and OpenCV take far longer to import than the rest of the app, so they
+# are imported on first use. OpenCV is optional for headless compute.
+HAS_OPENCV = importlib.util.find_spec("cv2") is not None
+
+
+CACHE_DIR = os.environ.get(
+    "MORPHOLOGIC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "morphologic"))
+CALIBRATION_FILE = os.path.join(CACHE_DIR, "backends.json")
+
+_SCIPY = {
+    "Erosion": "binary_erosion",
+    "Dilation": "binary_dilation",
+    "Opening": "binary_opening",
+    "Closing": "binary_closing",
+}
+
+
+def _cv2():
+    import cv2
+    return cv2
+
+
+def run_scipy(input_grid, structure, operation):
+    from scipy import ndimage
+    return getattr(ndimage, _SCIPY[operation])(input_grid, structure=structure)
+
+
+def run_engine(input_grid, structure, operation):
+    return engine.apply_operation(input_grid, structure, operation)
+
+
+def run_distance(input_grid, structure, operation):
+    """Threshold a distance transform; elements that are not norm balls run on the engine"""
+    if distance.match(structure) is None:
+        return run_engine(input_grid, structure, operation)
+    return distance.apply_operation(input_grid, structure, operation)
+
+
+def _as_uint8(input_grid):
+    input_grid = np.asarray(input_grid)
+    if input_grid.dtype == np.uint8:
+        # min/max keep "non-zero" semantics for unsigned values, no threshold needed
+        return input_grid
+    if input_grid.dtype == bool:
+        return input_grid.view(np.uint8)
+    return (input_grid != 0).view(np.uint8)
+
+
+def _cv_erode(image, kernel):
+    cv2 = _cv2()
+    return cv2.erode(image, kernel, borderType=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def _cv_dilate(image, kernel):
+    # cv2.dilate does not reflect the kernel the way scipy does; flip it and
+    # move the anchor so the origin lands on the same cell.
+    cv2 = _cv2()
+    height, width = kernel.shape
+    flipped = np.ascontiguousarray(kernel[::-1, ::-1])
+    anchor = (width - 1 - width // 2, height - 1 - height // 2)
+    return cv2.dilate(image, flipped, anchor=anchor,
+                      borderType=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def run_opencv(input_grid, structure, operation):
+    kernel = (np.asarray(structure) != 0).view(np.uint8)
+    if not kernel.any():
+        # OpenCV treats an empty kernel as the identity; scipy does not
+        return run_engine(input_grid, structure, operation)
+    image = _as_uint8(input_grid)
+    if operation == "Erosion":
+        result = _cv_erode(image, kernel)
+    elif operation == "Dilation":
+        result = _cv_dilate(image, kernel)
+    elif operation == "Opening":
+        result = _cv_dilate(_cv_erode(image, kernel), kernel)
+    elif operation == "Closing":
+        result = _cv_erode(_cv_dilate(image, kernel), kernel)
+    else:
+        raise ValueError(f"unknown operation: {operation!r}")
+    return result.astype(bool)
+
+
+BACKENDS = {
+    "engine": run_engine,
+    "scipy": run_scipy,
+    "distance": run_distance,
+}
+if HAS_OPENCV:
+    BACKENDS["opencv"] = run_opencv
+
+
+def _size_bucket(size):
+    """log2 of the side of a square image with this many pixels, rounded"""
+    return int(round(math.log2(max(size, 1)) / 2))
+
+
+def features(input_grid, structure):
+    """Dispatch key: dtype class, structuring-element kind and log2 size buckets"""
+    input_grid = np.asarray(input_grid)
+    structure = np.asarray(structure)
+    if input_grid.dtype == bool:
+        dtype = "bool"
+    elif input_grid.dtype == np.uint8:
+        dtype = "uint8"
+    else:
+        dtype = "other"
+    if separable.decompose(structure) is not None:
+        kind = "separable"
+    elif distance.match(structure) is not None:
+        kind = "ball"
+    else:
+        kind = "dense"
+    size = _size_bucket(input_grid.size)
+    area = int(round(math.log2(max(int(np.count_nonzero(structure)), 1))))
+    return {"dtype": dtype, "kind": kind, "size": size, "area": area}
+
+
+# Distributions that provide cv2, any of which may be installed
+_OPENCV_DISTRIBUTIONS = ("opencv-python", "opencv-python-headless", "opencv-contrib-python",
+                         "opencv-contrib-python-headless")
+
+
+def _version(*distributions):
+    """Installed version of the first distribution found, read without importing it"""
+    for name in distributions:
+        try:
+            return importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            continue
+    return None
+
+
+def fingerprint():
+    """Environment a calibration is valid for"""
+    return {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "scipy": _version("scipy"),
+        "opencv": _version(*_OPENCV_DISTRIBUTIONS) if HAS_OPENCV else None,
+        "backends": sorted(BACKENDS),
+    }
+
+
+def calibrate(sizes=(32, 256, 1024), structures=None, operations=("Erosion", "Opening"),
+              dtypes=(bool, np.uint8), repeats=2, budget=0.02, seed=0):
+    """Time every backend on representative cases and record the winner of each
+
+    Sizes run in increasing order, and a backend whose single run takes longer
+    than ``budget`` seconds is not timed again at larger sizes for that
+    element, which keeps the whole run to about three seconds. Returns the
+    calibration dict that Dispatcher stores on disk.
+    """
+    rng = np.random.default_rng(seed)
+    if structures is None:
+        structures = [np.ones((3, 3), bool), np.ones((15, 15), bool), np.ones((31, 31), bool),
+                      rng.random((5, 5)) < 0.5, rng.random((11, 11)) < 0.5,
+                      disk(6), disk(24)]
+    masks = {size: rng.random((size, size)) < 0.3 for size in sizes}
+    entries = []
+    for dtype in dtypes:
+        for structure in structures:
+            too_slow = set()
+            for size in sorted(sizes):
+                input_grid = masks[size].astype(dtype)
+                timings = {}
+                for name, run in BACKENDS.items():
+                    if name in too_slow or (name == "distance" and distance.match(structure) is None):
+                        continue
+                    best = math.inf
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        for operation in operations:
+                            run(input_grid, structure, operation)
+                        best = min(best, time.perf_counter() - start)
+                        if best > budget:
+                            too_slow.add(name)
+                            break
+                    timings[name] = best
+                if not timings:
+                    continue
+                entry = features(input_grid, structure)
+                entry.update(backend=min(timings, key=timings.get), timings=timings)
+                entries.append(entry)
+    return {"fingerprint": fingerprint(), "entries": entries}
+
+
+def default_backend(key):
+    """Uncalibrated guess: OpenCV wins except on large images with big separable elements or disks"""
+    if key["kind"] == "separable" and key["size"] >= 10 and key["area"] >= 8:
+        return "engine"
+    if key["kind"] == "ball" and key["area"] >= 10:
+        return "distance"
+    return "opencv" if "opencv" in BACKENDS else "engine"
+
+
+class Dispatcher:
+    """Picks a backend per call from a calibration table cached on disk
+
+    With calibrate=True a missing or stale table (different machine or
+    library versions) is rebuilt on first use, which takes a few seconds and
+    is announced on stream when one is given. Otherwise an uncalibrated
+    dispatcher falls back to default_backend.
+    """
+
+    def __init__(self, path=CALIBRATION_FILE, calibrate=False, stream=None):
+        self.path = path
+        self.auto_calibrate = calibrate
+        self.stream = stream
+        self.table = None
+        self.loaded = False
+        self.choices = {}
+
+    def load(self):
+        self.loaded = True
+        try:
+            with open(self.path) as handle:
+                table = json.load(handle)
+        except (OSError, ValueError):
+            table = None
+        if table is not None and table.get("fingerprint") != fingerprint():
+            table = None
+        if table is None and self.auto_calibrate:
+            if self.stream is not None:
+                self.stream.write(f"calibrating backends for this machine, saving to {self.path}\n")
+            table = self.calibrate()
+        self.table = table
+        self.choices.clear()
+        return table
+
+    def calibrate(self, **kwargs):
+        """Run a calibration now and save it to self.path"""
+        self.table = calibrate(**kwargs)
+        self.loaded = True
+        self.choices.clear()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as handle:
+            json.dump(self.table, handle, indent=2)
+        return self.table
+
+    def choose(self, input_grid, structure):
+        """Name of the backend expected to be fastest for this input"""
+        if not self.loaded:
+            self.load()
+        input_grid = np.asarray(input_grid)
+        structure = np.asarray(structure)
+        # Most calls repeat a structuring element; skip recomputing features for it
+        memo = (input_grid.dtype.str, _size_bucket(input_grid.size), structure.shape,
+                structure.dtype.str, structure.tobytes())
+        if memo not in self.choices:
+            self.choices[memo] = self._lookup(features(input_grid, structure))
+        return self.choices[memo]
+
+    def _lookup(self, key):
+        candidates = []
+        if self.table is not None:
+            candidates = [entry for entry in self.table["entries"]
+                          if entry["kind"] == key["kind"] and entry["dtype"] == key["dtype"]
+                          and entry["backend"] in BACKENDS]
+        if not candidates:
+            return default_backend(key)
+        nearest = min(candidates, key=lambda entry: abs(entry["size"] - key["size"])
+                      + abs(entry["area"] - key["area"]))
+        return nearest["backend"]
+
+    def apply_operation(self, input_grid, structure, operation, backend="auto"):
+        if operation not in engine.OPERATIONS:
+            raise ValueError(f"unknown operation: {operation!r}")
+        if operation not in engine.BASIC_OPERATIONS:
+            if backend not in ("auto", "engine"):
+                raise ValueError(f"{operation} is only available on the engine backend")
+            return run_engine(input_grid, structure, operation)
+        if backend == "auto":
+            backend = self.choose(input_grid, structure)
+        return BACKENDS[backend](input_grid, structure, operation)
+
+
+_default_dispatcher = Dispatcher()
+
+
+def apply_operation(input_grid, structure, operation, backend="auto"):
+    """Run operation on the named backend, or the fastest one for "auto" """
+    return _default_dispatcher.apply_operation(input_grid, structure, operation, backend)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate backend dispatch for this machine")
+    parser.add_argument("--path", default=CALIBRATION_FILE, help="where to store the table")
+    args = parser.parse_args(argv)
+    table = Dispatcher(args.path).calibrate()
+    for entry in table["entries"]:
+        print(f"{entry['dtype']:>5} {entry['kind']:>9} size=2^{entry['size']} "
+              f"area=2^{entry['area']}: {entry['backend']}")
+    print(f"saved to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""Apply a morphological operation to every image in a directory or glob, without a display.
+
+Example:
+    python batch.py "masks/*.png" out/ --operation Opening --structure rect:5x5
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+import backends
+import engine
+import grayscale
+import structures
+
+
+IMAGE_EXTENSIONS = {".png", ".bmp", ".tif", ".tiff", ".jpg", ".jpeg", ".pgm", ".pbm"}
+
+
+def _is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS and os.path.isfile(path)
+
+
+def _glob_root(pattern):
+    """Directory part of a glob pattern before its first wildcard"""
+    parts = os.path.normpath(pattern).split(os.sep)
+    fixed = []
+    for part in parts[:-1]:
+        if glob.has_magic(part):
+            break
+        fixed.append(part)
+    return os.sep.join(fixed) or os.curdir
+
+
+def iter_inputs(source):
+    """Yield (image path, path relative to the source root) from a directory (sorted) or a glob
+
+    The relative path names the output, so images with the same file name
+    in different directories matched by a ``**`` glob do not collide.
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if _is_image(path):
+                yield path, name
+    else:
+        root = _glob_root(source)
+        for path in glob.iglob(source, recursive=True):
+            if _is_image(path):
+                yield path, os.path.relpath(path, root)
+
+
+def load_mask(path, threshold=127, invert=False):
+    """Read an image as grayscale and threshold it to a boolean mask"""
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise OSError(f"could not read image {path!r}")
+    mask = image > threshold
+    return ~mask if invert else mask
+
+
+def load_gray(path, invert=False):
+    """Read an image as 8- or 16-bit grayscale, keeping its bit depth"""
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE | cv2.IMREAD_ANYDEPTH)
+    if image is None:
+        raise OSError(f"could not read image {path!r}")
+    return np.iinfo(image.dtype).max - image if invert else image
+
+
+def process_image(path, output_dir, structure, operation, threshold, invert, backend="auto",
+                  gray=False, name=None):
+    """Worker entry point; returns the number of pixels processed
+
+    The result is written to output_dir/name (default: the file name of
+    path), creating subdirectories as needed. With gray=True the image is
+    not thresholded and the operation runs as grayscale morphology, writing
+    a result of the same bit depth.
+    """
+    if gray:
+        mask = load_gray(path, invert)
+        result = grayscale.apply_operation(mask, structure, operation)
+    else:
+        mask = load_mask(path, threshold, invert)
+        result = backends.apply_operation(mask, structure, operation, backend).astype(np.uint8) * 255
+    output_path = os.path.join(output_dir, name or os.path.basename(path))
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if os.path.splitext(output_path)[1].lower() in (".jpg", ".jpeg"):
+        # Lossy formats would smear the binary result
+        output_path = os.path.splitext(output_path)[0] + ".png"
+    if not cv2.imwrite(output_path, result):
+        raise OSError(f"could not write image {output_path!r}")
+    return mask.size
+
+
+def run_batch(paths, output_dir, structure, operation, threshold=127, invert=False,
+              workers=None, max_in_flight=None, report_every=2.0, backend="auto",
+              gray=False, calibrate=False, stream=sys.stderr):
+    """Process paths across a process pool with at most max_in_flight jobs queued
+
+    Workers read and write the images themselves, so only paths and pixel
+    counts cross the process boundary and memory stays bounded by the number
+    of in-flight jobs. Returns (images, pixels, failures, seconds).
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    os.makedirs(output_dir, exist_ok=True)
+    if calibrate and backend == "auto" and not gray:
+        # Calibrate once up front so every worker reads the same table from disk
+        backends.Dispatcher(calibrate=True, stream=stream).load()
+
+    images = pixels = failures = 0
+    start = last_report = time.perf_counter()
+    pending = {}
+    paths = iter(paths)
+
+    def report(final=False):
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        stream.write(
+            f"{'done' if final else 'progress'}: {images} images, {failures} failed, "
+            f"{images / elapsed:.1f} images/s, {pixels / elapsed / 1e6:.1f} Mpx/s\n"
+        )
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            for item in paths:
+                # iter_inputs yields (path, output name); bare paths keep their file name
+                path, name = item if isinstance(item, tuple) else (item, None)
+                future = pool.submit(
+                    process_image, path, output_dir, structure, operation, threshold, invert,
+                    backend, gray, name)
+                pending[future] = path
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    pixels += future.result()
+                    images += 1
+                except Exception as error:
+                    failures += 1
+                    stream.write(f"error: {path}: {error}\n")
+
+            now = time.perf_counter()
+            if report_every and now - last_report >= report_every:
+                report()
+                last_report = now
+
+    report(final=True)
+    return images, pixels, failures, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="input directory or glob pattern")
+    parser.add_argument("output_dir", help="directory the results are written to")
+    parser.add_argument("--operation", default="Erosion", type=engine.operation_name,
+                        choices=sorted(engine.OPERATIONS))
+    parser.add_argument("--structure", default="rect:3x3",
+                        help='"rect:HxW", "cross:N", "diamond:R" or a .npy/.txt grid file')
+    parser.add_argument("--threshold", type=int, default=127,
+                        help="gray values above this are foreground (default: 127)")
+    parser.add_argument("--invert", action="store_true", help="treat dark pixels as foreground")
+    parser.add_argument("--grayscale", action="store_true",
+                        help="keep 8/16-bit gray values and use grayscale morphology")
+    parser.add_argument("--backend", default="auto", choices=["auto"] + sorted(backends.BACKENDS))
+    parser.add_argument("--calibrate", action="store_true",
+                        help="calibrate the auto backend first if no valid table is cached")
+    parser.add_argument("--workers", type=int, default=None, help="default: number of CPUs")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="maximum queued images (default: 2 x workers)")
+    args = parser.parse_args(argv)
+
+    structure = structures.from_spec(args.structure)
+    _, _, failures, _ = run_batch(
+        iter_inputs(args.source), args.output_dir, structure, args.operation,
+        threshold=args.threshold, invert=args.invert,
+        workers=args.workers, max_in_flight=args.max_in_flight, backend=args.backend,
+        gray=args.grayscale, calibrate=args.calibrate,
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Benchmark the morphological operations across backends, image sizes and structuring elements.
+
+Writes machine-readable JSON with wall time, throughput and peak memory per case.
+
+Example:
+    python benchmark.py --sizes 256 1024 --structures rect:3 cross:15 -o results.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import scipy
+
+import backends
+import structures
+
+
+OPERATIONS = ["Erosion", "Dilation", "Opening", "Closing"]
+DEFAULT_SIZES = [10, 64, 256, 1024, 4096, 16384]
+DEFAULT_DENSITIES = [0.01, 0.3, 0.7]
+DEFAULT_STRUCTURES = ["rect:3", "rect:31", "cross:15", "diamond:7", "random:7"]
+
+
+def _run_auto(input_grid, structure, operation):
+    return backends.apply_operation(input_grid, structure, operation)
+
+
+# Every backends.py backend, plus "auto" to measure the dispatcher's choices
+BACKENDS = dict(backends.BACKENDS, auto=_run_auto)
+
+
+def make_structure(spec, rng):
+    """Structuring element from a benchmark spec; "random:N" is an arbitrary N x N shape"""
+    name, _, size = spec.partition(":")
+    if name == "random":
+        size = int(size)
+        structure = rng.random((size, size)) < 0.5
+        structure[size // 2, size // 2] = True
+        return structure
+    if name == "rect" and "x" not in size:
+        spec = f"rect:{size}x{size}"
+    return structures.from_spec(spec)
+
+
+def time_case(mask, structure, operation, run, min_time, max_repeats):
+    """Repeat one case until min_time has passed; return the per-call timings"""
+    timings = []
+    total = 0.0
+    while total < min_time and len(timings) < max_repeats:
+        start = time.perf_counter()
+        run(mask, structure, operation)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        total += elapsed
+    return timings
+
+
+def peak_memory(mask, structure, operation, run):
+    """Peak bytes allocated through Python/numpy during one call
+
+    Allocations made inside native libraries without numpy (e.g. OpenCV's
+    internal buffers) are not seen by tracemalloc.
+    """
+    tracemalloc.start()
+    try:
+        run(mask, structure, operation)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def run_benchmarks(backend_names, operations, sizes, densities, structure_specs, seed=0,
+                   min_time=0.2, max_repeats=50, max_seconds=10.0, stream=sys.stderr):
+    """Run every combination and return a list of result dicts
+
+    Sizes are run in increasing order; once a single call of a case takes
+    longer than max_seconds, the larger sizes of that case are skipped and
+    recorded with "skipped": true.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for spec in structure_specs:
+        structure = make_structure(spec, rng)
+        for operation in operations:
+            for backend in backend_names:
+                run = BACKENDS[backend]
+                for density in densities:
+                    too_slow = False
+                    for size in sorted(sizes):
+                        case = {
+                            "backend": backend,
+                            "operation": operation,
+                            "size": size,
+                            "density": density,
+                            "structure": spec,
+                            "structure_shape": list(structure.shape),
+                        }
+                        if too_slow:
+                            results.append(dict(case, skipped=True))
+                            continue
+
+                        mask = np.random.default_rng([seed, size, int(density * 1000)]).random(
+                            (size, size)) < density
+                        timings = time_case(mask, structure, operation, run,
+                                            min_time, max_repeats)
+                        best = min(timings)
+                        case.update(
+                            skipped=False,
+                            repeats=len(timings),
+                            seconds_min=best,
+                            seconds_median=float(np.median(timings)),
+                            megapixels_per_second=size * size / best / 1e6,
+                            peak_memory_bytes=peak_memory(mask, structure, operation, run),
+                        )
+                        results.append(case)
+                        stream.write(f"{backend:>7} {operation:<8} {spec:<11} {size:>6}px "
+                                     f"d={density:<5} {best * 1e3:10.3f} ms\n")
+                        too_slow = best > max_seconds
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--operations", nargs="+", default=OPERATIONS, choices=OPERATIONS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--densities", nargs="+", type=float, default=DEFAULT_DENSITIES)
+    parser.add_argument("--structures", nargs="+", default=DEFAULT_STRUCTURES,
+                        help='"rect:N", "rect:HxW", "cross:N", "diamond:R", "random:N" or a file')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="seconds to keep repeating each case (default: 0.2)")
+    parser.add_argument("--max-repeats", type=int, default=50)
+    parser.add_argument("--max-seconds", type=float, default=10.0,
+                        help="skip larger sizes once one call takes longer than this")
+    parser.add_argument("-o", "--output", help="JSON output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.backends, args.operations, args.sizes, args.densities,
+                             args.structures, seed=args.seed, min_time=args.min_time,
+                             max_repeats=args.max_repeats, max_seconds=args.max_seconds)
+    report = {"environment": environment(), "seed": args.seed, "results": results}
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""Connected components of a binary grid, kept up to date cell by cell.
+
+ComponentTracker labels a grid once and then follows single-cell edits
+with a union-find over the labels: setting a cell joins it to the
+components around it in near-constant time, and clearing one relabels
+only the bounding box of the component it belonged to, which may split.
+Component count, areas and bounding boxes are read from per-label
+arrays, and the Euler number (components minus holes) from bit-quad
+counts that an edit changes only around the edited cell.
+
+Foreground is 8-connected by default, background then 4-connected; pass
+connectivity=4 for the opposite.
+"""
+import numpy as np
+
+
+# Bit-quad weights indexed by top-left + 2*top-right + 4*bottom-left + 8*bottom-right:
+# 4 * Euler number = Q1 - Q3 -/+ 2 * QD (Gray, 1971)
+_QUADS = np.array([bin(code).count("1") for code in range(16)])
+_DIAGONAL = np.isin(np.arange(16), (0b1001, 0b0110))
+_QUAD_WEIGHTS = {
+    8: (_QUADS == 1).astype(np.int64) - (_QUADS == 3) - 2 * _DIAGONAL,
+    4: (_QUADS == 1).astype(np.int64) - (_QUADS == 3) + 2 * _DIAGONAL,
+}
+
+
+def _neighborhood(connectivity):
+    if connectivity not in (4, 8):
+        raise ValueError(f"connectivity must be 4 or 8, got {connectivity}")
+    return np.ones((3, 3), dtype=bool) if connectivity == 8 else np.array(
+        [[0, 1, 0], [1, 1, 1], [0, 1, 0]], dtype=bool)
+
+
+def _quad_sum(padded, connectivity):
+    """Sum of quad weights over every 2 x 2 window of a zero-padded grid"""
+    codes = (padded[:-1, :-1] + 2 * padded[:-1, 1:].astype(np.int8)
+             + 4 * padded[1:, :-1].astype(np.int8) + 8 * padded[1:, 1:].astype(np.int8))
+    return int(_QUAD_WEIGHTS[connectivity][codes].sum())
+
+
+def euler_number(mask, connectivity=8):
+    """Components minus holes of a binary grid"""
+    mask = np.asarray(mask) != 0
+    return _quad_sum(np.pad(mask, 1), connectivity) // 4
+
+
+def label(mask, connectivity=8):
+    """(labels, count) with components numbered from 1, as scipy.ndimage.label"""
+    from scipy import ndimage
+    return ndimage.label(np.asarray(mask) != 0, structure=_neighborhood(connectivity))
+
+
+def _bounding_slices(labels):
+    """(row slice, col slice) of every label from 1 up, as scipy.ndimage.find_objects"""
+    from scipy import ndimage
+    return ndimage.find_objects(labels)
+
+
+def area_histogram(areas):
+    """{(low, high): count} of component areas in power-of-two bins low <= area < high"""
+    areas = np.asarray(areas, dtype=np.int64)
+    if not len(areas):
+        return {}
+    counts = np.bincount(np.log2(areas).astype(int))
+    return {(1 << bit, 2 << bit): int(count) for bit, count in enumerate(counts) if count}
+
+
+class ComponentTracker:
+    """Components of a binary grid under single-cell edits; see the module docstring
+
+    Labels in self.labels may be stale after merges; find() maps them to
+    the label that owns the component's statistics.
+    """
+
+    def __init__(self, mask, connectivity=8):
+        self.connectivity = connectivity
+        self.neighborhood = _neighborhood(connectivity)
+        self.reset(mask)
+
+    def reset(self, mask):
+        """Label the whole grid from scratch"""
+        self.mask = np.array(mask) != 0
+        self.labels, count = label(self.mask, self.connectivity)
+        self.labels = self.labels.astype(np.int64)
+        self.parent = np.arange(count + 1)
+        self.area = np.bincount(self.labels.ravel(), minlength=count + 1).astype(np.int64)
+        self.area[0] = 0
+        # Bounding boxes as inclusive top, left, bottom, right per label
+        self.boxes = np.zeros((count + 1, 4), dtype=np.int64)
+        rows, cols = np.nonzero(self.mask)
+        owners = self.labels[rows, cols]
+        self.boxes[:, :2] = np.iinfo(np.int64).max
+        np.minimum.at(self.boxes[:, 0], owners, rows)
+        np.minimum.at(self.boxes[:, 1], owners, cols)
+        np.maximum.at(self.boxes[:, 2], owners, rows)
+        np.maximum.at(self.boxes[:, 3], owners, cols)
+        self.next_label = count + 1
+        # Merges and splits never reuse labels; past this many the grid is relabeled
+        self.label_limit = 4 * count + self.mask.size
+        self.quad_sum = _quad_sum(np.pad(self.mask, 1), self.connectivity)
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    def find(self, index):
+        parent = self.parent
+        while parent[index] != index:
+            # Path halving keeps later lookups short
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return int(index)
+
+    def _new_label(self, area, box):
+        if self.next_label == len(self.parent):
+            grown = max(16, 2 * len(self.parent))
+            self.parent = np.r_[self.parent, np.arange(len(self.parent), grown)]
+            self.area = np.r_[self.area, np.zeros(grown - len(self.area), dtype=np.int64)]
+            self.boxes = np.vstack([self.boxes, np.zeros((grown - len(self.boxes), 4), np.int64)])
+        index = self.next_label
+        self.next_label += 1
+        self.area[index] = area
+        self.boxes[index] = box
+        return index
+
+    def _union(self, first, second):
+        """Join two roots, keeping the larger one's label; returns the surviving root"""
+        if first == second:
+            return first
+        if self.area[first] < self.area[second]:
+            first, second = second, first
+        self.parent[second] = first
+        self.area[first] += self.area[second]
+        self.area[second] = 0
+        box, other = self.boxes[first], self.boxes[second]
+        self.boxes[first] = (min(box[0], other[0]), min(box[1], other[1]),
+                             max(box[2], other[2]), max(box[3], other[3]))
+        return first
+
+    def _window(self, row, col, reach):
+        rows, cols = self.shape
+        return (slice(max(row - reach, 0), min(row + reach + 1, rows)),
+                slice(max(col - reach, 0), min(col + reach + 1, cols)))
+
+    def _quad_delta(self, row, col):
+        """Quad sum of the four 2 x 2 windows that contain (row, col)"""
+        window = self._window(row, col, 1)
+        patch = self.mask[window]
+        local = np.zeros((3, 3), dtype=bool)
+        top, left = window[0].start - (row - 1), window[1].start - (col - 1)
+        local[top : top + patch.shape[0], left : left + patch.shape[1]] = patch
+        return _quad_sum(local, self.connectivity)
+
+    def set(self, row, col, value):
+        """Set one cell and update the components around it"""
+        value = bool(value)
+        if self.mask[row, col] == value:
+            return
+        before = self._quad_delta(row, col)
+        if value:
+            self._add(row, col)
+        else:
+            self._remove(row, col)
+        self.quad_sum += self._quad_delta(row, col) - before
+        if self.next_label > self.label_limit:
+            # At least mask.size labels are created between two of these, so edits
+            # stay amortized constant time
+            self.reset(self.mask)
+
+    def _add(self, row, col):
+        self.mask[row, col] = True
+        window = self._window(row, col, 1)
+        local = row - window[0].start, col - window[1].start
+        nearby = self.neighborhood[1 - local[0] : 1 - local[0] + self.mask[window].shape[0],
+                                   1 - local[1] : 1 - local[1] + self.mask[window].shape[1]]
+        neighbors = self.labels[window][nearby & self.mask[window]]
+        roots = {self.find(neighbor) for neighbor in neighbors if neighbor}
+        root = self._new_label(1, (row, col, row, col))
+        for other in roots:
+            root = self._union(root, other)
+        self.labels[row, col] = root
+
+    def _remove(self, row, col):
+        root = self.find(self.labels[row, col])
+        self.mask[row, col] = False
+        self.labels[row, col] = 0
+        if self.area[root] == 1:
+            self.area[root] = 0
+            return
+        if not self._may_split(row, col):
+            self.area[root] -= 1
+            self._shrink_box(root, row, col)
+            return
+        # The component may split; relabel just its bounding box
+        top, left, bottom, right = self.boxes[root]
+        box = slice(top, bottom + 1), slice(left, right + 1)
+        stale = self.labels[box]
+        candidates = np.unique(stale[stale > 0])
+        owned = candidates[[self.find(candidate) == root for candidate in candidates]]
+        member = np.isin(stale, owned)
+        pieces, count = label(member, self.connectivity)
+        self.area[root] = 0
+        areas = np.bincount(pieces.ravel(), minlength=count + 1)
+        for piece, (rows, cols) in enumerate(_bounding_slices(pieces), start=1):
+            piece_box = (top + rows.start, left + cols.start,
+                         top + rows.stop - 1, left + cols.stop - 1)
+            stale[pieces == piece] = self._new_label(int(areas[piece]), piece_box)
+
+    def _may_split(self, row, col):
+        """Whether the neighbors of a just-cleared cell fall apart within its 3 x 3 window
+
+        If they stay connected around it, so does the whole component.
+        """
+        window = self._window(row, col, 1)
+        patch = self.mask[window]
+        local = row - window[0].start, col - window[1].start
+        nearby = self.neighborhood[1 - local[0] : 1 - local[0] + patch.shape[0],
+                                   1 - local[1] : 1 - local[1] + patch.shape[1]]
+        groups, _ = label(patch, self.connectivity)
+        return len(np.unique(groups[nearby & patch])) > 1
+
+    def _owns(self, root, region):
+        labels = self.labels[region]
+        return any(self.find(candidate) == root for candidate in np.unique(labels[labels > 0]))
+
+    def _shrink_box(self, root, row, col):
+        """Move the sides of a component's box inward after (row, col) left it"""
+        top, left, bottom, right = (int(side) for side in self.boxes[root])
+        while row == top and not self._owns(root, (top, slice(left, right + 1))):
+            top += 1
+            row = top
+        while row == bottom and not self._owns(root, (bottom, slice(left, right + 1))):
+            bottom -= 1
+            row = bottom
+        while col == left and not self._owns(root, (slice(top, bottom + 1), left)):
+            left += 1
+            col = left
+        while col == right and not self._owns(root, (slice(top, bottom + 1), right)):
+            right -= 1
+            col = right
+        self.boxes[root] = (top, left, bottom, right)
+
+    def update(self, mask, window=None):
+        """Follow a new version of the grid, cell by cell when only a few cells changed
+
+        window limits the comparison to (row slice, col slice) when the
+        caller knows nothing changed outside it.
+        """
+        mask = np.asarray(mask)
+        if mask.shape != self.shape:
+            self.reset(mask)
+            return
+        window = window or (slice(None), slice(None))
+        rows, cols = np.nonzero((mask[window] != 0) != self.mask[window])
+        # Relabeling everything is cheaper than many separate edits
+        if len(rows) > max(16, self.mask.size // 64):
+            self.reset(mask)
+            return
+        rows += window[0].start or 0
+        cols += window[1].start or 0
+        for row, col in zip(rows, cols):
+            self.set(row, col, mask[row, col])
+
+    def roots(self):
+        """Label of every component"""
+        live = np.flatnonzero(self.area > 0)
+        return live[self.parent[live] == live]
+
+    def count(self):
+        return len(self.roots())
+
+    def euler_number(self):
+        return self.quad_sum // 4
+
+    def summary(self, largest=5):
+        """Count, Euler number, holes, area histogram and the largest components' boxes"""
+        roots = self.roots()
+        areas = self.area[roots]
+        order = np.argsort(-areas, kind="stable")[:largest]
+        euler = self.euler_number()
+        return {
+            "count": len(roots),
+            "area": int(areas.sum()),
+            "euler": euler,
+            "holes": len(roots) - euler,
+            "histogram": area_histogram(areas),
+            "largest": [(int(areas[index]), tuple(int(v) for v in self.boxes[roots[index]]))
+                        for index in order],
+        }
@@ -0,0 +1,260 @@
+"""Stream a synthetic dataset of (input, structuring element, output) morphology examples.
+
+Inputs are random masks (noise or blobs of controllable density) and text
+rendered with TextPatternGenerator; every example gets its own random
+structuring element and the erosion, dilation, opening and closing of its
+input. Batches are generated in worker processes and written as they finish,
+so memory stays bounded by the number of batches in flight. A run is fully
+determined by its seed and batch size.
+
+Example:
+    python dataset.py out/ --count 1000000 --shape 32 32 --format npz
+    python dataset.py out/ --count 100000 --format npy --density 0.01 0.2 --blob 0 6
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from scipy import ndimage
+
+import engine
+import structures
+from text_patterns import TextPatternGenerator
+
+
+FIELDS = ("input", "structure", "erosion", "dilation", "opening", "closing")
+STRUCTURE_KINDS = ("rect", "cross", "diamond", "random")
+
+
+def random_masks(rng, count, shape, density=(0.05, 0.5), blob=(0, 4)):
+    """(count, H, W) masks whose foreground fraction is drawn from the density range
+
+    blob is the range of smoothing widths: 0 gives independent pixels, larger
+    values give correspondingly larger connected blobs. Each mask is
+    thresholded at its own quantile, so its density is met to within one
+    pixel, ties aside.
+    """
+    rows, cols = shape
+    noise = rng.random((count, rows, cols), dtype=np.float32)
+    widths = rng.integers(blob[0], blob[1] + 1, size=count)
+    for width in np.unique(widths):
+        if width > 1:
+            selected = widths == width
+            noise[selected] = ndimage.uniform_filter(noise[selected], size=(1, width, width),
+                                                     mode="wrap")
+    densities = rng.uniform(density[0], density[1], size=count)
+    flat = noise.reshape(count, -1)
+    ranks = np.clip(((1.0 - densities) * flat.shape[1]).astype(int), 0, flat.shape[1] - 1)
+    thresholds = np.sort(flat, axis=1)[np.arange(count), ranks]
+    return noise > thresholds[:, None, None]
+
+
+def text_masks(rng, count, shape, generator=None, max_length=6):
+    """(count, H, W) masks of random strings at random integer scales that fit the canvas"""
+    generator = generator or TextPatternGenerator()
+    rows, cols = shape
+    glyph_rows, glyph_cols = generator.font_size
+    result = np.zeros((count, rows, cols), dtype=bool)
+    max_scale = max(1, min(rows // glyph_rows, cols // glyph_cols))
+    scales = rng.integers(1, max_scale + 1, size=count)
+    characters = np.array(list(generator.characters))
+    for scale in np.unique(scales):
+        selected = np.nonzero(scales == scale)[0]
+        # At least one character, at most as many as fit across the canvas
+        fits = max(1, (cols + scale) // ((glyph_cols + 1) * scale))
+        lengths = rng.integers(1, min(max_length, fits) + 1, size=len(selected))
+        picks = characters[rng.integers(0, len(characters), size=(len(selected), lengths.max()))]
+        texts = ["".join(row[:length]) for row, length in zip(picks, lengths)]
+        result[selected] = generator.render_batch(texts, shape, scale=int(scale))
+    return result
+
+
+def random_structures(rng, count, max_size=7):
+    """(count, S, S) elements centered in S = max_size (odd) cells, of random kind and size"""
+    size = max_size | 1
+    result = np.zeros((count, size, size), dtype=bool)
+    kinds = rng.integers(0, len(STRUCTURE_KINDS), size=count)
+    sizes = 2 * rng.integers(0, size // 2 + 1, size=count) + 1
+    for index, (kind, extent) in enumerate(zip(kinds, sizes)):
+        kind = STRUCTURE_KINDS[kind]
+        if kind == "rect":
+            structure = structures.rectangle(extent)
+        elif kind == "cross":
+            structure = structures.cross(extent)
+        elif kind == "diamond":
+            structure = structures.diamond(extent // 2)
+        else:
+            structure = rng.random((extent, extent)) < 0.5
+            structure[extent // 2, extent // 2] = True
+        margin = (size - extent) // 2
+        result[index, margin : margin + extent, margin : margin + extent] = structure
+    return result
+
+
+def compute_outputs(inputs, structures_):
+    """Erosion, dilation, opening and closing of each input with its own element
+
+    The whole batch runs as one stack (engine.apply_stack), and opening and
+    closing reuse the erosion and dilation, so every batch costs four stack
+    passes instead of six.
+    """
+    eroded = engine.apply_stack(inputs, structures_, "Erosion")
+    dilated = engine.apply_stack(inputs, structures_, "Dilation")
+    return {
+        "erosion": eroded,
+        "dilation": dilated,
+        "opening": engine.apply_stack(eroded, structures_, "Dilation"),
+        "closing": engine.apply_stack(dilated, structures_, "Erosion"),
+    }
+
+
+def make_batch(seed, index, count, shape, density=(0.05, 0.5), blob=(0, 4),
+               text_fraction=0.25, max_structure=7):
+    """One batch of examples; depends only on (seed, index) and the parameters"""
+    rng = np.random.default_rng(np.random.SeedSequence([seed, index]))
+    is_text = rng.random(count) < text_fraction
+    inputs = np.empty((count,) + tuple(shape), dtype=bool)
+    inputs[~is_text] = random_masks(rng, int((~is_text).sum()), shape, density, blob)
+    inputs[is_text] = text_masks(rng, int(is_text.sum()), shape)
+    batch = {"input": inputs, "structure": random_structures(rng, count, max_structure)}
+    batch.update(compute_outputs(inputs, batch["structure"]))
+    batch["is_text"] = is_text
+    return batch
+
+
+class NpzWriter:
+    """One compressed shard-NNNNN.npz per batch"""
+
+    def __init__(self, output_dir, count, shape, max_structure):
+        self.output_dir = output_dir
+
+    def write(self, index, start, batch):
+        path = os.path.join(self.output_dir, f"shard-{index:05d}.npz")
+        np.savez_compressed(path, **batch)
+
+    def close(self):
+        pass
+
+
+class NpyWriter:
+    """One memory-mapped .npy file per field, filled batch by batch"""
+
+    def __init__(self, output_dir, count, shape, max_structure):
+        size = max_structure | 1
+        shapes = {field: (count,) + tuple(shape) for field in FIELDS}
+        shapes["structure"] = (count, size, size)
+        shapes["is_text"] = (count,)
+        self.arrays = {
+            field: np.lib.format.open_memmap(os.path.join(output_dir, f"{field}.npy"), mode="w+",
+                                             dtype=bool, shape=field_shape)
+            for field, field_shape in shapes.items()
+        }
+
+    def write(self, index, start, batch):
+        for field, values in batch.items():
+            self.arrays[field][start : start + len(values)] = values
+
+    def close(self):
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays.clear()
+
+
+WRITERS = {"npz": NpzWriter, "npy": NpyWriter}
+
+
+def run_dataset(output_dir, count, shape=(32, 32), batch_size=256, output_format="npz", seed=0,
+                density=(0.05, 0.5), blob=(0, 4), text_fraction=0.25, max_structure=7,
+                workers=None, max_in_flight=None, report_every=2.0, stream=sys.stderr):
+    """Generate count examples into output_dir; returns (examples, seconds)
+
+    Batches are computed in a process pool with at most max_in_flight
+    queued and written in order as they complete, together with a
+    meta.json recording every parameter needed to reproduce the run.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    os.makedirs(output_dir, exist_ok=True)
+    params = {"count": count, "shape": list(shape), "batch_size": batch_size, "seed": seed,
+              "density": list(density), "blob": list(blob), "text_fraction": text_fraction,
+              "max_structure": max_structure, "format": output_format, "fields": list(FIELDS)}
+    with open(os.path.join(output_dir, "meta.json"), "w") as handle:
+        json.dump(params, handle, indent=2)
+    writer = WRITERS[output_format](output_dir, count, shape, max_structure)
+
+    starts = list(range(0, count, batch_size))
+    examples = 0
+    start_time = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+        stream.write(f"{'done' if final else 'progress'}: {examples}/{count} examples, "
+                     f"{examples / elapsed:.0f} examples/s\n")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        finished = {}
+        next_submit = next_write = 0
+        while next_write < len(starts):
+            while next_submit < len(starts) and len(pending) + len(finished) < max_in_flight:
+                size = min(batch_size, count - starts[next_submit])
+                future = pool.submit(make_batch, seed, next_submit, size, shape, density, blob,
+                                     text_fraction, max_structure)
+                pending[future] = next_submit
+                next_submit += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[pending.pop(future)] = future.result()
+            # Write in batch order so npy rows and shard numbers are reproducible
+            while next_write in finished:
+                batch = finished.pop(next_write)
+                writer.write(next_write, starts[next_write], batch)
+                examples += len(batch["input"])
+                next_write += 1
+
+            now = time.perf_counter()
+            if report_every and now - last_report >= report_every:
+                report()
+                last_report = now
+    writer.close()
+    report(final=True)
+    return examples, time.perf_counter() - start_time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output_dir", help="directory for the shards or .npy files")
+    parser.add_argument("--count", type=int, default=10000, help="number of examples")
+    parser.add_argument("--shape", type=int, nargs=2, default=(32, 32), metavar=("ROWS", "COLS"))
+    parser.add_argument("--batch-size", type=int, default=256, help="examples per batch and shard")
+    parser.add_argument("--format", default="npz", choices=sorted(WRITERS),
+                        help="npz: one compressed shard per batch; npy: one memmap per field")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--density", type=float, nargs=2, default=(0.05, 0.5), metavar=("MIN", "MAX"),
+                        help="range of foreground fractions for random masks")
+    parser.add_argument("--blob", type=int, nargs=2, default=(0, 4), metavar=("MIN", "MAX"),
+                        help="range of blob widths in pixels (0 = independent pixels)")
+    parser.add_argument("--text-fraction", type=float, default=0.25,
+                        help="share of examples rendered from text (default: 0.25)")
+    parser.add_argument("--max-structure", type=int, default=7,
+                        help="largest structuring element side (default: 7)")
+    parser.add_argument("--workers", type=int, default=None, help="default: number of CPUs")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="maximum queued batches (default: 2 x workers)")
+    args = parser.parse_args(argv)
+
+    run_dataset(args.output_dir, args.count, tuple(args.shape), batch_size=args.batch_size,
+                output_format=args.format, seed=args.seed, density=tuple(args.density),
+                blob=tuple(args.blob), text_fraction=args.text_fraction,
+                max_structure=args.max_structure, workers=args.workers,
+                max_in_flight=args.max_in_flight)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Erosion and dilation by norm balls (disks, diamonds, squares) from a distance transform.
+
+Dilating by a ball of radius r sets every pixel within distance r of the
+foreground, and eroding keeps every foreground pixel farther than r from
+the background; both are one linear-time distance transform and a
+threshold, so the cost does not depend on the radius. Results equal
+engine's with structures.ball(radius, norm), zero border included.
+
+The transform comes from OpenCV when it is installed and from
+scipy.ndimage otherwise; both are exact and imported on first use.
+"""
+import importlib.util
+import math
+
+import numpy as np
+
+import structures
+
+
+HAS_OPENCV = importlib.util.find_spec("cv2") is not None
+
+
+def _distance_to_zero(image, norm):
+    """Distance from every pixel to the nearest zero pixel; pixels outside do not count"""
+    if HAS_OPENCV:
+        import cv2
+        kinds = {"euclidean": (cv2.DIST_L2, cv2.DIST_MASK_PRECISE),
+                 "taxicab": (cv2.DIST_L1, 3), "chessboard": (cv2.DIST_C, 3)}
+        distance, mask = kinds[norm]
+        return cv2.distanceTransform(image.view(np.uint8), distance, mask)
+    from scipy import ndimage
+    if norm == "euclidean":
+        return ndimage.distance_transform_edt(image)
+    return ndimage.distance_transform_cdt(image, metric=norm)
+
+
+def _within(distance, radius, norm):
+    """distance <= radius, exact for the integer offsets a ball is made of"""
+    if norm != "euclidean":
+        return distance <= int(radius)
+    # Squared distances are integers, so halfway to the next one is a safe cut;
+    # past about 1000 the gap gets close to float32 spacing and float64 is used
+    limit = math.floor(radius * radius + 1e-9)
+    if limit < 1 << 20:
+        return distance <= np.float32(math.sqrt(limit + 0.5))
+    return np.rint(np.square(distance, dtype=np.float64)) <= limit
+
+
+def _as_mask(mask):
+    mask = np.asarray(mask)
+    if mask.ndim != 2:
+        raise ValueError(f"expected a 2-D mask, got shape {mask.shape}")
+    return np.ascontiguousarray(mask != 0)
+
+
+def dilate(mask, radius, norm="euclidean"):
+    """Pixels within radius of the foreground"""
+    mask = _as_mask(mask)
+    if not mask.any():
+        return np.zeros_like(mask)
+    return _within(_distance_to_zero(~mask, norm), radius, norm)
+
+
+def erode(mask, radius, norm="euclidean"):
+    """Foreground pixels farther than radius from the background, outside counting as background"""
+    mask = _as_mask(mask)
+    # The nearest outside pixel is always on a one-pixel frame around the image
+    padded = np.zeros((mask.shape[0] + 2, mask.shape[1] + 2), dtype=bool)
+    padded[1:-1, 1:-1] = mask
+    return ~_within(_distance_to_zero(padded, norm), radius, norm)[1:-1, 1:-1]
+
+
+def opening(mask, radius, norm="euclidean"):
+    return dilate(erode(mask, radius, norm), radius, norm)
+
+
+def closing(mask, radius, norm="euclidean"):
+    return erode(dilate(mask, radius, norm), radius, norm)
+
+
+OPERATIONS = {
+    "Erosion": erode,
+    "Dilation": dilate,
+    "Opening": opening,
+    "Closing": closing,
+}
+
+
+def match(structure):
+    """(radius, norm) if structure is exactly a norm ball around its center, else None
+
+    Euclidean radii are returned as the square root of the largest squared
+    offset, which gives the same disk as any radius up to the next one.
+    """
+    structure = np.asarray(structure) != 0
+    if structure.ndim != 2 or not structure.any():
+        return None
+    offsets = np.argwhere(structure) - np.array(structure.shape) // 2
+    reach = int(np.abs(offsets).max())
+    box = np.zeros((2 * reach + 1, 2 * reach + 1), dtype=bool)
+    box[offsets[:, 0] + reach, offsets[:, 1] + reach] = True
+    dy, dx = np.ogrid[-reach : reach + 1, -reach : reach + 1]
+    squared = dy * dy + dx * dx
+    largest = int(squared[box].max())
+    # A disk reaching past the box would include cells on its axes that are missing
+    if largest < (reach + 1) ** 2 and np.array_equal(box, squared <= largest):
+        return math.sqrt(largest), "euclidean"
+    for norm in ("taxicab", "chessboard"):
+        if np.array_equal(box, structures.ball(reach, norm)):
+            return reach, norm
+    return None
+
+
+def apply_operation(input_grid, structure, operation):
+    """Run a basic operation with a norm-ball structure; ValueError for other elements"""
+    if operation not in OPERATIONS:
+        raise ValueError(f"{operation} is not available for distance-transform morphology")
+    ball = match(structure)
+    if ball is None:
+        raise ValueError("the structuring element is not a disk, diamond or square")
+    radius, norm = ball
+    return OPERATIONS[operation](input_grid, radius, norm)
@@ -0,0 +1,717 @@
+import numpy as np
+
+import separable
+
+
+WORD_BITS = 64
+_ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+class BitMask:
+    """Binary mask stored bit-packed, 64 pixels per uint64 word along each row.
+
+    Column ``j`` of a row lives in bit ``j % 64`` of word ``j // 64``. Padding
+    bits past the last column are always kept at zero.
+    """
+
+    def __init__(self, words, shape):
+        self.words = words
+        self.shape = tuple(shape)
+
+    @classmethod
+    def zeros(cls, shape):
+        rows, cols = shape
+        return cls(np.zeros((rows, _word_count(cols)), dtype=np.uint64), shape)
+
+    @classmethod
+    def ones(cls, shape):
+        mask = cls.zeros(shape)
+        mask.words[:] = _ALL_ONES
+        mask._clear_padding()
+        return mask
+
+    @classmethod
+    def from_array(cls, array):
+        """Pack any 2-D array, treating non-zero entries as foreground"""
+        array = np.asarray(array)
+        if array.ndim != 2:
+            raise ValueError(f"expected a 2-D array, got shape {array.shape}")
+        rows, cols = array.shape
+        padded = np.zeros((rows, _word_count(cols) * WORD_BITS), dtype=bool)
+        padded[:, :cols] = array != 0
+        packed = np.packbits(padded, axis=1, bitorder="little")
+        words = packed.view("<u8").astype(np.uint64, copy=False)
+        return cls(np.ascontiguousarray(words), (rows, cols))
+
+    def to_array(self):
+        """Unpack to a boolean ndarray of the mask's shape"""
+        rows, cols = self.shape
+        packed = np.ascontiguousarray(self.words.astype("<u8", copy=False)).view(np.uint8)
+        return np.unpackbits(packed, axis=1, count=cols, bitorder="little").astype(bool)
+
+    def copy(self):
+        return BitMask(self.words.copy(), self.shape)
+
+    def count(self):
+        """Number of foreground pixels"""
+        return int(np.unpackbits(self.words.view(np.uint8)).sum())
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    def __eq__(self, other):
+        if not isinstance(other, BitMask):
+            return NotImplemented
+        return self.shape == other.shape and np.array_equal(self.words, other.words)
+
+    def __and__(self, other):
+        return BitMask(self.words & other.words, self.shape)
+
+    def __or__(self, other):
+        return BitMask(self.words | other.words, self.shape)
+
+    def __xor__(self, other):
+        return BitMask(self.words ^ other.words, self.shape)
+
+    def __invert__(self):
+        inverted = BitMask(~self.words, self.shape)
+        inverted._clear_padding()
+        return inverted
+
+    def shifted(self, dy, dx):
+        """Return a mask with out[i, j] = self[i + dy, j + dx], zero outside"""
+        out = np.empty_like(self.words)
+        _shift_into(self.words, dy, dx, self.shape[1], out)
+        return BitMask(out, self.shape)
+
+    def _clear_padding(self):
+        _clear_padding(self.words, self.shape[1])
+
+
+def _word_count(cols):
+    return -(-cols // WORD_BITS)
+
+
+def _tail_mask(cols):
+    used = cols % WORD_BITS
+    if used == 0:
+        return _ALL_ONES
+    return np.uint64((1 << used) - 1)
+
+
+def _clear_padding(words, cols):
+    if words.shape[1]:
+        words[:, -1] &= _tail_mask(cols)
+
+
+def _shift_into(words, dy, dx, cols, out):
+    """Write words shifted so that out[i, j] = words[i + dy, j + dx] into out"""
+    rows, n_words = words.shape
+    out[:] = 0
+    if abs(dy) >= rows:
+        return out
+
+    # Row shift is a plain slice; column shift works on whole words plus a
+    # carry of the bits that cross a word boundary.
+    if dy >= 0:
+        src_rows, dst_rows = slice(dy, rows), slice(0, rows - dy)
+    else:
+        src_rows, dst_rows = slice(0, rows + dy), slice(-dy, rows)
+
+    q, r = divmod(abs(dx), WORD_BITS)
+    if q >= n_words:
+        return out
+    r_bits = np.uint64(r)
+    carry_bits = np.uint64(WORD_BITS - r)
+
+    if dx >= 0:
+        src = words[src_rows, q:]
+        dst = out[dst_rows, : n_words - q]
+        if r == 0:
+            dst[:] = src
+        else:
+            np.right_shift(src, r_bits, out=dst)
+            dst[:, :-1] |= src[:, 1:] << carry_bits
+    else:
+        src = words[src_rows, : n_words - q]
+        dst = out[dst_rows, q:]
+        if r == 0:
+            dst[:] = src
+        else:
+            np.left_shift(src, r_bits, out=dst)
+            dst[:, 1:] |= src[:, :-1] >> carry_bits
+        _clear_padding(out, cols)
+    return out
+
+
+def _offsets(structure):
+    """Offsets of the structuring element's active cells relative to its center"""
+    structure = np.asarray(structure)
+    if structure.ndim != 2:
+        raise ValueError(f"structuring element must be 2-D, got shape {structure.shape}")
+    center_row, center_col = structure.shape[0] // 2, structure.shape[1] // 2
+    rows, cols = np.nonzero(structure)
+    return [(int(i) - center_row, int(j) - center_col) for i, j in zip(rows, cols)]
+
+
+def _reflect(structure):
+    """Element with every offset negated, centered in an odd-sized array"""
+    offsets = np.array(_offsets(structure), dtype=int).reshape(-1, 2)
+    if not len(offsets):
+        return np.zeros((1, 1), dtype=bool)
+    reach_row, reach_col = np.abs(offsets).max(axis=0)
+    reflected = np.zeros((2 * reach_row + 1, 2 * reach_col + 1), dtype=bool)
+    reflected[reach_row - offsets[:, 0], reach_col - offsets[:, 1]] = True
+    return reflected
+
+
+def _as_bitmask(mask):
+    if isinstance(mask, BitMask):
+        return mask
+    return BitMask.from_array(mask)
+
+
+def erode(mask, structure, border_value=0, out=None):
+    """Binary erosion, out = AND of shifted copies; pixels outside count as border_value
+
+    Elements that separable.decompose can split run as 1-D passes whose cost
+    does not grow with the element size; anything else uses the dense loop.
+    The result is written to ``out`` when given, a BitMask of the same shape
+    that must not share memory with ``mask``.
+    """
+    mask = _as_bitmask(mask)
+    if border_value:
+        # With the outside as foreground, erosion is the complement of
+        # dilating the complement by the reflected element.
+        result = dilate(~mask, _reflect(structure), out=out)
+        np.invert(result.words, out=result.words)
+        result._clear_padding()
+        return result
+    plan = separable.decompose(structure)
+    if plan is None:
+        return _erode_dense(mask, structure, out)
+    return _run_factors(mask, plan, _erode_segment, np.bitwise_and, out)
+
+
+def dilate(mask, structure, out=None):
+    """Binary dilation, out = OR of shifted copies of the reflected element"""
+    mask = _as_bitmask(mask)
+    plan = separable.decompose(structure)
+    if plan is None:
+        return _dilate_dense(mask, structure, out)
+    return _run_factors(mask, plan, _dilate_segment, np.bitwise_or, out)
+
+
+def _run_factors(mask, plan, segment_pass, combine, out):
+    for index, factor in enumerate(plan):
+        result = segment_pass(mask, factor[0])
+        if out is not None and index == len(plan) - 1:
+            # The last factor combines straight into the caller's buffer
+            np.copyto(out.words, result.words)
+            result = out
+        for segment in factor[1:]:
+            combine(result.words, segment_pass(mask, segment).words, out=result.words)
+        mask = result
+    if out is None:
+        return mask.copy() if not plan else mask
+    if not plan:
+        np.copyto(out.words, mask.words)
+    return out
+
+
+def _erode_dense(mask, structure, out=None):
+    result = out if out is not None else BitMask.zeros(mask.shape)
+    result.words.fill(_ALL_ONES)
+    result._clear_padding()
+    scratch = np.empty_like(mask.words)
+    for dy, dx in _offsets(structure):
+        _shift_into(mask.words, dy, dx, mask.shape[1], scratch)
+        result.words &= scratch
+    return result
+
+
+def _dilate_dense(mask, structure, out=None):
+    result = out if out is not None else BitMask.zeros(mask.shape)
+    result.words.fill(0)
+    scratch = np.empty_like(mask.words)
+    for dy, dx in _offsets(structure):
+        _shift_into(mask.words, -dy, -dx, mask.shape[1], scratch)
+        result.words |= scratch
+    return result
+
+
+def _erode_segment(mask, segment):
+    # out[i] = AND of in[i + start .. i + start + length - 1] along the axis
+    return _window_reduce(mask, segment.start, segment.length, segment.axis, np.bitwise_and)
+
+
+def _dilate_segment(mask, segment):
+    # out[i] = OR of in[i - start - length + 1 .. i - start] along the axis
+    start = -(segment.start + segment.length - 1)
+    return _window_reduce(mask, start, segment.length, segment.axis, np.bitwise_or)
+
+
+def _window_reduce(mask, start, length, axis, ufunc):
+    """out[i] = ufunc over in[i + start .. i + start + length - 1] along axis
+
+    Rows are independent words, so the vertical pass is a van Herk/Gil-Werman
+    running reduce over whole words. Along columns the pixels share words and
+    the window is built by doubling: log2(length) shifted passes, each moving
+    64 pixels per word operation. The row is padded with whole zero words so
+    windows that straddle the image edge still see every in-range pixel.
+    """
+    if axis == 0:
+        words = separable.running_reduce(mask.words, length, 0, ufunc, offset=start)
+        return BitMask(words, mask.shape)
+
+    n_words = mask.words.shape[1]
+    pad = _word_count(max(abs(start), abs(start + length - 1)) + 1)
+    window = np.pad(mask.words, ((0, 0), (pad, pad)))
+    width = window.shape[1] * WORD_BITS
+    scratch = np.empty_like(window)
+    span = 1
+    while span * 2 <= length:
+        _shift_into(window, 0, span, width, scratch)
+        ufunc(window, scratch, out=window)
+        span *= 2
+    if span < length:
+        # Two overlapping windows of size span cover the full length.
+        _shift_into(window, 0, length - span, width, scratch)
+        ufunc(window, scratch, out=window)
+    _shift_into(window, 0, start, width, scratch)
+    result = BitMask(np.ascontiguousarray(scratch[:, pad : pad + n_words]), mask.shape)
+    result._clear_padding()
+    return result
+
+
+def opening(mask, structure):
+    return dilate(erode(mask, structure), structure)
+
+
+def closing(mask, structure):
+    return erode(dilate(mask, structure), structure)
+
+
+def gradient(mask, structure):
+    """Morphological gradient: dilation minus erosion, combined in place"""
+    result = dilate(mask, structure)
+    eroded = erode(mask, structure)
+    np.invert(eroded.words, out=eroded.words)
+    result.words &= eroded.words
+    return result
+
+
+def white_tophat(mask, structure):
+    """Pixels removed by the opening; costs one opening plus one XOR"""
+    mask = _as_bitmask(mask)
+    result = opening(mask, structure)
+    # The opening never adds pixels, so mask minus opening is a XOR
+    result.words ^= mask.words
+    return result
+
+
+def black_tophat(mask, structure):
+    """Pixels added by the closing; costs one closing plus one AND-NOT"""
+    mask = _as_bitmask(mask)
+    result = closing(mask, structure)
+    result.words &= ~mask.words
+    return result
+
+
+def hit_or_miss(mask, hit, miss=None):
+    """Pixels where hit fits the foreground and miss fits the background
+
+    miss defaults to the complement of hit within its box, and pixels outside
+    the image count as background, as in scipy.ndimage.binary_hit_or_miss.
+    """
+    mask = _as_bitmask(mask)
+    hit = np.asarray(hit) != 0
+    miss = ~hit if miss is None else np.asarray(miss) != 0
+    result = erode(mask, hit)
+    result.words &= erode(~mask, miss, border_value=1).words
+    return result
+
+
+def _golay_elements():
+    """(hit, miss) pairs of the Golay L element in its eight orientations"""
+    edge_hit = np.array([[0, 0, 0], [0, 1, 0], [1, 1, 1]], dtype=bool)
+    edge_miss = np.array([[1, 1, 1], [0, 0, 0], [0, 0, 0]], dtype=bool)
+    corner_hit = np.array([[0, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=bool)
+    corner_miss = np.array([[0, 1, 1], [0, 0, 1], [0, 0, 0]], dtype=bool)
+    elements = []
+    for turns in range(4):
+        elements.append((np.rot90(edge_hit, turns), np.rot90(edge_miss, turns)))
+        elements.append((np.rot90(corner_hit, turns), np.rot90(corner_miss, turns)))
+    return elements
+
+
+_GOLAY = _golay_elements()
+
+
+def thin(mask, structure=None):
+    """Thin to a one-pixel-wide, topology-preserving skeleton
+
+    Repeatedly removes the hit-or-miss matches of the eight Golay L elements
+    until nothing changes. structure is accepted for a uniform signature and
+    ignored.
+    """
+    current = _as_bitmask(mask).copy()
+    while True:
+        before = current.words.copy()
+        for hit, miss in _GOLAY:
+            matches = hit_or_miss(current, hit, miss)
+            current.words &= ~matches.words
+        if np.array_equal(before, current.words):
+            return current
+
+
+def skeleton(mask, structure):
+    """Lantuejoul skeleton: union over k of erode^k(X) minus its opening
+
+    Each erosion feeds both the opening of its own level and the next level,
+    so a level costs one erosion and one dilation instead of three passes.
+    """
+    eroded = _as_bitmask(mask)
+    result = BitMask.zeros(eroded.shape)
+    for _ in range(sum(eroded.shape) + 1):
+        if not eroded.words.any():
+            break
+        next_eroded = erode(eroded, structure)
+        residue = dilate(next_eroded, structure)
+        residue.words ^= eroded.words
+        result.words |= residue.words
+        if next_eroded == eroded:
+            # Elements that only contain the origin never shrink the mask
+            break
+        eroded = next_eroded
+    return result
+
+
+def reconstruct(marker, mask, structure):
+    """Reconstruction by dilation: grow marker inside mask until it is stable"""
+    mask = _as_bitmask(mask)
+    current = _as_bitmask(marker) & mask
+    while True:
+        grown = dilate(current, structure)
+        grown.words &= mask.words
+        # Keep what was reached already, so elements without the origin still converge
+        grown.words |= current.words
+        if grown == current:
+            return current
+        current = grown
+
+
+def _border_seed(shape, structure):
+    """Pixels whose element neighbourhood reaches outside the image"""
+    inside = erode(BitMask.ones(shape), _reflect(structure))
+    return ~inside
+
+
+def fill_holes(mask, structure):
+    """Fill background regions the element cannot reach from outside the image
+
+    Matches scipy.ndimage.binary_fill_holes with the same structure.
+    """
+    background = ~_as_bitmask(mask)
+    outside = reconstruct(_border_seed(background.shape, structure), background, structure)
+    return ~outside
+
+
+def clear_border(mask, structure):
+    """Remove foreground components (connected through structure) touching the border"""
+    mask = _as_bitmask(mask)
+    touching = reconstruct(_border_seed(mask.shape, structure), mask, structure)
+    result = mask.copy()
+    result.words &= ~touching.words
+    return result
+
+
+BASIC_OPERATIONS = ("Erosion", "Dilation", "Opening", "Closing")
+
+OPERATIONS = {
+    "Erosion": erode,
+    "Dilation": dilate,
+    "Opening": opening,
+    "Closing": closing,
+    "Gradient": gradient,
+    "Top-Hat": white_tophat,
+    "Black-Hat": black_tophat,
+    "Hit-or-Miss": hit_or_miss,
+    "Thinning": thin,
+    "Skeleton": skeleton,
+    "Fill Holes": fill_holes,
+    "Clear Border": clear_border,
+}
+
+# How many element radii one input pixel can reach; operations missing here
+# depend on the whole image.
+_REACH_DEPTH = {
+    "Erosion": 1,
+    "Dilation": 1,
+    "Opening": 2,
+    "Closing": 2,
+    "Gradient": 1,
+    "Top-Hat": 2,
+    "Black-Hat": 2,
+    "Hit-or-Miss": 1,
+}
+
+
+def operation_name(name):
+    """Canonical operation name for a case-insensitive spelling such as "top-hat" """
+    for operation in OPERATIONS:
+        if operation.lower() == name.lower():
+            return operation
+    raise ValueError(f"unknown operation: {name!r}")
+
+
+def apply_operation(input_grid, structure, operation):
+    """Run a named operation on a 2-D grid and return a boolean ndarray
+
+    The basic operations match scipy.ndimage.binary_* with the default
+    border_value=0.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"unknown operation: {operation!r}")
+    return OPERATIONS[operation](BitMask.from_array(input_grid), structure).to_array()
+
+
+def operation_reach(structure, operation):
+    """(rows, cols) distance over which one input pixel can change the output
+
+    Returns None for operations such as Fill Holes whose output depends on
+    the whole image.
+    """
+    if operation not in _REACH_DEPTH:
+        return None
+    if operation == "Hit-or-Miss":
+        # The miss element covers the rest of the box
+        structure = np.ones(np.shape(structure), dtype=bool)
+    offsets = _offsets(structure)
+    if not offsets:
+        return 0, 0
+    reach_row = max(abs(dy) for dy, _ in offsets)
+    reach_col = max(abs(dx) for _, dx in offsets)
+    # Opening and closing chain two passes, so the reach doubles
+    depth = _REACH_DEPTH[operation]
+    return depth * reach_row, depth * reach_col
+
+
+def apply_to_window(input_grid, structure, operation, rows, cols, compute=None):
+    """Compute the result for input_grid[rows, cols] only
+
+    The input is read from a crop padded by the operation's reach, clipped at
+    the image border, so the window matches the same region of a full-image
+    result exactly. input_grid may be any sliceable 2-D array, e.g. a memmap.
+    compute defaults to apply_operation and may be any function with its
+    signature, such as a backends dispatcher.
+    """
+    compute = compute or apply_operation
+    reach = operation_reach(structure, operation)
+    if reach is None:
+        raise ValueError(f"{operation} depends on the whole image and cannot run on a window")
+    reach_row, reach_col = reach
+    height, width = input_grid.shape
+    top, bottom, _ = rows.indices(height)
+    left, right, _ = cols.indices(width)
+    crop_top, crop_bottom = max(0, top - reach_row), min(height, bottom + reach_row)
+    crop_left, crop_right = max(0, left - reach_col), min(width, right + reach_col)
+    patch = compute(
+        np.asarray(input_grid[crop_top:crop_bottom, crop_left:crop_right]), structure, operation
+    )
+    return patch[top - crop_top : bottom - crop_top, left - crop_left : right - crop_left]
+
+
+def update_region(input_grid, structure, operation, result, row, col, compute=None):
+    """Patch result in place after input_grid[row, col] changed
+
+    Only the window the change can reach is recomputed. Returns the
+    (row slice, col slice) of the patched window. Whole-image operations
+    (operation_reach is None) raise ValueError. compute is passed on to
+    apply_to_window, e.g. grayscale.apply_operation for grayscale images.
+    """
+    reach = operation_reach(structure, operation)
+    if reach is None:
+        raise ValueError(f"{operation} depends on the whole image and cannot be patched")
+    reach_row, reach_col = reach
+    rows, cols = input_grid.shape
+    window = (
+        slice(max(0, row - reach_row), min(rows, row + reach_row + 1)),
+        slice(max(0, col - reach_col), min(cols, col + reach_col + 1)),
+    )
+    result[window] = apply_to_window(input_grid, structure, operation, *window, compute=compute)
+    return window
+
+
+# Operations apply_stack runs on the packed stack; the rest depend on the
+# whole image and run item by item.
+_STACK_STAGES = {
+    "Erosion": ("erode",),
+    "Dilation": ("dilate",),
+    "Opening": ("erode", "dilate"),
+    "Closing": ("dilate", "erode"),
+}
+
+# Above this many distinct per-item elements, one masked pass over the union
+# of their offsets beats running each group of items separately.
+_MAX_STACK_GROUPS = 4
+
+
+class _Stack:
+    """N masks packed into one tall BitMask, separated by zero gap rows
+
+    A gap at least as tall as the element reach keeps every item reading only
+    its own rows or zeros, which is exactly the zero border of a single
+    image. Rows never share words, so columns need no gap.
+    """
+
+    def __init__(self, stack, gap):
+        count, rows, cols = stack.shape
+        self.count, self.rows, self.cols, self.gap = count, rows, cols, gap
+        pitch = rows + gap
+        padded = np.zeros((count, pitch, cols), dtype=bool)
+        padded[:, :rows] = stack != 0
+        self.mask = BitMask.from_array(padded.reshape(count * pitch, cols)[: count * pitch - gap])
+        self.gap_rows = (np.arange(self.mask.shape[0]) % pitch) >= rows
+        # Item of every tall row, -1 on gap rows
+        self.row_items = np.where(self.gap_rows, -1, np.arange(self.mask.shape[0]) // pitch)
+
+    def clear_gaps(self, mask):
+        mask.words[self.gap_rows] = 0
+        return mask
+
+    def item_rows(self, selected):
+        """Per-row word mask: all ones on the rows of the selected items"""
+        rows = np.append(selected, False)[self.row_items]
+        return np.where(rows, _ALL_ONES, np.uint64(0))[:, None]
+
+    def unpack(self, mask):
+        pitch = self.rows + self.gap
+        words = np.zeros((self.count * pitch, mask.words.shape[1]), dtype=np.uint64)
+        words[: mask.words.shape[0]] = mask.words
+        words = words.reshape(self.count, pitch, -1)[:, : self.rows]
+        bits = np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=2, bitorder="little")
+        return bits[:, :, : self.cols].astype(bool)
+
+
+def _masked_kernels(packed, structures):
+    """erode/dilate for the packed stack where item n uses structures[n]
+
+    Every offset of the union is applied once to the whole stack and only
+    takes effect on the rows of the items whose element contains it.
+    """
+    center = np.array(structures.shape[1:]) // 2
+    selections = [((int(i - center[0]), int(j - center[1])), packed.item_rows(structures[:, i, j]))
+                  for i, j in np.argwhere(structures.any(axis=0))]
+    scratch = np.empty_like(packed.mask.words)
+
+    def erode_(mask):
+        result = BitMask.ones(mask.shape)
+        for (dy, dx), rows in selections:
+            _shift_into(mask.words, dy, dx, mask.shape[1], scratch)
+            # Items without this offset must not be constrained by it
+            np.bitwise_or(scratch, ~rows, out=scratch)
+            result.words &= scratch
+        result._clear_padding()
+        return result
+
+    def dilate_(mask):
+        result = BitMask.zeros(mask.shape)
+        for (dy, dx), rows in selections:
+            _shift_into(mask.words, -dy, -dx, mask.shape[1], scratch)
+            np.bitwise_and(scratch, rows, out=scratch)
+            result.words |= scratch
+        return result
+
+    return erode_, dilate_
+
+
+def _stack_operation(packed, operation, erode_, dilate_):
+    kernels = {"erode": erode_, "dilate": dilate_}
+    stages = _STACK_STAGES.get(operation)
+    if stages is not None:
+        result = packed.mask
+        for index, stage in enumerate(stages):
+            if index:
+                # What a stage wrote into the gaps is outside every image
+                packed.clear_gaps(result)
+            result = kernels[stage](result)
+        return result
+    source = packed.mask
+    if operation == "Gradient":
+        result = dilate_(source)
+        result.words &= ~erode_(source).words
+    elif operation == "Top-Hat":
+        result = _stack_operation(packed, "Opening", erode_, dilate_)
+        result.words ^= source.words
+    else:  # Black-Hat
+        result = _stack_operation(packed, "Closing", erode_, dilate_)
+        result.words &= ~source.words
+    return result
+
+
+def _structure_groups(structures):
+    """(group count, group of every item) for items sharing the same element"""
+    keys = np.packbits(structures.reshape(len(structures), -1), axis=1)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    return len(unique), inverse.reshape(-1)
+
+
+def apply_stack(stack, structure, operation):
+    """Apply operations to a whole (N, H, W) stack of masks in a few array passes
+
+    structure is one 2-D element for every item or an (N, h, w) stack of
+    per-item elements; operation is one name or a sequence of N names. Each
+    item's result equals apply_operation on that item alone: items are packed
+    into one tall bit-packed image with zero rows between them, so no
+    per-item Python work is done for the stackable operations (erosion,
+    dilation, opening, closing, gradient and the top-hats). Other operations
+    fall back to one call per item.
+    """
+    stack = np.asarray(stack)
+    if stack.ndim != 3:
+        raise ValueError(f"expected an (N, H, W) stack, got shape {stack.shape}")
+    count = stack.shape[0]
+    structure = np.asarray(structure) != 0
+    per_item = structure.ndim == 3
+    if per_item and structure.shape[0] != count:
+        raise ValueError(f"expected {count} structuring elements, got {structure.shape[0]}")
+    result = np.zeros(stack.shape, dtype=bool)
+
+    if not isinstance(operation, str):
+        operations = np.asarray(operation)
+        if operations.shape != (count,):
+            raise ValueError(f"expected {count} operation names, got {operations.shape}")
+        for name in np.unique(operations):
+            selected = operations == name
+            result[selected] = apply_stack(stack[selected],
+                                           structure[selected] if per_item else structure, str(name))
+        return result
+
+    if operation not in OPERATIONS:
+        raise ValueError(f"unknown operation: {operation!r}")
+    if not count:
+        return result
+    if operation not in _STACK_STAGES and operation not in ("Gradient", "Top-Hat", "Black-Hat"):
+        for index in range(count):
+            item_structure = structure[index] if per_item else structure
+            result[index] = apply_operation(stack[index], item_structure, operation)
+        return result
+
+    if per_item:
+        group_count, groups = _structure_groups(structure)
+        if group_count <= _MAX_STACK_GROUPS:
+            for group in range(group_count):
+                indices = np.nonzero(groups == group)[0]
+                result[indices] = apply_stack(stack[indices], structure[indices[0]], operation)
+            return result
+        used_rows = np.nonzero(structure.any(axis=(0, 2)))[0] - structure.shape[1] // 2
+        packed = _Stack(stack, int(np.abs(used_rows).max(initial=0)))
+        erode_, dilate_ = _masked_kernels(packed, structure)
+    else:
+        offsets = _offsets(structure)
+        packed = _Stack(stack, max((abs(dy) for dy, _ in offsets), default=0))
+        erode_ = lambda mask: erode(mask, structure)
+        dilate_ = lambda mask: dilate(mask, structure)
+    return packed.unpack(_stack_operation(packed, operation, erode_, dilate_))
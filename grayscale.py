@@ -0,0 +1,176 @@
+"""Grayscale morphology with flat structuring elements.
+
+Erosion is the minimum and dilation the maximum over the element, computed in
+the input's own dtype, so uint8 and uint16 images are never promoted to a
+wider type. Offsets and the border follow engine exactly: pixels outside the
+image count as border_value (0 by default). Binary morphology is the special
+case of images holding only 0 and 1; boolean inputs take the bit-packed engine
+path and, for non-empty elements, give the same result as any integer 0/1
+image.
+"""
+import numpy as np
+
+import engine
+import separable
+
+
+def _offsets(structure):
+    structure = np.asarray(structure)
+    if structure.ndim != 2:
+        raise ValueError(f"structuring element must be 2-D, got shape {structure.shape}")
+    return np.argwhere(structure != 0) - np.array(structure.shape) // 2
+
+
+def _as_image(image):
+    image = np.asarray(image)
+    if image.ndim != 2:
+        raise ValueError(f"expected a 2-D image, got shape {image.shape}")
+    if image.dtype.kind not in "biuf":
+        raise ValueError(f"unsupported image dtype {image.dtype}")
+    return image
+
+
+def _identity(ufunc, dtype):
+    # Value that leaves every pixel unchanged: the top of the range for min
+    limits = np.iinfo(dtype) if dtype.kind in "iu" else np.finfo(dtype)
+    return limits.max if ufunc is np.minimum else limits.min
+
+
+def _reduce(image, structure, ufunc, border_value, sign):
+    """ufunc over image[p + sign * offset] for every offset of structure"""
+    plan = separable.decompose(structure)
+    if plan is None:
+        return _reduce_dense(image, structure, ufunc, border_value, sign)
+    for factor in plan:
+        result = None
+        for segment in factor:
+            start = segment.start if sign > 0 else -(segment.start + segment.length - 1)
+            part = _window_reduce(image, start, segment.length, segment.axis, ufunc, border_value)
+            result = part if result is None else ufunc(result, part, out=result)
+        image = result
+    return image if plan else image.copy()
+
+
+def _window_reduce(image, start, length, axis, ufunc, border_value):
+    """out[i] = ufunc over image[i + start .. i + start + length - 1] along axis
+
+    Built by doubling: log2(length) passes over whole contiguous slices, which
+    numpy runs much faster than a running reduce with ufunc.accumulate.
+    """
+    size = image.shape[axis]
+    before = max(0, -start)
+    after = max(0, start + length - 1)
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (before, after)
+    window = np.pad(image, pad, constant_values=border_value)
+    if axis == 1:
+        window = window.T
+    span = 1
+    while span * 2 <= length:
+        ufunc(window[:-span], window[span:], out=window[:-span])
+        span *= 2
+    if span < length:
+        # Two overlapping windows of size span cover the full length
+        ufunc(window[: -(length - span)], window[length - span :], out=window[: -(length - span)])
+    first = before + start
+    result = window[first : first + size]
+    return np.ascontiguousarray(result.T if axis == 1 else result)
+
+
+def _reduce_dense(image, structure, ufunc, border_value, sign):
+    offsets = sign * _offsets(structure)
+    result = np.full(image.shape, _identity(ufunc, image.dtype), dtype=image.dtype)
+    if not len(offsets):
+        return result
+    reach_row, reach_col = np.abs(offsets).max(axis=0)
+    padded = np.pad(image, ((reach_row, reach_row), (reach_col, reach_col)),
+                    constant_values=border_value)
+    rows, cols = image.shape
+    for dy, dx in offsets:
+        top, left = reach_row + dy, reach_col + dx
+        ufunc(result, padded[top : top + rows, left : left + cols], out=result)
+    return result
+
+
+def erode(image, structure, border_value=0):
+    """Minimum of image over the element; outside pixels count as border_value"""
+    image = _as_image(image)
+    if image.dtype == bool:
+        return engine.erode(image, structure, border_value=int(bool(border_value))).to_array()
+    return _reduce(image, structure, np.minimum, border_value, 1)
+
+
+def dilate(image, structure, border_value=0):
+    """Maximum of image over the reflected element"""
+    image = _as_image(image)
+    if image.dtype == bool:
+        if border_value:
+            raise ValueError("boolean dilation only supports border_value=0")
+        return engine.dilate(image, structure).to_array()
+    return _reduce(image, structure, np.maximum, border_value, -1)
+
+
+def opening(image, structure):
+    return dilate(erode(image, structure), structure)
+
+
+def closing(image, structure):
+    return erode(dilate(image, structure), structure)
+
+
+def _subtract(minuend, subtrahend):
+    """minuend - subtrahend clipped at zero, without leaving the dtype
+
+    On 0/1 images this is minuend AND NOT subtrahend, as in engine.
+    """
+    if minuend.dtype == bool:
+        return minuend & ~subtrahend
+    return np.subtract(minuend, np.minimum(minuend, subtrahend))
+
+
+def gradient(image, structure):
+    """Dilation minus erosion"""
+    return _subtract(dilate(image, structure), erode(image, structure))
+
+
+def white_tophat(image, structure):
+    """Image minus its opening: bright details smaller than the element"""
+    image = _as_image(image)
+    return _subtract(image, opening(image, structure))
+
+
+def black_tophat(image, structure):
+    """Closing minus the image: dark details smaller than the element"""
+    image = _as_image(image)
+    return _subtract(closing(image, structure), image)
+
+
+OPERATIONS = {
+    "Erosion": erode,
+    "Dilation": dilate,
+    "Opening": opening,
+    "Closing": closing,
+    "Gradient": gradient,
+    "Top-Hat": white_tophat,
+    "Black-Hat": black_tophat,
+}
+
+
+def apply_operation(image, structure, operation):
+    """Run a named operation on a 2-D grayscale image, keeping its dtype"""
+    if operation not in OPERATIONS:
+        if operation in engine.OPERATIONS:
+            raise ValueError(f"{operation} is only available for binary images")
+        raise ValueError(f"unknown operation: {operation!r}")
+    return OPERATIONS[operation](image, structure)
+
+
+def dtype_for_levels(levels):
+    """Smallest unsigned dtype holding intensities 0 .. levels - 1"""
+    if levels <= 2:
+        return np.dtype(bool)
+    if levels <= 256:
+        return np.dtype(np.uint8)
+    if levels <= 65536:
+        return np.dtype(np.uint16)
+    raise ValueError(f"at most 65536 intensity levels are supported, got {levels}")
@@ -0,0 +1,174 @@
+"""Opt-in timing of the app's hot paths, with Chrome trace-event export.
+
+Code marks work with ``tracer.span(name, category)`` and events with
+``tracer.count(name)``; the frame clock calls ``tracer.frame()`` once per
+frame so counts can be reported per frame. While the tracer is disabled
+(the default) span returns a shared no-op context and count returns at
+once, so instrumented code costs next to nothing.
+
+The recorded spans and per-frame counters are written with
+``tracer.export(path)`` in the Chrome trace-event format, which opens in
+chrome://tracing or https://ui.perfetto.dev.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import nullcontext
+
+
+_NULL_SPAN = nullcontext()
+
+
+def _now_us():
+    return time.perf_counter_ns() / 1000.0
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "category", "start")
+
+    def __init__(self, tracer, name, category):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.category, self.start, _now_us() - self.start)
+        return False
+
+
+class Tracer:
+    """Collects spans and counters in bounded buffers
+
+    max_events bounds the trace kept for export, history the number of
+    recent durations and frames the live statistics are computed from.
+    """
+
+    def __init__(self, max_events=200000, history=240):
+        self.enabled = False
+        self.events = deque(maxlen=max_events)
+        self.durations = defaultdict(lambda: deque(maxlen=history))
+        self.categories = {}
+        self.counters = Counter()
+        self.frames = deque(maxlen=history)
+        self.frame_start = None
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def enable(self):
+        self.enabled = True
+        self.restartFrame()
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+            self.durations.clear()
+            self.categories.clear()
+            self.counters.clear()
+            self.frames.clear()
+
+    def span(self, name, category="app"):
+        """Context manager timing the enclosed block"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category)
+
+    def traced(self, name=None, category="app"):
+        """Decorator form of span, named after the function by default"""
+        def decorate(function):
+            label = name or function.__qualname__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Span(self, label, category):
+                    return function(*args, **kwargs)
+
+            return wrapper
+        return decorate
+
+    def record(self, name, category, start, duration):
+        """Add a finished span; start and duration in microseconds"""
+        event = {"name": name, "cat": category, "ph": "X", "ts": start, "dur": duration,
+                 "pid": self.pid, "tid": threading.get_ident()}
+        with self.lock:
+            self.events.append(event)
+            self.durations[name].append(duration)
+            self.categories[name] = category
+
+    def count(self, name, amount=1):
+        """Count an event in the current frame"""
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += amount
+
+    def restartFrame(self):
+        """Start a new frame now, e.g. when frames resume after being idle"""
+        self.frame_start = _now_us()
+
+    def frame(self):
+        """Close the current frame: store its length and counts and start the next"""
+        if not self.enabled:
+            return
+        now = _now_us()
+        with self.lock:
+            counts = dict(self.counters)
+            self.counters.clear()
+            start = self.frame_start if self.frame_start is not None else now
+            self.frame_start = now
+            self.frames.append((now - start, counts))
+            self.events.append({"name": "frame", "cat": "frame", "ph": "X", "ts": start,
+                                "dur": now - start, "pid": self.pid,
+                                "tid": threading.get_ident()})
+            if counts:
+                self.events.append({"name": "per frame", "ph": "C", "ts": start,
+                                    "pid": self.pid, "args": counts})
+
+    def stats(self, category=None):
+        """{name: (calls, mean ms, max ms)} over the recent spans of a category"""
+        with self.lock:
+            recent = {name: list(values) for name, values in self.durations.items()
+                      if category is None or self.categories[name] == category}
+        return {name: (len(values), sum(values) / len(values) / 1000.0, max(values) / 1000.0)
+                for name, values in recent.items() if values}
+
+    def frame_stats(self):
+        """(frames per second, mean frame ms, mean count per frame by name) of recent frames"""
+        with self.lock:
+            frames = list(self.frames)
+        if not frames:
+            return 0.0, 0.0, {}
+        total = sum(length for length, _ in frames)
+        totals = Counter()
+        for _, counts in frames:
+            totals.update(counts)
+        mean = total / len(frames) / 1000.0
+        fps = 1000.0 / mean if mean > 0 else 0.0
+        return fps, mean, {name: value / len(frames) for name, value in totals.items()}
+
+    def export(self, path):
+        """Write the recorded events as a Chrome trace-event JSON file"""
+        with self.lock:
+            events = list(self.events)
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid,
+                     "args": {"name": "MorphoLogic"}}]
+        for thread in threading.enumerate():
+            metadata.append({"name": "thread_name", "ph": "M", "pid": self.pid,
+                             "tid": thread.ident, "args": {"name": thread.name}})
+        with open(path, "w") as handle:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, handle)
+        return len(events)
+
+
+# Shared by the whole app
+tracer = Tracer()
@@ -1,224 +1,452 @@
+import argparse
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QGridLayout, QPushButton,
+    QApplication, QMainWindow, QWidget, QPushButton,
     QVBoxLayout, QHBoxLayout, QComboBox, QLabel, QGroupBox,
-    QTextEdit, QLineEdit
+    QTextEdit, QLineEdit, QSpinBox
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QPropertyAnimation, QEasingCurve, QRect
-from PyQt5.QtGui import QColor
-from PyQt5.QtCore import QSize
-from scipy import ndimage
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QRectF, QPointF, QLineF, QObject, QElapsedTimer
+from PyQt5.QtGui import QColor, QImage, QPainter, QPen
 from PyQt5.QtCore import Qt, pyqtSignal, QTimer
 from PyQt5.QtGui import QColor
-import math
 
+import animation
+import components
+import engine
+import grayscale
+import pipeline
+import structures
+from instrumentation import tracer
+from result_cache import ResultCache
+
+
+class AnimationClock(QObject):
+    """Single frame clock shared by every animation in the app
+
+    Clients register a callback that takes the seconds elapsed since the
+    previous frame and returns whether it still needs frames. The timer only
+    runs while a client is active. Qt widgets get no vsync callback, so the
+    tick period follows the primary screen's refresh rate, capped at max_fps.
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
 
-class AnimatedPixelButton(QPushButton):
-    def __init__(self, row, col, button_size=30):
+    def __init__(self, max_fps=60):
         super().__init__()
-        self.row = row
-        self.col = col
-        self.state = False
-        self.is_hovered = False
-        self.click_animation_active = False
-        self.base_size = button_size
-        self.setFixedSize(button_size, button_size)
-        
-        # Store original position and size
-        self.original_geometry = None
-        
-        # Animation properties
-        self.highlight_progress = 0.0
-        self.processing_animation = False
-        
-        # Setup hover/click animations
-        self.hover_animation = QPropertyAnimation(self, b"geometry")
-        self.hover_animation.setDuration(150)
-        self.hover_animation.setEasingCurve(QEasingCurve.OutCubic)
-        
-        self.click_animation = QPropertyAnimation(self, b"geometry")
-        self.click_animation.setDuration(100)
-        self.click_animation.setEasingCurve(QEasingCurve.OutCubic)
-        
-        # Timer for processing animation
-        self.process_timer = QTimer(self)
-        self.process_timer.timeout.connect(self.updateProcessingAnimation)
-        self.process_timer.setInterval(5)
-        
-        self.setMouseTracking(True)
-        self.updateStyle()
+        self.max_fps = max_fps
+        self.clients = {}
+        self.frame_count = 0
+        self.elapsed = QElapsedTimer()
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.advance)
+        self.updateInterval()
+
+    def frameRate(self):
+        screen = QApplication.primaryScreen()
+        refresh = screen.refreshRate() if screen else 0
+        return min(self.max_fps, refresh) if refresh > 0 else self.max_fps
+
+    def setMaxFps(self, fps):
+        self.max_fps = fps
+        self.updateInterval()
+
+    def updateInterval(self):
+        self.timer.setInterval(max(1, round(1000 / self.frameRate())))
+
+    def requestFrames(self, callback):
+        """Call callback(elapsed) every frame until it returns False"""
+        self.clients[callback] = True
+        if not self.timer.isActive():
+            self.elapsed.start()
+            self.timer.start()
+            tracer.restartFrame()
+
+    def cancel(self, callback):
+        self.clients.pop(callback, None)
+
+    def advance(self):
+        elapsed = self.elapsed.restart() / 1000.0
+        self.frame_count += 1
+        tracer.frame()
+        with tracer.span("animation tick", "frame"):
+            for callback in list(self.clients):
+                if not callback(elapsed):
+                    self.clients.pop(callback, None)
+        if not self.clients:
+            self.timer.stop()
+
+
+class ResultWorker(QObject):
+    """Computes results on a background thread; only the newest request counts
+
+    submit() cancels the previous request if it has not started yet, and
+    every request gets a generation number. resultReady is delivered on the
+    GUI thread with the generation and the finished future, so the receiver
+    can discard results that a newer request has superseded.
+    """
+
+    resultReady = pyqtSignal(int, object)
 
-    def showEvent(self, event):
-        super().showEvent(event)
-        if self.original_geometry is None:
-            self.original_geometry = self.geometry()
-
-    def enterEvent(self, event):
-        self.is_hovered = True
-        if self.original_geometry is None:
-            self.original_geometry = self.geometry()
-            
-        new_size = int(self.base_size * 1.1)
-        new_geometry = QRect(self.original_geometry)
-        new_geometry.setSize(QSize(new_size, new_size))
-        new_geometry.moveCenter(self.original_geometry.center())
-        
-        self.hover_animation.setStartValue(self.geometry())
-        self.hover_animation.setEndValue(new_geometry)
-        self.hover_animation.start()
-        self.updateStyle()
-        super().enterEvent(event)
+    def __init__(self):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="morphology")
+        self.generation = 0
+        self.future = None
 
-    def leaveEvent(self, event):
-        self.is_hovered = False
-        self.hover_animation.setStartValue(self.geometry())
-        self.hover_animation.setEndValue(self.original_geometry)
-        self.hover_animation.start()
-        self.updateStyle()
-        super().leaveEvent(event)
+    def submit(self, function, *args):
+        self.generation += 1
+        if self.future is not None:
+            self.future.cancel()
+        generation = self.generation
+        self.future = self.executor.submit(function, *args)
+        self.future.add_done_callback(lambda future: self.finished(generation, future))
+        return generation
 
-    def mousePressEvent(self, event):
-        if event.button() == Qt.LeftButton:
-            self.click_animation_active = True
-            if self.original_geometry is None:
-                self.original_geometry = self.geometry()
-            
-            current_size = self.geometry().width()
-            new_size = int(self.base_size * 0.9)
-            new_geometry = QRect(self.original_geometry)
-            new_geometry.setSize(QSize(new_size, new_size))
-            new_geometry.moveCenter(self.original_geometry.center())
-            
-            self.click_animation.setStartValue(self.geometry())
-            self.click_animation.setEndValue(new_geometry)
-            self.click_animation.start()
-            
-            self.updateStyle()
-        super().mousePressEvent(event)
+    def finished(self, generation, future):
+        # Runs on the worker thread; the signal is queued to the GUI thread
+        if not future.cancelled():
+            self.resultReady.emit(generation, future)
 
-    def mouseReleaseEvent(self, event):
-        if event.button() == Qt.LeftButton:
-            self.click_animation_active = False
-            new_size = int(self.base_size * (1.1 if self.is_hovered else 1.0))
-            new_geometry = QRect(self.original_geometry)
-            new_geometry.setSize(QSize(new_size, new_size))
-            new_geometry.moveCenter(self.original_geometry.center())
-            
-            self.click_animation.setStartValue(self.geometry())
-            self.click_animation.setEndValue(new_geometry)
-            self.click_animation.start()
-            self.updateStyle()
-        super().mouseReleaseEvent(event)
+    def isCurrent(self, generation):
+        return generation == self.generation
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
-    def startProcessingAnimation(self, target_state):
-        """Start the processing animation for morphological operations"""
-        self.processing_animation = True
-        self.target_state = target_state
-        self.highlight_progress = 0.0
-        self.process_timer.start()
-
-    def updateProcessingAnimation(self):
-        """Update the processing animation state"""
-        if self.processing_animation:
-            self.highlight_progress += 0.1
-            if self.highlight_progress >= 1.0:
-                self.highlight_progress = 0.0
-                self.processing_animation = False
-                self.state = self.target_state
-                self.process_timer.stop()
-            self.updateStyle()
-
-    def updateStyle(self):
-        # Base color calculation
-        if self.processing_animation:
-            # Calculate animation colors for processing
-            if self.target_state:  # Transitioning to black
-                r = g = b = int(255 * (1.0 - self.highlight_progress))
-                highlight = QColor(0, 100, 255)  # Blue highlight
-            else:  # Transitioning to white
-                r = g = b = int(255 * self.highlight_progress)
-                highlight = QColor(255, 100, 0)  # Orange highlight
-            
-            # Blend with highlight color
-            blend_factor = abs(math.sin(self.highlight_progress * math.pi)) * 0.5
-            base_color = QColor(
-                int(r * (1 - blend_factor) + highlight.red() * blend_factor),
-                int(g * (1 - blend_factor) + highlight.green() * blend_factor),
-                int(b * (1 - blend_factor) + highlight.blue() * blend_factor)
-            )
-        else:
-            # Normal state coloring
-            base_intensity = 255 if not self.state else 0
-            if self.is_hovered:
-                if self.state:  # Dark state
-                    base_color = QColor(40, 40, 60)  # Dark blue-ish
-                else:  # Light state
-                    base_color = QColor(220, 220, 255)  # Light blue-ish
-            else:
-                base_color = QColor(base_intensity, base_intensity, base_intensity)
-            
-            if self.click_animation_active:
-                if self.state:
-                    base_color = QColor(40, 60, 40)  # Dark green-ish
-                else:
-                    base_color = QColor(220, 255, 220)  # Light green-ish
-        
-        # Border style
-        border_style = "2px solid #666" if self.is_hovered else "1px solid gray"
-        
-        self.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {base_color.name()};
-                border: {border_style};
-                border-radius: 2px;
-            }}
-        """)
 
 class EnhancedGridWidget(QWidget):
+    """Binary or grayscale grid drawn from a single numpy-backed QImage instead of one widget per cell
+
+    levels is the number of intensities a cell can take; 2 keeps the grid
+    binary, more makes cells hold 0 .. levels - 1 (higher is darker).
+    """
+
     gridChanged = pyqtSignal()
+    cellToggled = pyqtSignal(int, int)
+
+    # Largest side, in pixels, the widget asks for before cells shrink below button_size
+    max_canvas_size = 800
 
-    def __init__(self, rows=10, cols=10, editable=False, button_size=30):
+    # Seconds a cell takes to fade to its new state
+    processing_duration = animation.FADE_DURATION
+
+    def __init__(self, rows=10, cols=10, editable=False, button_size=30, levels=2):
         super().__init__()
         self.rows = rows
         self.cols = cols
         self.editable = editable
         self.button_size = button_size
-        self.buttons = []
+        self.levels = levels
+
+        # Per-cell state, kept as flat numpy buffers
+        dtype = grayscale.dtype_for_levels(levels)
+        self.state = np.zeros((rows, cols), dtype=dtype)
+        self.processing = np.zeros((rows, cols), dtype=bool)
+        self.target_state = np.zeros((rows, cols), dtype=dtype)
+        self.highlight_progress = np.zeros((rows, cols), dtype=np.float32)
+
+        self.hovered_cell = None
+        self.pressed_cell = None
+        self._pixels = None
+        self._image = None
+        self._image_dirty = True
+
         self.initUI()
 
     def initUI(self):
-        layout = QGridLayout()
-        layout.setSpacing(0)
-
-        for i in range(self.rows):
-            row_buttons = []
-            for j in range(self.cols):
-                btn = AnimatedPixelButton(i, j, self.button_size)
-                if self.editable:
-                    btn.clicked.connect(self.buttonClicked)
-                layout.addWidget(btn, i, j)
-                row_buttons.append(btn)
-            self.buttons.append(row_buttons)
+        self.setMouseTracking(True)
+        scale = min(1.0, self.max_canvas_size / (max(self.rows, self.cols) * self.button_size))
+        # One extra pixel so the closing border line stays inside the widget
+        self.setMinimumSize(
+            max(1, int(self.cols * self.button_size * scale)) + 1,
+            max(1, int(self.rows * self.button_size * scale)) + 1,
+        )
+
+    def sizeHint(self):
+        return self.minimumSize()
+
+    def cellSize(self):
+        return min((self.width() - 1) / self.cols, (self.height() - 1) / self.rows)
+
+    def cellAt(self, pos):
+        """Map a widget position to a (row, col) cell, or None outside the grid"""
+        size = self.cellSize()
+        row = int(pos.y() // size)
+        col = int(pos.x() // size)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def mouseMoveEvent(self, event):
+        cell = self.cellAt(event.pos())
+        if cell != self.hovered_cell:
+            self.hovered_cell = cell
+            self.update()
+        super().mouseMoveEvent(event)
 
-        self.setLayout(layout)
+    def leaveEvent(self, event):
+        self.hovered_cell = None
+        self.pressed_cell = None
+        self.update()
+        super().leaveEvent(event)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.pressed_cell = self.cellAt(event.pos())
+            self.update()
+        super().mousePressEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            cell = self.cellAt(event.pos())
+            clicked = cell is not None and cell == self.pressed_cell
+            self.pressed_cell = None
+            self.update()
+            if clicked and self.editable:
+                self.cellClicked(*cell)
+        super().mouseReleaseEvent(event)
 
-    def buttonClicked(self):
-        button = self.sender()
-        button.state = not button.state
-        button.updateStyle()
+    def cellClicked(self, row, col):
+        if self.levels == 2:
+            self.state[row, col] = not self.state[row, col]
+        else:
+            # Step through a few evenly spaced intensities, back to 0 after the top one
+            top = self.levels - 1
+            value = int(self.state[row, col])
+            self.state[row, col] = 0 if value >= top else min(top, value - (-top // 4))
+        self._image_dirty = True
+        self.update()
+        self.cellToggled.emit(row, col)
         self.gridChanged.emit()
 
+    def startProcessingAnimation(self, rows, cols, target_state):
+        """Start the processing animation for the given cell(s)"""
+        self.processing[rows, cols] = True
+        self.target_state[rows, cols] = target_state
+        self.highlight_progress[rows, cols] = 0.0
+        self._image_dirty = True
+        AnimationClock.instance().requestFrames(self.updateProcessingAnimation)
+
+    def updateProcessingAnimation(self, elapsed):
+        """Advance every cell that is mid-animation; one repaint per frame"""
+        active = self.processing
+        if not active.any():
+            return False
+        self.highlight_progress[active] += elapsed / self.processing_duration
+        done = active & (self.highlight_progress >= 1.0)
+        self.state[done] = self.target_state[done]
+        self.highlight_progress[done] = 0.0
+        self.processing[done] = False
+        self._image_dirty = True
+        self.update()
+        return bool(self.processing.any())
+
+    def cellColors(self):
+        """0xAARRGGBB color of every cell, ignoring hover and press feedback"""
+        return animation.cell_colors(self.state, self.levels, self.processing, self.target_state,
+                                     self.highlight_progress)
+
+    def gridImage(self):
+        """Rows x cols QImage with one pixel per cell, rebuilt only when cells change"""
+        if self._image_dirty or self._image is None:
+            tracer.count("image rebuilds")
+            with tracer.span("cellColors", "paint"):
+                self._pixels = np.ascontiguousarray(self.cellColors(), dtype=np.uint32)
+            self._image = QImage(
+                self._pixels.data, self.cols, self.rows, self.cols * 4, QImage.Format_RGB32
+            )
+            self._image_dirty = False
+        return self._image
+
+    def paintEvent(self, event):
+        tracer.count("repaints")
+        with tracer.span("paintEvent", "paint"):
+            self.paintGrid()
+
+    def paintGrid(self):
+        size = self.cellSize()
+        painter = QPainter(self)
+        painter.drawImage(QRectF(0, 0, self.cols * size, self.rows * size), self.gridImage())
+
+        # Cell borders only when cells are large enough for them to be visible
+        if size >= 6:
+            painter.setPen(QColor("gray"))
+            lines = [QLineF(0, i * size, self.cols * size, i * size) for i in range(self.rows + 1)]
+            lines += [QLineF(j * size, 0, j * size, self.rows * size) for j in range(self.cols + 1)]
+            painter.drawLines(lines)
+
+        cell = self.pressed_cell or self.hovered_cell
+        if cell is not None:
+            self.paintFocusCell(painter, cell, size)
+        painter.end()
+
+    def paintFocusCell(self, painter, cell, size):
+        """Draw the hovered or pressed cell grown or shrunk on top of the grid"""
+        row, col = cell
+        state = 2 * int(self.state[row, col]) >= self.levels - 1
+        if self.processing[row, col]:
+            color = QColor(int(self.gridImage().pixel(col, row)))
+        elif cell == self.pressed_cell:
+            color = QColor(40, 60, 40) if state else QColor(220, 255, 220)  # Green-ish
+        else:
+            color = QColor(40, 40, 60) if state else QColor(220, 220, 255)  # Blue-ish
+
+        scale = 0.9 if cell == self.pressed_cell else 1.1
+        rect = QRectF(0, 0, size * scale, size * scale)
+        rect.moveCenter(QPointF((col + 0.5) * size, (row + 0.5) * size))
+        painter.setPen(QPen(QColor("#666"), 2))
+        painter.setBrush(color)
+        painter.drawRoundedRect(rect, 2, 2)
+
     def getGrid(self):
-        return np.array([[int(btn.state) for btn in row] for row in self.buttons])
+        with tracer.span("getGrid"):
+            return self.state.astype(int)
 
     def setGrid(self, grid):
         if grid is None or len(grid) != self.rows or len(grid[0]) != self.cols:
             return
-        for i in range(self.rows):
-            for j in range(self.cols):
-                self.buttons[i][j].state = bool(grid[i][j])
-                self.buttons[i][j].updateStyle()
+        if self.levels == 2:
+            self.state[:] = np.asarray(grid) != 0
+        else:
+            self.state[:] = np.clip(grid, 0, self.levels - 1)
+        self._image_dirty = True
+        self.update()
+
+    def setLevels(self, levels):
+        """Switch the number of intensity levels, rescaling the current cells"""
+        old_top, top = self.levels - 1, levels - 1
+        values = (self.state.astype(np.int64) * top + old_top // 2) // old_top
+        dtype = grayscale.dtype_for_levels(levels)
+        self.levels = levels
+        self.state = values.astype(dtype)
+        self.target_state = np.zeros((self.rows, self.cols), dtype=dtype)
+        self.processing[:] = False
+        self.highlight_progress[:] = 0.0
+        self._image_dirty = True
+        self.update()
+
+
+class PerformanceOverlay(QLabel):
+    """Live frame rate, per-frame counts and compute latency from the tracer"""
+
+    def __init__(self, parent, interval=250):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet("background: rgba(0, 0, 0, 170); color: #9f9; padding: 6px;"
+                           "font-family: monospace; font-size: 11px;")
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(interval)
+        self.refresh()
+
+    def refresh(self):
+        fps, frame_ms, per_frame = tracer.frame_stats()
+        lines = [f"{fps:5.1f} fps  {frame_ms:6.2f} ms/frame"]
+        lines += [f"{name}/frame: {value:.1f}" for name, value in sorted(per_frame.items())]
+        for category in ("app", "paint"):
+            for name, (calls, mean, worst) in sorted(tracer.stats(category).items()):
+                lines.append(f"{name}: {mean:.2f} ms (max {worst:.2f})")
+        compute = tracer.stats("compute")
+        if compute:
+            lines.append("compute, mean / max ms:")
+            lines += [f"  {name}: {mean:.2f} / {worst:.2f} ({calls}x)"
+                      for name, (calls, mean, worst) in sorted(compute.items())]
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        self.raise_()
+
+
+class ComponentAnalysisWidget(QGroupBox):
+    """Component count, holes, Euler number, area histogram and largest boxes of two grids
+
+    Grids are handed over by reference whenever they change, with the
+    window that changed when only part of them did, and analysed together a
+    moment later, so a burst of edits costs one refresh. Each refresh diffs
+    the merged window against the grid's components.ComponentTracker, which
+    follows a few toggled cells incrementally and relabels otherwise.
+    Non-zero cells count as foreground, 8-connected.
+    """
+
+    def __init__(self, names=("Input", "Result"), delay=100, largest=3):
+        super().__init__("Components")
+        self.largest = largest
+        self.grids = dict.fromkeys(names)
+        # Window to diff at the next refresh, by name; None compares the whole grid
+        self.windows = {}
+        self.trackers = dict.fromkeys(names)
+        self.labels = {}
+        layout = QHBoxLayout()
+        for name in names:
+            label = QLabel()
+            label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+            label.setStyleSheet("font-family: monospace; font-size: 11px;")
+            layout.addWidget(label)
+            self.labels[name] = label
+        self.setLayout(layout)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.refresh)
+
+    def setGrid(self, name, grid, window=None):
+        """Analyse grid (not copied) at the next refresh
+
+        window, a (row slice, col slice) pair, promises that nothing outside
+        it changed since the last call; windows are merged until the refresh.
+        """
+        self.grids[name] = grid
+        if name not in self.windows:
+            self.windows[name] = window
+        elif self.windows[name] is not None and window is not None:
+            pending = self.windows[name]
+            self.windows[name] = tuple(slice(min(old.start, new.start), max(old.stop, new.stop))
+                                       for old, new in zip(pending, window))
+        else:
+            self.windows[name] = None
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def refresh(self):
+        windows, self.windows = self.windows, {}
+        for name, window in windows.items():
+            grid = self.grids[name]
+            with tracer.span(f"components ({name.lower()})", "compute"):
+                tracker = self.trackers[name]
+                if tracker is None:
+                    tracker = self.trackers[name] = components.ComponentTracker(grid)
+                else:
+                    tracker.update(grid, window)
+                summary = tracker.summary(self.largest)
+            self.labels[name].setText(self.describe(name, summary))
+
+    @staticmethod
+    def describe(name, summary):
+        lines = [
+            name,
+            f"components: {summary['count']}",
+            f"holes: {summary['holes']}  Euler: {summary['euler']}",
+            f"area: {summary['area']} cells",
+        ]
+        if summary["histogram"]:
+            lines.append("sizes:")
+            lines += [f"  {low}-{high - 1}: {count}" if high - low > 1 else f"  {low}: {count}"
+                      for (low, high), count in summary["histogram"].items()]
+        if summary["largest"]:
+            lines.append("largest (rows, cols):")
+            lines += [f"  {area} at {top}-{bottom}, {left}-{right}"
+                      for area, (top, left, bottom, right) in summary["largest"]]
+        return "\n".join(lines)
 
 
 class OperationExplanationWidget(QTextEdit):
@@ -234,244 +462,24 @@ class OperationExplanationWidget(QTextEdit):
             "Dilation": """Dilation expands or thickens objects. It adds pixels to object boundaries,useful for filling small holes or connecting nearby components.""",
             "Opening": """Opening is erosion followed by dilation. It removes small objects while preserving the shape and size of larger objects.""",
             "Closing": """Closing is dilation followed by erosion. It fills small holes and gaps while preserving the shape and size of objects.""",
+            "Gradient": """The morphological gradient is dilation minus erosion. It keeps a band around every object boundary, useful as an outline or edge detector.""",
+            "Top-Hat": """The top-hat is the input minus its opening. It keeps the small bright details that the structuring element cannot fit inside.""",
+            "Black-Hat": """The black-hat is the closing minus the input. It keeps the small holes and gaps that the closing fills.""",
+            "Hit-or-Miss": """Hit-or-miss marks pixels where the structuring element fits the foreground and its complement fits the background, useful for finding exact local patterns such as corners or endpoints.""",
+            "Thinning": """Thinning repeatedly peels boundary pixels that do not break connectivity, leaving a one-pixel-wide skeleton with the same topology. The structuring element is not used.""",
+            "Skeleton": """The morphological skeleton is the union of what each successive erosion loses to its opening. The input can be rebuilt from it, but it need not stay connected.""",
+            "Fill Holes": """Fill holes sets every background region that cannot be reached from outside the grid, using the structuring element as connectivity.""",
+            "Clear Border": """Clear border removes every object that touches the edge of the grid, using the structuring element as connectivity.""",
         }
         self.setText(explanations.get(operation, ""))
 
 
-class TextPatternGenerator:
-    def __init__(self):
-        # Initialize font parameters
-        self.font_size = (7, 5)  # Height and width for each character
-
-    def _get_digit_pattern(self, digit):
-        """Generate pattern for a digit (0-9)"""
-        grid = np.zeros(self.font_size)
-        h, w = self.font_size
-
-        if digit == "0":
-            # Draw a rectangle with empty center
-            grid[0, 1 : w - 1] = 1  # Top
-            grid[h - 1, 1 : w - 1] = 1  # Bottom
-            grid[1 : h - 1, 0] = 1  # Left
-            grid[1 : h - 1, w - 1] = 1  # Right
-        elif digit == "1":
-            grid[:, w // 2] = 1  # Vertical line
-            grid[0, w // 2 - 1 : w // 2 + 1] = 1  # Top serif
-            grid[h - 1, w // 2 - 1 : w // 2 + 1] = 1  # Base
-        elif digit == "2":
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-            grid[h - 1, :] = 1  # Bottom
-            grid[1 : h // 2, w - 1] = 1  # Top right
-            grid[h // 2 + 1 : h - 1, 0] = 1  # Bottom left
-        elif digit == "3":
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-            grid[h - 1, :] = 1  # Bottom
-            grid[1 : h - 1, w - 1] = 1  # Right side
-        elif digit == "4":
-            grid[: h // 2 + 1, 0] = 1  # Left top
-            grid[h // 2, :] = 1  # Middle
-            grid[:, w - 1] = 1  # Right side
-        elif digit == "5":
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-            grid[h - 1, :] = 1  # Bottom
-            grid[1 : h // 2, 0] = 1  # Top left
-            grid[h // 2 + 1 : h - 1, w - 1] = 1  # Bottom right
-        elif digit == "6":
-            grid[:, 0] = 1  # Left side
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-            grid[h - 1, :] = 1  # Bottom
-            grid[h // 2 :, w - 1] = 1  # Bottom right
-        elif digit == "7":
-            grid[0, :] = 1  # Top
-            grid[:, w - 1] = 1  # Right side
-        elif digit == "8":
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-            grid[h - 1, :] = 1  # Bottom
-            grid[:, 0] = 1  # Left side
-            grid[:, w - 1] = 1  # Right side
-        elif digit == "9":
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-            grid[h - 1, :] = 1  # Bottom
-            grid[: h // 2, 0] = 1  # Top left
-            grid[:, w - 1] = 1  # Right side
-
-        return grid
-
-    def _get_letter_pattern(self, letter):
-        """Generate pattern for a letter (A-Z)"""
-        grid = np.zeros(self.font_size)
-        h, w = self.font_size
-
-        if letter == "A":
-            grid[1:, 0] = 1  # Left side
-            grid[1:, w - 1] = 1  # Right side
-            grid[0, 1 : w - 1] = 1  # Top
-            grid[h // 2, 1 : w - 1] = 1  # Middle
-        elif letter == "B":
-            grid[:, 0] = 1  # Left side
-            grid[0, : w - 1] = 1  # Top
-            grid[h - 1, : w - 1] = 1  # Bottom
-            grid[h // 2, : w - 1] = 1  # Middle
-            grid[1 : h // 2, w - 1] = 1  # Top right
-            grid[h // 2 + 1 : h - 1, w - 1] = 1  # Bottom right
-        elif letter == "C":
-            grid[1 : h - 1, 0] = 1  # Left side
-            grid[0, 1:] = 1  # Top
-            grid[h - 1, 1:] = 1  # Bottom
-        elif letter == "D":
-            grid[:, 0] = 1  # Left side
-            grid[0, : w - 1] = 1  # Top
-            grid[h - 1, : w - 1] = 1  # Bottom
-            grid[1 : h - 1, w - 1] = 1  # Right side
-        elif letter == "E":
-            grid[:, 0] = 1  # Left side
-            grid[0, :] = 1  # Top
-            grid[h - 1, :] = 1  # Bottom
-            grid[h // 2, :] = 1  # Middle
-        elif letter == "F":
-            grid[:, 0] = 1  # Left side
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-        elif letter == "G":
-            grid[1 : h - 1, 0] = 1  # Left side
-            grid[0, 1:] = 1  # Top
-            grid[h - 1, 1:] = 1  # Bottom
-            grid[h // 2 : h - 1, w - 1] = 1  # Bottom right
-            grid[h // 2, h // 2 :] = 1  # Middle right
-        elif letter == "H":
-            grid[:, 0] = 1  # Left side
-            grid[:, w - 1] = 1  # Right side
-            grid[h // 2, :] = 1  # Middle
-        elif letter == "I":
-            grid[0, :] = 1  # Top
-            grid[h - 1, :] = 1  # Bottom
-            grid[:, w // 2] = 1  # Middle vertical
-        elif letter == "J":
-            grid[0, :] = 1  # Top
-            grid[:, w - 1] = 1  # Right side
-            grid[h - 1, : w - 1] = 1  # Bottom
-            grid[h - 2, 0] = 1  # Bottom left corner
-        elif letter == "K":
-            grid[:, 0] = 1  # Left side
-            for i in range(h):
-                j = abs(i - h // 2)
-                if j < w - 1:
-                    grid[i, w - 1 - j] = 1
-        elif letter == "L":
-            grid[:, 0] = 1  # Left side
-            grid[h - 1, :] = 1  # Bottom
-        elif letter == "M":
-            grid[:, 0] = 1  # Left side
-            grid[:, w - 1] = 1  # Right side
-            grid[1 : h // 2, w // 2] = 1  # Middle
-            grid[0, w // 2] = 1  # Top middle
-        elif letter == "N":
-            grid[:, 0] = 1  # Left side
-            grid[:, w - 1] = 1  # Right side
-            for i in range(h):
-                grid[i, i * (w - 1) // (h - 1)] = 1  # Diagonal
-        elif letter == "O":
-            grid[1 : h - 1, 0] = 1  # Left side
-            grid[1 : h - 1, w - 1] = 1  # Right side
-            grid[0, 1 : w - 1] = 1  # Top
-            grid[h - 1, 1 : w - 1] = 1  # Bottom
-        elif letter == "P":
-            grid[:, 0] = 1  # Left side
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-            grid[1 : h // 2, w - 1] = 1  # Top right
-        elif letter == "Q":
-            grid[1 : h - 1, 0] = 1  # Left side
-            grid[1 : h - 1, w - 1] = 1  # Right side
-            grid[0, 1 : w - 1] = 1  # Top
-            grid[h - 1, 1 : w - 1] = 1  # Bottom
-            grid[h - 2 : h, w - 2 : w] = 1  # Tail
-        elif letter == "R":
-            grid[:, 0] = 1  # Left side
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-            grid[1 : h // 2, w - 1] = 1  # Top right
-            for i in range(h // 2, h):
-                j = (i - h // 2) * (w - 1) // ((h - 1) - h // 2)
-                if j < w:
-                    grid[i, j] = 1  # Diagonal
-        elif letter == "S":
-            grid[0, :] = 1  # Top
-            grid[h // 2, :] = 1  # Middle
-            grid[h - 1, :] = 1  # Bottom
-            grid[1 : h // 2, 0] = 1  # Top left
-            grid[h // 2 + 1 : h - 1, w - 1] = 1  # Bottom right
-        elif letter == "T":
-            grid[0, :] = 1  # Top
-            grid[:, w // 2] = 1  # Middle vertical
-        elif letter == "U":
-            grid[: h - 1, 0] = 1  # Left side
-            grid[: h - 1, w - 1] = 1  # Right side
-            grid[h - 1, 1 : w - 1] = 1  # Bottom
-        elif letter == "V":
-            for i in range(h - 1):
-                grid[i, i * (w - 1) // (h - 1)] = 1  # Left diagonal
-                grid[i, w - 1 - i * (w - 1) // (h - 1)] = 1  # Right diagonal
-            grid[h - 1, w // 2] = 1  # Bottom point
-        elif letter == "W":
-            grid[:, 0] = 1  # Left side
-            grid[:, w - 1] = 1  # Right side
-            grid[h // 2 :, w // 2] = 1  # Middle bottom
-        elif letter == "X":
-            for i in range(h):
-                grid[i, i * (w - 1) // (h - 1)] = 1  # Main diagonal
-                grid[i, w - 1 - i * (w - 1) // (h - 1)] = 1  # Counter diagonal
-        elif letter == "Y":
-            for i in range(h // 2):
-                grid[i, i * (w - 1) // (h - 1)] = 1  # Left diagonal
-                grid[i, w - 1 - i * (w - 1) // (h - 1)] = 1  # Right diagonal
-            grid[h // 2 :, w // 2] = 1  # Bottom vertical
-        elif letter == "Z":
-            grid[0, :] = 1  # Top
-            grid[h - 1, :] = 1  # Bottom
-            for i in range(h):
-                grid[i, w - 1 - i * (w - 1) // (h - 1)] = 1  # Diagonal
-
-        return grid
-
-    def generate_pattern(self, char, grid_size=(10, 10)):
-        if not char:
-            return np.zeros(grid_size)
-
-        char = char.upper()
-        if char.isdigit():
-            pattern = self._get_digit_pattern(char)
-        elif char.isalpha():
-            pattern = self._get_letter_pattern(char)
-        else:
-            return np.zeros(grid_size)
-
-        result = np.zeros(grid_size)
-
-        # Calculate position to center the character
-        start_row = (grid_size[0] - self.font_size[0]) // 2
-        start_col = (grid_size[1] - self.font_size[1]) // 2
-
-        # Place the pattern in the center of the grid
-        result[
-            start_row : start_row + self.font_size[0],
-            start_col : start_col + self.font_size[1],
-        ] = pattern
-
-        return result
-
-
 class PatternLibraryWidget(QGroupBox):
     patternSelected = pyqtSignal(np.ndarray)
 
     def __init__(self):
         super().__init__("Pattern Generator")
+        from text_patterns import TextPatternGenerator
         self.text_generator = TextPatternGenerator()
         self.initUI()
 
@@ -514,15 +522,55 @@ class PatternLibraryWidget(QGroupBox):
 
 
 class MorphologicalGUI(QMainWindow):
-    def __init__(self):
+    # Intensity levels offered for the input and result grids
+    level_options = {
+        "Binary": 2,
+        "16 levels": 16,
+        "256 levels (uint8)": 256,
+        "65536 levels (uint16)": 65536,
+    }
+    # Structuring elements built from a radius instead of drawn; None uses the drawn grid
+    shape_options = {
+        "Drawn": None,
+        "Disk": "euclidean",
+        "Diamond": "taxicab",
+        "Square": "chessboard",
+    }
+
+    def __init__(self, max_fps=60, incremental_updates=True, animation_duration=0.5,
+                 instrument=False, trace_path=None):
         super().__init__()
+        # Opt-in timing: a live overlay, and a Chrome trace written on close
+        self.trace_path = trace_path
+        if instrument or trace_path:
+            tracer.enable()
+        # Patch the cached result around a toggled cell instead of recomputing it
+        self.incremental_updates = incremental_updates
+        self.final_result = None
+        # Only the worker thread uses the cache
+        self.result_cache = ResultCache()
+        self.worker = ResultWorker()
+        self.worker.resultReady.connect(self.onResultReady)
+        # Bounds (top, bottom, left, right) of the result windows toggled cells
+        # changed since the last patch, and the job that will patch them
+        self.pending_window = None
+        self.region_generation = None
+        # Chain of operations typed by the user; overrides the selected operation
+        self.chain = ""
+        # Operation runner for grayscale grids, None for the binary engine
+        self.compute = None
         # Animation state
         self.animation_in_progress = False
-        self.animation_timer = QTimer(self)
-        self.animation_timer.timeout.connect(self.animateOperation)
-        self.animation_timer.setInterval(5)  # Default animation speed
-        self.current_row = 0
-        self.current_col = 0
+        self.animation_clock = AnimationClock.instance()
+        self.animation_clock.setMaxFps(max_fps)
+        # Seconds the sweep takes whatever the grid size; 0 shows the result at once
+        self.animation_duration = animation_duration
+        self.sweep_time = 0.0
+        # Precomputed sweep: per changed cell its start time, row and column, by time
+        self.timeline_times = np.zeros(0)
+        self.timeline_rows = np.zeros(0, dtype=np.intp)
+        self.timeline_cols = np.zeros(0, dtype=np.intp)
+        self.timeline_index = 0
         self.initUI()
 
     def initUI(self):
@@ -536,7 +584,11 @@ class MorphologicalGUI(QMainWindow):
         left_layout = QVBoxLayout()
         left_layout.addWidget(QLabel("Input Grid (Click to Toggle)"))
         self.left_grid = EnhancedGridWidget(rows=10, cols=10, editable=True)
-        self.left_grid.gridChanged.connect(self.updateResult)
+        if self.incremental_updates:
+            self.left_grid.cellToggled.connect(self.onCellToggled)
+        else:
+            self.left_grid.gridChanged.connect(self.updateResult)
+        self.left_grid.cellToggled.connect(self.onInputCellToggled)
         left_layout.addWidget(self.left_grid)
         self.explanation = OperationExplanationWidget()
         left_layout.addWidget(self.explanation)
@@ -549,10 +601,24 @@ class MorphologicalGUI(QMainWindow):
         # Operation selector
         middle_layout.addWidget(QLabel("Operation:"))
         self.operation_combo = QComboBox()
-        self.operation_combo.addItems(["Erosion", "Dilation", "Opening", "Closing"])
+        self.operation_combo.addItems(list(engine.OPERATIONS))
         self.operation_combo.currentTextChanged.connect(self.onOperationChanged)
         middle_layout.addWidget(self.operation_combo)
 
+        # Intensity levels; anything above binary switches to grayscale morphology
+        middle_layout.addWidget(QLabel("Intensity levels:"))
+        self.levels_combo = QComboBox()
+        self.levels_combo.addItems(list(self.level_options))
+        self.levels_combo.currentTextChanged.connect(self.onLevelsChanged)
+        middle_layout.addWidget(self.levels_combo)
+
+        # Optional chain of operations, run through the pipeline optimizer
+        middle_layout.addWidget(QLabel("Chain (optional):"))
+        self.chain_edit = QLineEdit()
+        self.chain_edit.setPlaceholderText("e.g. dilate | dilate | open")
+        self.chain_edit.editingFinished.connect(self.updateResult)
+        middle_layout.addWidget(self.chain_edit)
+
         # Structuring element
         middle_layout.addWidget(QLabel("Structuring Element:"))
         self.struct_element = EnhancedGridWidget(rows=3, cols=3, editable=True, button_size=20)
@@ -561,10 +627,25 @@ class MorphologicalGUI(QMainWindow):
         self.struct_element.setGrid(struct_grid)
         middle_layout.addWidget(self.struct_element)
 
-        # Pattern library
-        self.pattern_library = PatternLibraryWidget()
-        self.pattern_library.patternSelected.connect(self.left_grid.setGrid)
-        middle_layout.addWidget(self.pattern_library)
+        # Or a ball of any radius; large disks run on a distance transform
+        shape_layout = QHBoxLayout()
+        self.shape_combo = QComboBox()
+        self.shape_combo.addItems(list(self.shape_options))
+        self.shape_combo.currentTextChanged.connect(self.onShapeChanged)
+        shape_layout.addWidget(self.shape_combo)
+        shape_layout.addWidget(QLabel("Radius:"))
+        self.radius_spin = QSpinBox()
+        self.radius_spin.setRange(1, 100)
+        self.radius_spin.setValue(3)
+        self.radius_spin.setEnabled(False)
+        self.radius_spin.valueChanged.connect(self.updateResult)
+        shape_layout.addWidget(self.radius_spin)
+        middle_layout.addLayout(shape_layout)
+
+        # Pattern library; not needed for the first frame, so built after it (see showEvent)
+        self.pattern_library = None
+        self.pattern_slot = QVBoxLayout()
+        middle_layout.addLayout(self.pattern_slot)
         middle_panel.setLayout(middle_layout)
 
         # Right panel (result)
@@ -573,6 +654,8 @@ class MorphologicalGUI(QMainWindow):
         right_layout.addWidget(QLabel("Result"))
         self.right_grid = EnhancedGridWidget(rows=10, cols=10, editable=False)
         right_layout.addWidget(self.right_grid)
+        self.analysis = ComponentAnalysisWidget()
+        right_layout.addWidget(self.analysis)
         right_panel.setLayout(right_layout)
 
         # Add all panels to main layout
@@ -581,85 +664,236 @@ class MorphologicalGUI(QMainWindow):
         main_layout.addWidget(right_panel)
         main_widget.setLayout(main_layout)
 
+        self.overlay = PerformanceOverlay(main_widget) if tracer.enabled else None
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.pattern_library is None:
+            QTimer.singleShot(0, self.buildPatternLibrary)
+
+    def buildPatternLibrary(self):
+        if self.pattern_library is not None:
+            return
+        self.pattern_library = PatternLibraryWidget()
+        self.pattern_library.patternSelected.connect(self.loadPattern)
+        self.pattern_slot.addWidget(self.pattern_library)
+
     def generateRandomGrid(self):
-        random_grid = np.random.choice([0, 1], size=(10, 10), p=[0.7, 0.3])
+        if self.left_grid.levels == 2:
+            random_grid = np.random.choice([0, 1], size=(10, 10), p=[0.7, 0.3])
+        else:
+            random_grid = np.random.randint(0, self.left_grid.levels, size=(10, 10))
         self.left_grid.setGrid(random_grid)
+        self.analyseInput()
+        self.updateResult()
+
+    def loadPattern(self, pattern):
+        # Patterns are binary; draw them at full intensity on grayscale grids
+        self.left_grid.setGrid(np.asarray(pattern) * (self.left_grid.levels - 1))
+        self.analyseInput()
+
+    def analyseInput(self, window=None):
+        """Refresh the input's component statistics; window limits the diff to changed cells"""
+        self.analysis.setGrid("Input", self.left_grid.state, window)
+
+    def onInputCellToggled(self, row, col):
+        self.analyseInput((slice(row, row + 1), slice(col, col + 1)))
+
+    def onLevelsChanged(self, text):
+        levels = self.level_options[text]
+        self.left_grid.setLevels(levels)
+        self.right_grid.setLevels(levels)
+        self.analyseInput()
+        # Only operations defined for the new kind of image stay selectable
+        operation = self.operation_combo.currentText()
+        names = list(engine.OPERATIONS if levels == 2 else grayscale.OPERATIONS)
+        self.operation_combo.blockSignals(True)
+        self.operation_combo.clear()
+        self.operation_combo.addItems(names)
+        self.operation_combo.setCurrentText(operation if operation in names else names[0])
+        self.operation_combo.blockSignals(False)
+        self.explanation.updateExplanation(self.operation_combo.currentText())
+        self.final_result = None
         self.updateResult()
 
     def onOperationChanged(self, operation):
         self.explanation.updateExplanation(operation)
         self.updateResult()
 
+    def onShapeChanged(self, text):
+        drawn = self.shape_options[text] is None
+        self.struct_element.setEnabled(drawn)
+        self.radius_spin.setEnabled(not drawn)
+        self.updateResult()
+
+    def currentStructure(self):
+        norm = self.shape_options[self.shape_combo.currentText()]
+        if norm is None:
+            return self.struct_element.getGrid()
+        return structures.ball(self.radius_spin.value(), norm).astype(int)
+
     def updateResult(self):
+        """Recompute the result in the background; a newer edit supersedes this one"""
+        # A running sweep is stopped; the next one starts from what is on screen
         if self.animation_in_progress:
-            return
-        
-        # Store current state for animation
+            self.animation_clock.cancel(self.animateOperation)
+            self.animation_in_progress = False
+
+        # Snapshot the current state for the worker and the animation
         self.input_grid = self.left_grid.getGrid()
-        self.structure = self.struct_element.getGrid()
+        self.structure = self.currentStructure()
         self.operation = self.operation_combo.currentText()
-        
-        # Calculate final result for reference
-        self.final_result = self.applyOperation(
-            self.input_grid, self.structure, self.operation)
-        
+        self.chain = self.chain_edit.text().strip()
+        # Grayscale grids keep their own dtype and use grayscale morphology
+        self.compute = None
+        if self.left_grid.levels > 2:
+            self.input_grid = self.input_grid.astype(self.left_grid.state.dtype)
+            self.compute = grayscale.apply_operation
+
+        # No result until the worker delivers one; edits meanwhile resubmit in full
+        self.final_result = None
+        self.pending_window = None
+        self.worker.submit(self.computeResult, self.input_grid.copy(), self.structure,
+                           self.operation, self.chain, self.compute)
+
+    def computeResult(self, input_grid, structure, operation, chain, compute):
+        """(result, explanation or None); runs on the worker thread, so no widget access"""
+        with tracer.span(chain or operation, "compute"):
+            if compute is not None:
+                message = "Chains are only available for binary grids." if chain else None
+                return compute(input_grid, structure, operation), message
+            if chain:
+                return self.runChain(input_grid, structure, operation, chain)
+            return self.result_cache.apply_operation(input_grid, structure, operation), None
+
+    def onResultReady(self, generation, future):
+        if not self.worker.isCurrent(generation):
+            return  # Superseded by a newer edit
+        if generation == self.region_generation:
+            self.applyRegion(*future.result())
+            return
+        self.final_result, message = future.result()
+        self.analysis.setGrid("Result", self.final_result)
+        if message is not None:
+            self.explanation.setText(message)
+
         # Initialize animation state
-        self.current_row = 0
-        self.current_col = 0
+        self.buildTimeline()
+        self.sweep_time = 0.0
         self.animation_in_progress = True
-        
-        # Start animation timer
-        self.animation_timer.start()
 
-    def animateOperation(self):
-        if not self.animation_in_progress:
+        # Advance the sweep from the shared frame clock
+        self.animation_clock.requestFrames(self.animateOperation)
+
+    def runChain(self, input_grid, structure, operation, chain):
+        """Result of the typed chain and its plan; steps without an element use the drawn one"""
+        try:
+            steps = pipeline.parse(chain, structure)
+        except (ValueError, OSError) as error:
+            result = self.result_cache.apply_operation(input_grid, structure, operation)
+            return result, f"Invalid chain: {error}"
+        plan = pipeline.build_plan(steps)
+        return plan.run(input_grid)["result"], plan.describe(input_grid.shape)
+
+    def onCellToggled(self, row, col):
+        """Recompute only the part of the result a single toggled cell can reach
+
+        The window is computed on the worker. A newer edit supersedes the job,
+        so each job covers every cell toggled since the last patch.
+        """
+        reach = engine.operation_reach(self.structure, self.operation)
+        if self.final_result is None or (self.chain and self.compute is None) or reach is None:
+            # Chains, whole-image operations and edits during a pending full job are recomputed in full
+            self.updateResult()
             return
 
+        self.input_grid[row, col] = self.left_grid.state[row, col]
         rows, cols = self.input_grid.shape
-        struct_rows, struct_cols = self.structure.shape
-        half_struct_row = struct_rows // 2
-        half_struct_col = struct_cols // 2
-        
-        # Calculate region affected by structuring element
-        row_start = max(0, self.current_row - half_struct_row)
-        row_end = min(rows, self.current_row + half_struct_row + 1)
-        col_start = max(0, self.current_col - half_struct_col)
-        col_end = min(cols, self.current_col + half_struct_col + 1)
-        
-        # Animate cells that will change
-        for i in range(row_start, row_end):
-            for j in range(col_start, col_end):
-                current_state = bool(self.input_grid[i, j])
-                final_state = bool(self.final_result[i, j])
-                if current_state != final_state:
-                    self.right_grid.buttons[i][j].startProcessingAnimation(final_state)
-        
-        # Move to next position
-        self.current_col += 1
-        if self.current_col >= cols:
-            self.current_col = 0
-            self.current_row += 1
-            
+        bounds = (max(0, row - reach[0]), min(rows, row + reach[0] + 1),
+                  max(0, col - reach[1]), min(cols, col + reach[1] + 1))
+        if self.pending_window is not None:
+            pending = self.pending_window
+            bounds = (min(pending[0], bounds[0]), max(pending[1], bounds[1]),
+                      min(pending[2], bounds[2]), max(pending[3], bounds[3]))
+        self.pending_window = bounds
+        window = slice(bounds[0], bounds[1]), slice(bounds[2], bounds[3])
+        self.region_generation = self.worker.submit(
+            self.computeRegion, self.input_grid.copy(), self.structure, self.operation, window,
+            self.compute)
+
+    def computeRegion(self, input_grid, structure, operation, window, compute):
+        """(window, result inside it); runs on the worker thread"""
+        with tracer.span(f"{operation} (cell)", "compute"):
+            return window, engine.apply_to_window(input_grid, structure, operation, *window,
+                                                  compute=compute)
+
+    def applyRegion(self, window, patch):
+        self.final_result[window] = patch
+        self.pending_window = None
+        self.analysis.setGrid("Result", self.final_result, window)
+
+        # Fade in just the cells of the window that no longer match the display
+        changed_rows, changed_cols = np.nonzero(
+            self.final_result[window] != self.right_grid.state[window])
+        if len(changed_rows):
+            changed_rows += window[0].start
+            changed_cols += window[1].start
+            self.right_grid.startProcessingAnimation(
+                changed_rows, changed_cols, self.final_result[changed_rows, changed_cols])
+
+    def buildTimeline(self):
+        """Schedule the sweep once; see animation.sweep_timeline"""
+        self.timeline_times, self.timeline_rows, self.timeline_cols = animation.sweep_timeline(
+            self.input_grid, self.final_result, self.structure.shape, self.animation_duration)
+        self.timeline_index = 0
+
+    def animateOperation(self, elapsed):
+        """Start every cell of the timeline whose time has come; one batch per frame"""
+        if not self.animation_in_progress:
+            return False
+        self.sweep_time += elapsed
+        start = self.timeline_index
+        end = int(np.searchsorted(self.timeline_times, self.sweep_time, side="right"))
+        if end > start:
+            rows = self.timeline_rows[start:end]
+            cols = self.timeline_cols[start:end]
+            self.right_grid.startProcessingAnimation(rows, cols, self.final_result[rows, cols])
+            self.timeline_index = end
+
         # Check if animation is complete
-        if self.current_row >= rows:
+        if self.timeline_index >= len(self.timeline_times):
             self.animation_in_progress = False
-            self.animation_timer.stop()
-            # Update any remaining cells to their final state
-            self.right_grid.setGrid(self.final_result)
-
-    def applyOperation(self, input_grid, structure, operation):
-        if operation == "Erosion":
-            return ndimage.binary_erosion(input_grid, structure=structure)
-        elif operation == "Dilation":
-            return ndimage.binary_dilation(input_grid, structure=structure)
-        elif operation == "Opening":
-            return ndimage.binary_opening(input_grid, structure=structure)
-        elif operation == "Closing":
-            return ndimage.binary_closing(input_grid, structure=structure)
-    
+            # Update the remaining cells to their final state; fading cells finish on their own
+            grid = self.right_grid
+            grid.setGrid(np.where(grid.processing, grid.state, self.final_result))
+        return self.animation_in_progress
+
+    def closeEvent(self, event):
+        self.worker.shutdown()
+        if self.trace_path:
+            tracer.export(self.trace_path)
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    morphological_gui = MorphologicalGUI()
+    parser = argparse.ArgumentParser(description="Interactive morphological operations")
+    parser.add_argument("--instrument", action="store_true",
+                        help="show a live overlay with frame and compute timings")
+    parser.add_argument("--trace", default=os.environ.get("MORPHOLOGIC_TRACE"),
+                        help="write a Chrome trace-event JSON file here on exit "
+                             "(default: $MORPHOLOGIC_TRACE)")
+    parser.add_argument("--view", metavar="MASK",
+                        help="open a .npy mask or image of any size in the zoomable viewer")
+    parser.add_argument("--operation", default="Erosion", type=engine.operation_name,
+                        help="operation shown by --view (default: Erosion)")
+    parser.add_argument("--structure", default="rect:3x3", help="element used by --view")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.view:
+        from viewer import MaskViewer
+        morphological_gui = MaskViewer(args.view, structures.from_spec(args.structure),
+                                       args.operation)
+    else:
+        morphological_gui = MorphologicalGUI(instrument=args.instrument, trace_path=args.trace)
     morphological_gui.show()
     sys.exit(app.exec_())
@@ -0,0 +1,354 @@
+"""Compile chains of morphological operations into an optimized plan and run it.
+
+A chain is a list of (operation, structuring element) steps applied one after
+another. Before running, the chains go through a few exact rewrites:
+
+* repeated idempotent operations (opening, closing, thinning, ...) are dropped,
+* openings and closings are expanded into their erosion and dilation stages,
+* consecutive erosions or dilations merge into one pass with the Minkowski-sum
+  element, when that gives the same result at the image border and the
+  estimated cost goes down,
+* identical sub-expressions, also across several chains, are computed once.
+
+The plan then runs on bit-packed masks, writing erosions and dilations into a
+small pool of preallocated buffers (two for a linear chain, used ping-pong).
+
+Example:
+    python pipeline.py "dilate rect:3x3 | dilate rect:3x3 | erode cross:5 | open | open"
+    python pipeline.py "open rect:5x5 | close" --input mask.npy -o result.npy
+"""
+import argparse
+import math
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+import engine
+import separable
+import structures
+
+
+Step = namedtuple("Step", ["operation", "structure"])
+
+# One operation of a plan; source is the index of the node it reads, or None
+# for the plan input, and steps counts the chain steps it stands for.
+Node = namedtuple("Node", ["operation", "structure", "source", "steps"])
+
+_ALIASES = {
+    "erode": "Erosion",
+    "dilate": "Dilation",
+    "open": "Opening",
+    "close": "Closing",
+}
+
+# Applying these twice in a row with the same element changes nothing
+_IDEMPOTENT = {"Opening", "Closing", "Thinning", "Fill Holes", "Clear Border"}
+
+_EXPANSIONS = {
+    "Opening": ("Erosion", "Dilation"),
+    "Closing": ("Dilation", "Erosion"),
+}
+
+_KERNELS = {
+    "Erosion": engine.erode,
+    "Dilation": engine.dilate,
+}
+
+
+def parse(text, default_structure=None):
+    """Steps from a spec like "dilate rect:3x3 | erode cross:5 | open"
+
+    Each step is an operation name (engine.OPERATIONS, case-insensitive, or
+    erode/dilate/open/close) optionally followed by a structures.from_spec
+    element; steps without one use default_structure (3x3 by default).
+    """
+    if default_structure is None:
+        default_structure = structures.rectangle(3)
+    steps = []
+    for part in text.split("|"):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, spec = part.rpartition(" ")
+        try:
+            steps.append(Step(_operation(part), np.asarray(default_structure) != 0))
+        except ValueError:
+            if not name:
+                raise
+            steps.append(Step(_operation(name), structures.from_spec(spec)))
+    return steps
+
+
+def _operation(name):
+    name = name.strip()
+    return _ALIASES.get(name.lower()) or engine.operation_name(name)
+
+
+def _offset_array(structure):
+    structure = np.asarray(structure) != 0
+    return np.argwhere(structure) - np.array(structure.shape) // 2
+
+
+def _structure_key(structure):
+    # Elements are equal when their offsets are, whatever their array padding
+    offsets = _offset_array(structure)
+    return offsets[np.lexsort(offsets.T[::-1])].tobytes()
+
+
+def pass_cost(structure):
+    """Estimated full-image word passes for one erosion or dilation
+
+    Follows the engine's kernels: about four passes per vertical segment
+    (running reduce), two per doubling step of a horizontal segment, and a
+    shift plus a combine per offset on the dense path.
+    """
+    plan = separable.decompose(structure)
+    if plan is None:
+        return 2 * max(len(_offset_array(structure)), 1)
+    cost = 0
+    for factor in plan:
+        for segment in factor:
+            if segment.axis == 0:
+                cost += 4
+            else:
+                cost += 2 * math.ceil(math.log2(segment.length)) + 2
+        cost += len(factor) - 1
+    return max(cost, 1)
+
+
+def operation_cost(operation, structure):
+    """Estimated word passes for one operation, or None for iterative ones"""
+    if operation in _KERNELS:
+        return pass_cost(structure)
+    if operation in ("Opening", "Closing"):
+        return 2 * pass_cost(structure)
+    if operation == "Gradient":
+        return 2 * pass_cost(structure) + 2
+    if operation in ("Top-Hat", "Black-Hat"):
+        return 2 * pass_cost(structure) + 1
+    if operation == "Hit-or-Miss":
+        miss = ~(np.asarray(structure) != 0)
+        return pass_cost(structure) + pass_cost(miss) + 3
+    return None
+
+
+def _merge_is_exact(operation, first, second):
+    """Whether operation by first then second equals one pass by their Minkowski sum
+
+    Both agree away from the image border. With a zero border the chain can
+    also lose pixels whose intermediate position falls outside the image;
+    that never happens when every such path can be routed through a position
+    that lies between the output pixel and the input pixel it reads.
+    """
+    offsets_first, offsets_second = _offset_array(first), _offset_array(second)
+    if not len(offsets_first) or not len(offsets_second):
+        return False
+    sums = offsets_first[:, None, :] + offsets_second[None, :, :]
+    if operation == "Erosion":
+        # Each intermediate offset b must lie between 0 and a + b for some a
+        inside = ((offsets_second >= np.minimum(0, sums)) & (offsets_second <= np.maximum(0, sums)))
+        return bool(inside.all(axis=2).any(axis=0).all())
+    # Every sum a + b needs one split whose b lies between 0 and a + b
+    second_offsets = np.broadcast_to(offsets_second[None, :, :], sums.shape)
+    inside = ((second_offsets >= np.minimum(0, sums)) & (second_offsets <= np.maximum(0, sums)))
+    all_sums = np.unique(sums.reshape(-1, 2), axis=0)
+    routed = np.unique(sums[inside.all(axis=2)].reshape(-1, 2), axis=0)
+    return len(all_sums) == len(routed)
+
+
+def simplify(steps):
+    """Rewrite one chain into cheaper, equivalent steps
+
+    Returns a list of (operation, structure, steps replaced) triples.
+    """
+    rewritten = []
+    for step in steps:
+        structure = np.asarray(step.structure) != 0
+        if (rewritten and step.operation in _IDEMPOTENT
+                and rewritten[-1][0] == step.operation
+                and (step.operation == "Thinning"
+                     or _structure_key(rewritten[-1][1]) == _structure_key(structure))):
+            rewritten[-1] = (step.operation, rewritten[-1][1], rewritten[-1][2] + 1)
+            continue
+        rewritten.append((step.operation, structure, 1))
+
+    expanded = []
+    for operation, structure, count in rewritten:
+        if operation in _EXPANSIONS:
+            first, second = _EXPANSIONS[operation]
+            expanded.append((first, structure, count))
+            expanded.append((second, structure, 0))
+        else:
+            expanded.append((operation, structure, count))
+
+    merged = []
+    for operation, structure, count in expanded:
+        if merged and operation in _KERNELS and merged[-1][0] == operation:
+            previous = merged[-1][1]
+            combined = structures.minkowski_sum(previous, structure)
+            if (_merge_is_exact(operation, previous, structure)
+                    and pass_cost(combined) <= pass_cost(previous) + pass_cost(structure)):
+                merged[-1] = (operation, combined, merged[-1][2] + count)
+                continue
+        merged.append((operation, structure, count))
+    return merged
+
+
+class Plan:
+    """Operations in execution order, shared between the outputs that need them
+
+    ``outputs`` maps each output name to the index of the node producing it,
+    or None when the chain was empty and the output is the input itself.
+    """
+
+    def __init__(self, nodes, outputs, original_cost):
+        self.nodes = nodes
+        self.outputs = outputs
+        self.original_cost = original_cost
+        self.buffer_count = self._count_buffers()
+
+    def cost(self):
+        """Estimated word passes, counting only operations with a known cost"""
+        costs = (operation_cost(node.operation, node.structure) for node in self.nodes)
+        return sum(cost for cost in costs if cost is not None)
+
+    def _last_uses(self):
+        last_use = {}
+        for index, node in enumerate(self.nodes):
+            if node.source is not None:
+                last_use[node.source] = index
+        return last_use
+
+    def _count_buffers(self):
+        # Replay the run below to see how many buffers are alive at once
+        last_use = self._last_uses()
+        kept = set(self.outputs.values())
+        free = live = peak = 0
+        for index, node in enumerate(self.nodes):
+            if node.operation in _KERNELS:
+                if free:
+                    free -= 1
+                else:
+                    live += 1
+                    peak = max(peak, live)
+            if (node.source is not None and last_use[node.source] == index
+                    and node.source not in kept and self.nodes[node.source].operation in _KERNELS):
+                free += 1
+        return peak
+
+    def describe(self, shape=None):
+        """Human-readable listing of the plan and its estimated cost
+
+        With an image shape, costs are also given in word operations.
+        """
+        words = -(-shape[1] // engine.WORD_BITS) * shape[0] if shape is not None else None
+        names = {index: name for name, index in self.outputs.items()}
+        lines = []
+        for index, node in enumerate(self.nodes):
+            source = "input" if node.source is None else f"t{node.source}"
+            height, width = node.structure.shape
+            cost = operation_cost(node.operation, node.structure)
+            line = (f"t{index} = {node.operation}({source}, {height}x{width} element, "
+                    f"{int(np.count_nonzero(node.structure))} cells)")
+            line += "  cost: iterative" if cost is None else f"  cost: {cost} passes"
+            if node.steps > 1:
+                line += f"  [{node.steps} steps]"
+            if index in names:
+                line += f"  -> {names[index]}"
+            lines.append(line)
+        for name, index in self.outputs.items():
+            if index is None:
+                lines.append(f"input -> {name}")
+        total = f"estimated cost: {self.cost()} passes (was {self.original_cost} before rewriting)"
+        if words is not None:
+            total += f", {self.cost() * words} word operations"
+        lines.append(total)
+        lines.append(f"buffers: {self.buffer_count}")
+        return "\n".join(lines)
+
+    def run(self, input_grid):
+        """Run the plan; returns {output name: boolean ndarray}"""
+        mask = engine.BitMask.from_array(input_grid)
+        last_use = self._last_uses()
+        kept = set(self.outputs.values())
+        free = [engine.BitMask.zeros(mask.shape) for _ in range(self.buffer_count)]
+        values = {}
+        for index, node in enumerate(self.nodes):
+            source = mask if node.source is None else values[node.source]
+            if node.operation in _KERNELS:
+                out = free.pop() if free else engine.BitMask.zeros(mask.shape)
+                values[index] = _KERNELS[node.operation](source, node.structure, out=out)
+            else:
+                values[index] = engine.OPERATIONS[node.operation](source, node.structure)
+            if (node.source is not None and last_use[node.source] == index
+                    and node.source not in kept and self.nodes[node.source].operation in _KERNELS):
+                free.append(values.pop(node.source))
+        return {name: (mask if index is None else values[index]).to_array()
+                for name, index in self.outputs.items()}
+
+
+def build_plan(chains, optimize=True):
+    """Compile one chain (a list of steps) or a dict of named chains into a Plan
+
+    A single chain produces the output "result". With optimize=False the steps
+    run as written, which is useful to compare results and costs.
+    """
+    if not isinstance(chains, dict):
+        chains = {"result": chains}
+    nodes = []
+    index_of = {}
+    outputs = {}
+    original_cost = 0
+    for name, steps in chains.items():
+        steps = [Step(*step) for step in steps]
+        for step in steps:
+            original_cost += operation_cost(step.operation, step.structure) or 0
+        if optimize:
+            rewritten = simplify(steps)
+        else:
+            rewritten = [(step.operation, np.asarray(step.structure) != 0, 1) for step in steps]
+        source = None
+        for operation, structure, count in rewritten:
+            key = (operation, _structure_key(structure), source)
+            if not optimize or key not in index_of:
+                index_of[key] = len(nodes)
+                nodes.append(Node(operation, structure, source, count))
+            source = index_of[key]
+        outputs[name] = source
+    return Plan(nodes, outputs, original_cost)
+
+
+def run_chain(input_grid, steps):
+    """Optimize and run a single chain, returning a boolean ndarray"""
+    return build_plan(steps).run(input_grid)["result"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("chains", nargs="+",
+                        help='chain like "dilate rect:3x3 | open"; several chains share work')
+    parser.add_argument("--structure", default="rect:3x3",
+                        help="element for steps that do not name one (default: rect:3x3)")
+    parser.add_argument("--shape", type=int, nargs=2, metavar=("ROWS", "COLS"),
+                        help="image shape to report word operations for")
+    parser.add_argument("--input", help=".npy mask to run the plan on")
+    parser.add_argument("-o", "--output", help=".npy file for the result of the first chain")
+    parser.add_argument("--no-optimize", action="store_true", help="run the steps as written")
+    args = parser.parse_args(argv)
+
+    default_structure = structures.from_spec(args.structure)
+    chains = {f"out{index}": parse(text, default_structure) for index, text in enumerate(args.chains)}
+    plan = build_plan(chains, optimize=not args.no_optimize)
+    input_grid = np.load(args.input) if args.input else None
+    shape = tuple(args.shape) if args.shape else (input_grid.shape if input_grid is not None else None)
+    print(plan.describe(shape))
+    if input_grid is not None:
+        results = plan.run(input_grid)
+        if args.output:
+            np.save(args.output, results["out0"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
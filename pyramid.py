@@ -0,0 +1,130 @@
+"""Multi-resolution summary of a binary mask for drawing huge masks at any zoom.
+
+Level L has one cell per 2**L x 2**L block of the mask, holding EMPTY when
+no pixel of the block is set, FULL when all are and PARTIAL otherwise: the
+OR and the AND reduction of the block, stored together in one byte. A
+viewer reads only the cells of the level that matches its zoom, so drawing
+costs about one cell per screen pixel whatever the size of the mask.
+
+Levels below min_level are not stored (they would take as much memory as
+the mask itself); they are reduced from the mask on request, which is cheap
+because only the visible region is asked for.
+"""
+import math
+
+import numpy as np
+
+
+EMPTY, PARTIAL, FULL = 0, 1, 2
+
+
+# Unsigned type covering exactly block booleans, for the blocks reduced with one comparison
+_BLOCK_WORDS = {2: np.uint16, 4: np.uint32, 8: np.uint64}
+
+
+def _reduce_columns(bits, block, fill):
+    """OR (fill=False) or AND (fill=True) of every block columns of each row"""
+    rows, cols = bits.shape
+    padded = np.full((rows, -(-cols // block) * block), fill, dtype=bool)
+    padded[:, :cols] = bits
+    word = _BLOCK_WORDS.get(block)
+    if word is None:
+        grouped = padded.reshape(rows, -1, block)
+        return grouped.all(axis=2) if fill else grouped.any(axis=2)
+    # block bytes of 0/1 read as one integer: non-zero for OR, all bytes 1 for AND
+    words = padded.view(word)
+    return words == word(int("01" * block, 16)) if fill else words != 0
+
+
+def _block_states(bits, block):
+    """States of block x block cells of a boolean array; partial edge blocks only count the array"""
+    if block == 1:
+        return bits.view(np.uint8) * np.uint8(FULL)
+    rows, cols = bits.shape
+    whole = rows // block * block
+    # Rows first: reducing across rows runs over whole contiguous rows
+    grouped = bits[:whole].reshape(-1, block, cols)
+    any_rows = np.logical_or.reduce(grouped, axis=1)
+    all_rows = np.logical_and.reduce(grouped, axis=1)
+    if whole < rows:
+        any_rows = np.vstack([any_rows, bits[whole:].any(axis=0)])
+        all_rows = np.vstack([all_rows, bits[whole:].all(axis=0)])
+    return (_reduce_columns(any_rows, block, False).view(np.uint8)
+            + _reduce_columns(all_rows, block, True).view(np.uint8))
+
+
+def _parent_states(states):
+    """States one level up: a 2 x 2 group is FULL or EMPTY only if all four children are"""
+    rows, cols = states.shape
+    low = np.full((rows + rows % 2, cols + cols % 2), FULL, dtype=np.uint8)
+    high = np.full(low.shape, EMPTY, dtype=np.uint8)
+    low[:rows, :cols] = states
+    high[:rows, :cols] = states
+    low = np.minimum(low[0::2], low[1::2])
+    high = np.maximum(high[0::2], high[1::2])
+    all_ = np.minimum(low[:, 0::2], low[:, 1::2]) == FULL
+    any_ = np.maximum(high[:, 0::2], high[:, 1::2]) != EMPTY
+    return any_.view(np.uint8) + all_.view(np.uint8)
+
+
+def _as_bits(values):
+    values = np.asarray(values)
+    return values if values.dtype == bool else values != 0
+
+
+class MaskPyramid:
+    """EMPTY/PARTIAL/FULL pyramid over a 2-D mask (any array, memory-mapped ones included)
+
+    The mask is only read, in bands of band_rows rows while building and
+    around edited regions afterwards; call update() after changing it.
+    """
+
+    def __init__(self, mask, min_level=2, band_rows=1024):
+        if mask.ndim != 2:
+            raise ValueError(f"expected a 2-D mask, got shape {mask.shape}")
+        self.mask = mask
+        self.shape = mask.shape
+        self.min_level = min_level
+        self.top_level = max(min_level, math.ceil(math.log2(max(max(self.shape), 1))))
+        self.levels = {}
+        self.build(band_rows)
+
+    def level_shape(self, level):
+        block = 1 << level
+        return -(-self.shape[0] // block), -(-self.shape[1] // block)
+
+    def build(self, band_rows=1024):
+        block = 1 << self.min_level
+        band = max(block, band_rows // block * block)
+        states = np.empty(self.level_shape(self.min_level), dtype=np.uint8)
+        for top in range(0, self.shape[0], band):
+            states[top // block : -(-(top + band) // block)] = _block_states(
+                _as_bits(self.mask[top : top + band]), block)
+        self.levels = {self.min_level: states}
+        for level in range(self.min_level + 1, self.top_level + 1):
+            states = _parent_states(states)
+            self.levels[level] = states
+
+    def region(self, level, rows, cols):
+        """States of level-L cells rows x cols (slices within level_shape(level))"""
+        level = min(level, self.top_level)
+        if level in self.levels:
+            return self.levels[level][rows, cols]
+        block = 1 << level
+        bits = _as_bits(self.mask[rows.start * block : rows.stop * block,
+                                  cols.start * block : cols.stop * block])
+        return _block_states(bits, block)
+
+    def update(self, rows, cols):
+        """Refresh every level after mask[rows, cols] changed (slices in mask cells)"""
+        block = 1 << self.min_level
+        top, bottom = rows.start // block, -(-rows.stop // block)
+        left, right = cols.start // block, -(-cols.stop // block)
+        self.levels[self.min_level][top:bottom, left:right] = _block_states(
+            _as_bits(self.mask[top * block : bottom * block, left * block : right * block]), block)
+        for level in range(self.min_level + 1, self.top_level + 1):
+            child = self.levels[level - 1]
+            top, bottom = top // 2, -(-bottom // 2)
+            left, right = left // 2, -(-right // 2)
+            self.levels[level][top:bottom, left:right] = _parent_states(
+                child[2 * top : 2 * bottom, 2 * left : 2 * right])
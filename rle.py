@@ -0,0 +1,290 @@
+"""Run-length-encoded binary masks, with erosion and dilation computed on the runs.
+
+A RunMask stores each row as a sorted list of disjoint, non-touching
+half-open intervals [start, stop) of foreground columns, packed CSR-style:
+the runs of row r are starts[row_ptr[r]:row_ptr[r + 1]] and the matching
+stops. Memory and the cost of every operation grow with the number of
+runs, not with the image area, which suits masks that are mostly empty.
+
+Dilation widens every run by each horizontal segment of the element and
+moves it to the rows the segment reaches, then merges overlapping runs
+row by row; erosion shrinks the runs instead and keeps the columns every
+segment agrees on. Results equal engine.apply_operation, zero border
+included.
+
+Example:
+    python rle.py encode mask.npy mask.rle.npz
+    python rle.py apply mask.rle.npz opened.rle.npz --operation Opening --structure disk:5
+    python rle.py decode opened.rle.npz opened.npy
+"""
+import argparse
+import sys
+
+import numpy as np
+
+import engine
+import structures
+
+
+FORMAT = "morphologic-rle-1"
+
+
+def _row_ptr(rows, row_count):
+    """CSR row pointer of sorted run rows"""
+    return np.searchsorted(rows, np.arange(row_count + 1)).astype(np.int64)
+
+
+def _union_or_intersection(rows, starts, stops, shape, need):
+    """Runs covered by at least need of the given intervals, per row
+
+    Every input set must have disjoint intervals within a row, so need=1
+    gives the union of all of them and need=K the intersection of K sets.
+    Intervals are clipped to the image first.
+    """
+    height, width = shape
+    starts = np.maximum(starts, 0)
+    stops = np.minimum(stops, width)
+    keep = (starts < stops) & (rows >= 0) & (rows < height)
+    rows, starts, stops = rows[keep], starts[keep], stops[keep]
+    if not len(rows):
+        return RunMask.zeros(shape)
+    # One line for the whole image; a row's runs all end before the next row begins
+    base = rows.astype(np.int64) * (width + 1)
+    keys = np.concatenate([base + starts, base + stops])
+    deltas = np.concatenate([np.ones(len(starts), np.int64), np.full(len(stops), -1, np.int64)])
+    order = np.argsort(keys, kind="stable")
+    keys, deltas = keys[order], deltas[order]
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    positions = keys[first]
+    # Coverage of [positions[i], positions[i + 1]); the last entry is always 0
+    selected = np.cumsum(np.add.reduceat(deltas, first)) >= need
+    edges = np.diff(np.r_[False, selected, False].view(np.int8))
+    run_starts = positions[np.flatnonzero(edges == 1)]
+    run_stops = positions[np.flatnonzero(edges == -1)]
+    run_rows = run_starts // (width + 1)
+    return RunMask(_row_ptr(run_rows, height), run_starts - run_rows * (width + 1),
+                   run_stops - run_rows * (width + 1), shape)
+
+
+def _segments(structure):
+    """Horizontal segments (dy, first dx, last dx) of an element, offsets from its center"""
+    offsets = np.array(engine._offsets(structure), dtype=np.int64).reshape(-1, 2)
+    if not len(offsets):
+        return []
+    # np.nonzero order: by row, then column; a segment ends where the columns jump
+    breaks = np.flatnonzero((np.diff(offsets[:, 0]) != 0) | (np.diff(offsets[:, 1]) != 1)) + 1
+    return [(int(group[0, 0]), int(group[0, 1]), int(group[-1, 1]))
+            for group in np.split(offsets, breaks)]
+
+
+class RunMask:
+    """Binary mask stored as per-row runs; see the module docstring"""
+
+    def __init__(self, row_ptr, starts, stops, shape):
+        self.row_ptr = np.asarray(row_ptr, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.stops = np.asarray(stops, dtype=np.int64)
+        self.shape = tuple(int(size) for size in shape)
+
+    @classmethod
+    def zeros(cls, shape):
+        empty = np.zeros(0, dtype=np.int64)
+        return cls(np.zeros(shape[0] + 1, dtype=np.int64), empty, empty, shape)
+
+    @classmethod
+    def from_array(cls, array, band_rows=4096):
+        """Encode any 2-D array (memory-mapped ones included), non-zero entries as foreground
+
+        The array is read in bands of band_rows rows, so only one band is
+        ever held densely.
+        """
+        if isinstance(array, engine.BitMask):
+            array = array.to_array()
+        array = np.asarray(array)
+        if array.ndim != 2:
+            raise ValueError(f"expected a 2-D array, got shape {array.shape}")
+        height, width = array.shape
+        rows, starts, stops = [], [], []
+        for top in range(0, height, band_rows):
+            band = array[top : top + band_rows]
+            band = band if band.dtype == bool else band != 0
+            padded = np.zeros((band.shape[0], width + 2), dtype=np.int8)
+            padded[:, 1:-1] = band
+            # +1 where a run starts, -1 one past where it stops
+            band_rows_, columns = np.nonzero(np.diff(padded, axis=1))
+            rows.append(band_rows_[0::2] + top)
+            starts.append(columns[0::2])
+            stops.append(columns[1::2])
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        return cls(_row_ptr(rows, height),
+                   np.concatenate(starts) if starts else rows,
+                   np.concatenate(stops) if stops else rows, array.shape)
+
+    def to_array(self):
+        """Decode to a boolean ndarray of the mask's shape"""
+        height, width = self.shape
+        rows = self.rows()
+        edges = np.zeros((height, width + 1), dtype=np.int8)
+        # Runs in a row never touch, so no two edges land on the same cell
+        edges[rows, self.starts] = 1
+        edges[rows, self.stops] = -1
+        return np.cumsum(edges[:, :width], axis=1, dtype=np.int8).view(bool)
+
+    def rows(self):
+        """Row of every run"""
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.row_ptr))
+
+    def row(self, index):
+        """(starts, stops) of the runs of one row"""
+        runs = slice(self.row_ptr[index], self.row_ptr[index + 1])
+        return self.starts[runs], self.stops[runs]
+
+    def copy(self):
+        return RunMask(self.row_ptr.copy(), self.starts.copy(), self.stops.copy(), self.shape)
+
+    def count(self):
+        """Number of foreground pixels"""
+        return int((self.stops - self.starts).sum())
+
+    @property
+    def runs(self):
+        return len(self.starts)
+
+    @property
+    def nbytes(self):
+        return self.row_ptr.nbytes + self.starts.nbytes + self.stops.nbytes
+
+    def __eq__(self, other):
+        if not isinstance(other, RunMask):
+            return NotImplemented
+        return (self.shape == other.shape and np.array_equal(self.row_ptr, other.row_ptr)
+                and np.array_equal(self.starts, other.starts)
+                and np.array_equal(self.stops, other.stops))
+
+    def __or__(self, other):
+        return _union_or_intersection(np.r_[self.rows(), other.rows()],
+                                      np.r_[self.starts, other.starts],
+                                      np.r_[self.stops, other.stops], self.shape, 1)
+
+    def __and__(self, other):
+        return _union_or_intersection(np.r_[self.rows(), other.rows()],
+                                      np.r_[self.starts, other.starts],
+                                      np.r_[self.stops, other.stops], self.shape, 2)
+
+    def save(self, path):
+        """Write the runs as gaps and lengths in the smallest integer type that fits"""
+        width = self.shape[1]
+        counts = np.diff(self.row_ptr)
+        previous = np.r_[0, self.stops[:-1]]
+        # A row's first gap is measured from column 0
+        previous[self.row_ptr[:-1][counts > 0]] = 0
+        column = np.min_scalar_type(width)
+        np.savez_compressed(path, format=FORMAT, shape=np.array(self.shape, dtype=np.int64),
+                            counts=counts.astype(np.min_scalar_type(max(int(counts.max(initial=0)), 1))),
+                            gaps=(self.starts - previous).astype(column),
+                            lengths=(self.stops - self.starts).astype(column))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if "format" not in data or str(data["format"]) != FORMAT:
+                raise ValueError(f"{path} is not a run-length-encoded mask")
+            shape = tuple(int(size) for size in data["shape"])
+            counts = data["counts"].astype(np.int64)
+            gaps = data["gaps"].astype(np.int64)
+            lengths = data["lengths"].astype(np.int64)
+        row_ptr = np.r_[0, np.cumsum(counts)]
+        # Cumulative sum of gaps and lengths, restarted at every row
+        steps = gaps + lengths
+        ends = np.cumsum(steps)
+        row_base = np.repeat(np.r_[0, ends][row_ptr[:-1]], counts)
+        stops = ends - row_base
+        return cls(row_ptr, stops - lengths, stops, shape)
+
+
+def erode(mask, structure):
+    """Binary erosion; a pixel stays where every segment of the element fits inside a run"""
+    mask = mask if isinstance(mask, RunMask) else RunMask.from_array(mask)
+    segments = _segments(structure)
+    if not segments:
+        return RunMask.from_array(engine.apply_operation(mask.to_array(), structure, "Erosion"))
+    rows = mask.rows()
+    # Each segment gives one shrunk set of runs; the result is their intersection
+    return _union_or_intersection(
+        np.concatenate([rows - dy for dy, _, _ in segments]),
+        np.concatenate([mask.starts - first for _, first, _ in segments]),
+        np.concatenate([mask.stops - last for _, _, last in segments]),
+        mask.shape, len(segments))
+
+
+def dilate(mask, structure):
+    """Binary dilation; every run is widened by each segment of the element and merged"""
+    mask = mask if isinstance(mask, RunMask) else RunMask.from_array(mask)
+    segments = _segments(structure)
+    rows = mask.rows()
+    return _union_or_intersection(
+        np.concatenate([rows + dy for dy, _, _ in segments] or [rows[:0]]),
+        np.concatenate([mask.starts + first for _, first, _ in segments] or [rows[:0]]),
+        np.concatenate([mask.stops + last for _, _, last in segments] or [rows[:0]]),
+        mask.shape, 1)
+
+
+def opening(mask, structure):
+    return dilate(erode(mask, structure), structure)
+
+
+def closing(mask, structure):
+    return erode(dilate(mask, structure), structure)
+
+
+OPERATIONS = {
+    "Erosion": erode,
+    "Dilation": dilate,
+    "Opening": opening,
+    "Closing": closing,
+}
+
+
+def apply_operation(mask, structure, operation):
+    """Run a basic operation on a RunMask (or any 2-D array) and return a RunMask"""
+    if operation not in OPERATIONS:
+        raise ValueError(f"{operation} is not available on run-length-encoded masks")
+    return OPERATIONS[operation](mask, structure)
+
+
+def load_mask(path):
+    """RunMask from a .rle.npz file, or encoded from a .npy file (memory-mapped)"""
+    if path.endswith(".npz"):
+        return RunMask.load(path)
+    return RunMask.from_array(np.load(path, mmap_mode="r"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    encode = commands.add_parser("encode", help="encode a .npy mask")
+    decode = commands.add_parser("decode", help="decode to a boolean .npy mask")
+    apply = commands.add_parser("apply", help="run an operation on the runs")
+    for command in (encode, decode, apply):
+        command.add_argument("input", help=".npy mask or .rle.npz file")
+        command.add_argument("output")
+    apply.add_argument("--operation", default="Erosion", type=engine.operation_name,
+                       choices=sorted(OPERATIONS))
+    apply.add_argument("--structure", default="rect:3x3",
+                       help='"rect:HxW", "cross:N", "diamond:R", "disk:R" or a .npy/.txt grid file')
+    args = parser.parse_args(argv)
+
+    mask = load_mask(args.input)
+    if args.command == "apply":
+        mask = apply_operation(mask, structures.from_spec(args.structure), args.operation)
+    if args.command == "decode":
+        np.save(args.output, mask.to_array())
+    else:
+        mask.save(args.output)
+    print(f"{args.output}: {mask.shape[0]}x{mask.shape[1]}, {mask.runs} runs, "
+          f"{mask.count()} foreground pixels")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
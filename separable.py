@@ -0,0 +1,101 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+# A 1-D run of the structuring element: cells at offsets start .. start + length - 1
+# along ``axis`` (0 = rows, 1 = columns), zero offset along the other axis.
+Segment = namedtuple("Segment", ["axis", "start", "length"])
+
+
+def running_reduce(array, size, axis, ufunc, pad_value=0, offset=0):
+    """van Herk/Gil-Werman sliding window along ``axis``
+
+    out[i] = ufunc.reduce(array[i + offset : i + offset + size]), with values
+    outside the array taken as ``pad_value``. The padded axis is cut into
+    blocks of ``size``; each window is the combination of one block suffix and
+    one block prefix, so the cost per element does not depend on ``size``.
+    """
+    array = np.asarray(array)
+    moved = np.moveaxis(array, axis, 0)
+    n = moved.shape[0]
+    before = max(0, -offset)
+    first = offset + before
+    total = -(-max(first + n + size - 1, before + n) // size) * size
+    padded = np.full((total,) + moved.shape[1:], pad_value, dtype=array.dtype)
+    padded[before : before + n] = moved
+    if size <= 1:
+        out = padded[first : first + n].copy()
+    else:
+        blocks = padded.reshape((total // size, size) + moved.shape[1:])
+        prefix = ufunc.accumulate(blocks, axis=1).reshape(padded.shape)
+        suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+        out = ufunc(suffix[first : first + n], prefix[first + size - 1 : first + size - 1 + n])
+    return np.ascontiguousarray(np.moveaxis(out, 0, axis))
+
+
+def decompose(structure):
+    """Split a structuring element into 1-D segments, or return None
+
+    The result is a list of factors applied one after another (Minkowski sum);
+    each factor is a tuple of segments whose union forms that factor. Handles
+    filled rectangles and lines anywhere in the element, crosses whose arms
+    meet at the element's center, and centered diamonds (repeated 3x3 crosses).
+    Arbitrary shapes return None so callers can fall back to the dense path.
+    """
+    structure = np.asarray(structure) != 0
+    if structure.ndim != 2 or not structure.any():
+        return None
+
+    center_row, center_col = structure.shape[0] // 2, structure.shape[1] // 2
+    rows, cols = np.nonzero(structure)
+    top, bottom = rows.min(), rows.max()
+    left, right = cols.min(), cols.max()
+    box = structure[top : bottom + 1, left : right + 1]
+
+    if box.all():
+        factors = [
+            (Segment(1, int(left - center_col), box.shape[1]),),
+            (Segment(0, int(top - center_row), box.shape[0]),),
+        ]
+        return [factor for factor in factors if not _is_identity(factor)]
+
+    radius = _diamond_radius(structure, center_row, center_col)
+    if radius is not None:
+        return [(Segment(1, -1, 3), Segment(0, -1, 3))] * radius
+
+    in_row = rows == center_row
+    in_col = cols == center_col
+    if (in_row | in_col).all() and structure[center_row, center_col]:
+        horizontal = _contiguous_segment(1, cols[in_row] - center_col)
+        vertical = _contiguous_segment(0, rows[in_col] - center_row)
+        if horizontal is not None and vertical is not None:
+            return [(horizontal, vertical)]
+
+    return None
+
+
+def _is_identity(factor):
+    return all(segment.start == 0 and segment.length == 1 for segment in factor)
+
+
+def _contiguous_segment(axis, offsets):
+    offsets = np.sort(offsets)
+    if offsets[-1] - offsets[0] + 1 != len(offsets):
+        return None
+    return Segment(axis, int(offsets[0]), len(offsets))
+
+
+def _diamond_radius(structure, center_row, center_col):
+    """Radius r if the element is exactly |dy| + |dx| <= r around its center"""
+    rows, cols = np.nonzero(structure)
+    radius = int((np.abs(rows - center_row) + np.abs(cols - center_col)).max())
+    height, width = structure.shape
+    if radius < 2 or radius > min(center_row, center_col, height - 1 - center_row, width - 1 - center_col):
+        # Radius 0 and 1 are already handled as a rectangle and a cross.
+        return None
+    dy, dx = np.ogrid[:height, :width]
+    expected = np.abs(dy - center_row) + np.abs(dx - center_col) <= radius
+    if not np.array_equal(structure, expected):
+        return None
+    return radius
@@ -0,0 +1,146 @@
+"""Measure how long main.py takes to import and to put its first frame on screen.
+
+Every run starts a fresh interpreter, so module caches from earlier runs do
+not hide import costs. Reported per phase (median over the runs):
+
+    interpreter   process start until this script's first line runs
+    import        importing main and everything it pulls in
+    window        building MorphologicalGUI
+    first paint   until the input grid has been painted once
+    total         wall time of the whole process up to the first paint
+
+The headless compute modules are timed the same way, and any GUI or scipy
+module they import is reported. With --budget-ms the exit status is 1
+when the median total GUI startup time goes over the budget, so CI can
+catch startup regressions.
+
+Example:
+    python startup.py --runs 7 --budget-ms 800
+"""
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Modules a headless import of the compute code must not drag in
+HEAVY_MODULES = ("PyQt5", "scipy", "cv2")
+HEADLESS_MODULES = ("engine", "grayscale", "pipeline", "result_cache", "animation", "components")
+
+
+def _measure_gui():
+    """Child process: phase times in ms since this interpreter's first line"""
+    timings = {}
+    import main
+    timings["import"] = time.perf_counter()
+    from PyQt5.QtCore import QEvent, QObject, QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication(sys.argv[:1])
+    window = main.MorphologicalGUI()
+    timings["window"] = time.perf_counter()
+
+    class FirstPaint(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint and "painted" not in timings:
+                # Stop once this paint has been handled
+                QTimer.singleShot(0, app.quit)
+                timings["painted"] = True
+            return False
+
+    watcher = FirstPaint()
+    window.left_grid.installEventFilter(watcher)
+    window.show()
+    app.exec_()
+    timings["first paint"] = time.perf_counter()
+    del timings["painted"]
+    window.close()
+    return timings
+
+
+def _measure_headless():
+    timings = {}
+    for name in HEADLESS_MODULES:
+        __import__(name)
+    timings["import"] = time.perf_counter()
+    return timings
+
+
+def child(mode):
+    timings = _measure_gui() if mode == "gui" else _measure_headless()
+    previous = _START
+    report = {}
+    for phase, moment in timings.items():
+        report[phase] = (moment - previous) * 1000.0
+        previous = moment
+    loaded = sorted({name.split(".")[0] for name in sys.modules} & set(HEAVY_MODULES))
+    print(json.dumps({"phases": report, "loaded": loaded}))
+
+
+def run_child(mode):
+    """Start a fresh interpreter for one measurement; returns (phases in ms, heavy modules)"""
+    env = dict(os.environ)
+    if sys.platform.startswith("linux") and not (env.get("DISPLAY") or env.get("WAYLAND_DISPLAY")):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    # -X importtime is not used: its own bookkeeping slows imports down
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode],
+                            cwd=here, env=env, capture_output=True, text=True, check=True).stdout
+    total = (time.perf_counter() - start) * 1000.0
+    result = json.loads(output.strip().splitlines()[-1])
+    phases = result["phases"]
+    # Interpreter start is what the child could not see itself
+    phases = dict({"interpreter": total - sum(phases.values())}, **phases, total=total)
+    return phases, result["loaded"]
+
+
+def run_startup(runs=5):
+    """Median phase times of the GUI and headless starts over several runs"""
+    report = {}
+    for mode in ("gui", "headless"):
+        samples = [run_child(mode) for _ in range(runs)]
+        phases = {phase: statistics.median(run[0][phase] for run in samples)
+                  for phase in samples[0][0]}
+        report[mode] = {"phases_ms": phases, "loaded": samples[0][1]}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode (default: 5)")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if the median total GUI startup time is above this")
+    parser.add_argument("-o", "--output", help="also write the report as JSON here")
+    parser.add_argument("--child", choices=("gui", "headless"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(args.child)
+        return 0
+
+    report = run_startup(args.runs)
+    for mode, result in report.items():
+        phases = "  ".join(f"{phase} {ms:.0f} ms" for phase, ms in result["phases_ms"].items())
+        print(f"{mode:>8}: {phases}")
+    heavy = report["headless"]["loaded"]
+    if heavy:
+        print(f"warning: headless import loaded {', '.join(heavy)}")
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+    total = report["gui"]["phases_ms"]["total"]
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"total startup time {total:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+
+
+def rectangle(height, width=None):
+    """Filled height x width element"""
+    width = height if width is None else width
+    return np.ones((height, width), dtype=bool)
+
+
+def cross(size):
+    """Plus-shaped element with arms spanning the full size x size box"""
+    structure = np.zeros((size, size), dtype=bool)
+    structure[size // 2, :] = True
+    structure[:, size // 2] = True
+    return structure
+
+
+def diamond(radius):
+    """Cells with |dy| + |dx| <= radius, i.e. radius repeated 3x3 crosses"""
+    dy, dx = np.ogrid[-radius : radius + 1, -radius : radius + 1]
+    return np.abs(dy) + np.abs(dx) <= radius
+
+
+def disk(radius):
+    """Cells with dy**2 + dx**2 <= radius**2: the Euclidean ball"""
+    reach = int(math.floor(radius))
+    dy, dx = np.ogrid[-reach : reach + 1, -reach : reach + 1]
+    return dy * dy + dx * dx <= radius * radius
+
+
+# Balls by norm; "taxicab" is the diamond and "chessboard" the square
+NORMS = {
+    "euclidean": disk,
+    "taxicab": lambda radius: diamond(int(radius)),
+    "chessboard": lambda radius: rectangle(2 * int(radius) + 1),
+}
+
+
+def ball(radius, norm="euclidean"):
+    """Cells within radius of the center in the given norm (see NORMS)"""
+    if norm not in NORMS:
+        raise ValueError(f"unknown norm {norm!r}, expected one of {sorted(NORMS)}")
+    return NORMS[norm](radius)
+
+
+def minkowski_sum(first, second):
+    """Element holding every sum of an offset of first and an offset of second
+
+    Offsets are relative to each array's center cell (index shape // 2); the
+    result is centered in an odd-sized array. Away from the image border,
+    dilating by it equals dilating by first and then by second.
+    """
+    first, second = np.asarray(first) != 0, np.asarray(second) != 0
+    offsets_first = np.argwhere(first) - np.array(first.shape) // 2
+    offsets_second = np.argwhere(second) - np.array(second.shape) // 2
+    sums = (offsets_first[:, None, :] + offsets_second[None, :, :]).reshape(-1, 2)
+    if not len(sums):
+        return np.zeros((1, 1), dtype=bool)
+    reach = np.abs(sums).max(axis=0)
+    structure = np.zeros(tuple(2 * reach + 1), dtype=bool)
+    structure[sums[:, 0] + reach[0], sums[:, 1] + reach[1]] = True
+    return structure
+
+
+SHAPES = {
+    "rect": rectangle,
+    "cross": cross,
+    "diamond": diamond,
+    "disk": disk,
+}
+
+
+def from_spec(spec):
+    """Build an element from a spec like "rect:5x3", "cross:7", "diamond:3", "disk:40" or a file
+
+    Files ending in .npy are loaded with np.load, anything else with
+    np.loadtxt, e.g. a whitespace-separated grid of 0/1 values.
+    """
+    name, _, size = spec.partition(":")
+    if name in SHAPES:
+        if not size:
+            raise ValueError(f"structuring element {spec!r} is missing its size")
+        dims = [int(part) for part in size.lower().split("x")]
+        return SHAPES[name](*dims)
+    if spec.endswith(".npy"):
+        structure = np.load(spec)
+    else:
+        structure = np.loadtxt(spec, ndmin=2)
+    return np.asarray(structure) != 0
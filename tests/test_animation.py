@@ -0,0 +1,87 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import animation
+import structures
+
+
+def _decode_gif(path):
+    """RGB frames of a GIF, fully composited, from Pillow or else OpenCV"""
+    try:
+        from PIL import Image, ImageSequence
+    except ImportError:
+        pass
+    else:
+        with Image.open(path) as image:
+            return [np.array(frame.convert("RGB")) for frame in ImageSequence.Iterator(image)]
+    try:
+        import cv2
+        read = cv2.imreadanimation
+    except (ImportError, AttributeError):
+        pytest.skip("decoding GIFs needs Pillow or OpenCV 4.11+")
+    ok, result = read(path)
+    assert ok, f"cannot decode {path}"
+    return [np.ascontiguousarray(frame[:, :, 2::-1]) for frame in result.frames]
+
+
+def _expected_frames(grid, structure, operation, size, fps, duration, hold, palette, levels,
+                     line_index):
+    frames = [animation.frame_pixels(animation.quantize(colors, palette), size, line_index)
+              for colors in animation.sweep_frames(grid, structure, operation, fps, duration, hold,
+                                                   levels)]
+    # The writer stores a run of identical frames once, with a longer delay
+    kept = [frame for index, frame in enumerate(frames)
+            if not index or not np.array_equal(frame, frames[index - 1])]
+    return len(frames), kept
+
+
+@pytest.mark.parametrize("palette, levels, grid_lines", [
+    ("gray", 200, False),
+    ("color", 2, True),
+])
+def test_gif_round_trip(tmp_path, palette, levels, grid_lines):
+    rng = np.random.default_rng(0)
+    grid = rng.integers(0, levels, (24, 30))
+    structure, operation = structures.disk(2), "Closing"
+    size, fps, duration, hold = (150, 120), 10, 0.5, 0.3
+    path = str(tmp_path / "sweep.gif")
+    count = animation.render_animation(grid, structure, operation, path, size, fps, duration, hold,
+                                       palette, levels, grid_lines)
+
+    line_index = None
+    if grid_lines:
+        red, green, blue = animation.GRID_LINE_COLOR
+        color = 0xFF000000 | (red << 16) | (green << 8) | blue
+        line_index = animation.quantize(np.array([color], dtype=np.uint32), palette)[0]
+    total, expected = _expected_frames(grid, structure, operation, size, fps, duration, hold,
+                                       palette, levels, line_index)
+    assert count == total and len(expected) > 2
+    if levels > 2:
+        # Far more than 256 codes: the LZW table widens its codes and is reset
+        assert len(np.unique(expected[0])) > 128
+        assert size[0] * size[1] > 4096
+
+    decoded = _decode_gif(path)
+    assert len(decoded) == len(expected)
+    colors = animation.palette_colors(palette)
+    for index, (frame, pixels) in enumerate(zip(decoded, expected)):
+        np.testing.assert_array_equal(frame, colors[pixels], err_msg=f"frame {index}")
+
+
+def test_lzw_table_reset_round_trips(tmp_path):
+    # Random bytes fill the 4096-entry table several times over
+    pixels = np.random.default_rng(1).integers(0, 256, (200, 240), dtype=np.uint8)
+    path = str(tmp_path / "noise.gif")
+    writer = animation.GifWriter(path, (240, 200), fps=10, palette="gray")
+    writer.write(pixels)
+    writer.write(pixels[::-1].copy())
+    writer.close()
+    decoded = _decode_gif(path)
+    assert len(decoded) == 2
+    np.testing.assert_array_equal(decoded[0][:, :, 0], pixels)
+    np.testing.assert_array_equal(decoded[1][:, :, 0], pixels[::-1])
@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backends
+import engine
+import structures
+
+
+ELEMENTS = {
+    "separable": structures.rectangle(5, 3),
+    "cross": structures.cross(5),
+    "ball": structures.disk(4),
+    "dense": np.random.default_rng(1).random((5, 4)) < 0.5,
+    "origin-less": np.array([[1, 0, 1], [0, 0, 0], [1, 0, 0]], dtype=bool),
+}
+
+DTYPES = (bool, np.uint8, np.int32, np.float64)
+
+
+def _mask(dtype, seed=0, shape=(41, 53)):
+    values = np.random.default_rng(seed).random(shape)
+    mask = values < 0.55
+    if dtype == bool:
+        return mask
+    # Non-zero values other than 1 must still count as foreground
+    return (mask * (1 + 3 * values)).astype(dtype)
+
+
+@pytest.mark.parametrize("backend", sorted(backends.BACKENDS))
+@pytest.mark.parametrize("kind", sorted(ELEMENTS))
+@pytest.mark.parametrize("dtype", DTYPES, ids=lambda dtype: np.dtype(dtype).name)
+def test_backends_match_scipy(backend, kind, dtype):
+    structure = ELEMENTS[kind]
+    mask = _mask(dtype)
+    for operation in engine.BASIC_OPERATIONS:
+        expected = getattr(ndimage, backends._SCIPY[operation])(mask != 0, structure=structure)
+        result = backends.apply_operation(mask, structure, operation, backend=backend)
+        assert result.dtype == bool
+        np.testing.assert_array_equal(result, expected, err_msg=operation)
+
+
+def _write_table(path, backend, fingerprint=None):
+    entries = []
+    for kind in ("dense", "separable", "ball"):
+        for dtype in ("bool", "uint8", "other"):
+            entries.append({"dtype": dtype, "kind": kind, "size": 5, "area": 3,
+                            "backend": backend, "timings": {backend: 0.0}})
+    table = {"fingerprint": fingerprint or backends.fingerprint(), "entries": entries}
+    with open(path, "w") as handle:
+        json.dump(table, handle)
+
+
+def test_calibration_is_saved_and_reloaded(tmp_path):
+    path = str(tmp_path / "backends.json")
+    dispatcher = backends.Dispatcher(path)
+    table = dispatcher.calibrate(sizes=(16, 32), structures=[structures.rectangle(3)],
+                                 dtypes=(bool,), repeats=1)
+    assert os.path.exists(path)
+    reloaded = backends.Dispatcher(path)
+    assert reloaded.load() == json.loads(json.dumps(table))
+
+
+def test_saved_calibration_is_used(tmp_path):
+    path = str(tmp_path / "backends.json")
+    _write_table(path, "scipy")
+    dispatcher = backends.Dispatcher(path)
+    mask = _mask(bool, shape=(32, 32))
+    assert dispatcher.choose(mask, structures.rectangle(3)) == "scipy"
+    assert dispatcher.choose(mask.astype(np.uint8), structures.disk(6)) == "scipy"
+
+
+def test_changed_fingerprint_invalidates_calibration(tmp_path):
+    path = str(tmp_path / "backends.json")
+    stale = dict(backends.fingerprint(), numpy="0.0")
+    _write_table(path, "scipy", fingerprint=stale)
+    dispatcher = backends.Dispatcher(path)
+    assert dispatcher.load() is None
+    mask = _mask(bool, shape=(32, 32))
+    key = backends.features(mask, structures.rectangle(3))
+    assert dispatcher.choose(mask, structures.rectangle(3)) == backends.default_backend(key)
+
+
+def test_stale_calibration_is_rebuilt_when_asked(tmp_path):
+    path = str(tmp_path / "backends.json")
+    _write_table(path, "scipy", fingerprint=dict(backends.fingerprint(), numpy="0.0"))
+    dispatcher = backends.Dispatcher(path, calibrate=True)
+    dispatcher.calibrate = lambda: {"fingerprint": backends.fingerprint(), "entries": []}
+    assert dispatcher.load() == {"fingerprint": backends.fingerprint(), "entries": []}
+
+
+def test_memo_key_follows_feature_buckets(tmp_path):
+    path = str(tmp_path / "backends.json")
+    dispatcher = backends.Dispatcher(path)
+    structure = structures.rectangle(3)
+    # 30 x 30 and 32 x 32 share a size bucket but not a bit length
+    small, large = np.zeros((30, 30), bool), np.zeros((32, 32), bool)
+    assert backends.features(small, structure) == backends.features(large, structure)
+    dispatcher.choose(small, structure)
+    dispatcher.choose(large, structure)
+    assert len(dispatcher.choices) == 1
+    # Different buckets never share a memo entry
+    dispatcher.choose(np.zeros((200, 200), bool), structure)
+    assert len(dispatcher.choices) == 2
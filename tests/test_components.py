@@ -0,0 +1,93 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import components
+
+
+def _expected(mask, connectivity):
+    """(count, euler number, sorted (area, box) list) from a fresh scipy labelling"""
+    foreground = ndimage.generate_binary_structure(2, 2 if connectivity == 8 else 1)
+    background = ndimage.generate_binary_structure(2, 1 if connectivity == 8 else 2)
+    labels, count = ndimage.label(mask, structure=foreground)
+    # Holes are the background components that do not reach the padded border
+    _, background_count = ndimage.label(~np.pad(mask, 1), structure=background)
+    areas = np.bincount(labels.ravel(), minlength=count + 1)[1:]
+    boxes = [(rows.start, cols.start, rows.stop - 1, cols.stop - 1)
+             for rows, cols in ndimage.find_objects(labels)]
+    return count, count - (background_count - 1), sorted(zip(areas.tolist(), boxes))
+
+
+def _check(tracker, mask, connectivity):
+    count, euler, components_ = _expected(mask, connectivity)
+    np.testing.assert_array_equal(tracker.mask, mask)
+    assert tracker.count() == count
+    assert tracker.euler_number() == euler
+    everything = tracker.summary(largest=count + 1)
+    assert everything["count"] == count and everything["euler"] == euler
+    assert everything["area"] == np.count_nonzero(mask)
+    assert sorted(everything["largest"]) == components_
+    largest = tracker.summary()["largest"]
+    assert [area for area, _ in largest] == sorted((area for area, _ in components_),
+                                                   reverse=True)[:5]
+    assert all(item in components_ for item in largest)
+
+
+@pytest.mark.parametrize("connectivity", [8, 4])
+@pytest.mark.parametrize("density", [0.2, 0.5, 0.75])
+def test_random_toggles_match_scipy(connectivity, density):
+    rng = np.random.default_rng(int(density * 100) + connectivity)
+    shape = (23, 29)
+    mask = rng.random(shape) < density
+    tracker = components.ComponentTracker(mask, connectivity)
+    _check(tracker, mask, connectivity)
+    for step in range(400):
+        if step % 10:
+            row, col = rng.integers(shape[0]), rng.integers(shape[1])
+            mask[row, col] = not mask[row, col]
+            tracker.set(row, col, mask[row, col])
+        else:
+            # A few edits inside a window, passed through update()
+            top, left = rng.integers(shape[0] - 4), rng.integers(shape[1] - 4)
+            window = slice(top, top + 5), slice(left, left + 5)
+            mask[window] ^= rng.random((5, 5)) < 0.3
+            tracker.update(mask.copy(), window)
+        _check(tracker, mask, connectivity)
+
+
+def test_update_relabels_after_many_changes():
+    rng = np.random.default_rng(3)
+    mask = rng.random((40, 40)) < 0.5
+    tracker = components.ComponentTracker(mask)
+    for _ in range(5):
+        mask = rng.random((40, 40)) < 0.5
+        tracker.update(mask)
+        _check(tracker, mask, 8)
+    # A new shape starts over
+    mask = rng.random((17, 9)) < 0.5
+    tracker.update(mask)
+    _check(tracker, mask, 8)
+
+
+def test_labels_are_renumbered_when_mostly_unused():
+    rng = np.random.default_rng(4)
+    mask = rng.random((8, 8)) < 0.5
+    tracker = components.ComponentTracker(mask)
+    renumbered = 0
+    for step in range(5000):
+        row, col = rng.integers(8), rng.integers(8)
+        mask[row, col] = not mask[row, col]
+        previous = tracker.next_label
+        tracker.set(row, col, mask[row, col])
+        renumbered += tracker.next_label < previous
+        assert tracker.next_label <= tracker.label_limit
+        if not step % 100:
+            _check(tracker, mask, 8)
+    assert renumbered > 10
+    assert len(tracker.parent) <= 2 * 5 * mask.size
+    _check(tracker, mask, 8)
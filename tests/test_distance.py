@@ -0,0 +1,87 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import distance
+import structures
+
+
+SHAPE = (23, 31)
+# Zero, fractional, and larger than the image in both directions
+RADII = (0, 1, 2.5, 4, 7, 40)
+
+
+def _mask(seed, density):
+    mask = np.random.default_rng(seed).random(SHAPE) < density
+    # Foreground on the border shows whether outside pixels count as background
+    mask[0, :5] = mask[-1, -5:] = True
+    return mask
+
+
+def _reference(operation, mask, structure):
+    if operation == "Erosion":
+        return ndimage.binary_erosion(mask, structure=structure)
+    if operation == "Dilation":
+        return ndimage.binary_dilation(mask, structure=structure)
+    if operation == "Opening":
+        return ndimage.binary_opening(mask, structure=structure)
+    return ndimage.binary_closing(mask, structure=structure)
+
+
+@pytest.fixture(params=["opencv", "scipy"])
+def transform(request, monkeypatch):
+    """Run with each distance transform distance.py can use"""
+    if request.param == "opencv":
+        if not distance.HAS_OPENCV:
+            pytest.skip("OpenCV is not installed")
+    else:
+        monkeypatch.setattr(distance, "HAS_OPENCV", False)
+    return request.param
+
+
+@pytest.mark.parametrize("norm", sorted(structures.NORMS))
+@pytest.mark.parametrize("radius", RADII)
+@pytest.mark.parametrize("operation", sorted(distance.OPERATIONS))
+def test_ball_operations_match_scipy(transform, operation, radius, norm):
+    structure = structures.ball(radius, norm)
+    for seed, density in enumerate((0.1, 0.6, 0.97)):
+        mask = _mask(seed, density)
+        np.testing.assert_array_equal(distance.OPERATIONS[operation](mask, radius, norm),
+                                      _reference(operation, mask, structure),
+                                      err_msg=f"density {density}")
+
+
+@pytest.mark.parametrize("radius", RADII)
+def test_disk_dispatch_matches_scipy(radius):
+    structure = structures.disk(radius)
+    mask = _mask(3, 0.5)
+    for operation in distance.OPERATIONS:
+        np.testing.assert_array_equal(distance.apply_operation(mask, structure, operation),
+                                      _reference(operation, mask, structure), err_msg=operation)
+
+
+def test_empty_and_full_masks():
+    empty, full = np.zeros(SHAPE, dtype=bool), np.ones(SHAPE, dtype=bool)
+    for radius in RADII:
+        structure = structures.disk(radius)
+        for mask in (empty, full):
+            np.testing.assert_array_equal(distance.dilate(mask, radius),
+                                          ndimage.binary_dilation(mask, structure=structure))
+            np.testing.assert_array_equal(distance.erode(mask, radius),
+                                          ndimage.binary_erosion(mask, structure=structure))
+
+
+def test_match_recognises_only_balls():
+    for radius in (0, 1, 3, 6):
+        for norm in structures.NORMS:
+            matched = distance.match(structures.ball(radius, norm))
+            assert matched is not None
+            assert np.array_equal(structures.ball(matched[0], matched[1]),
+                                  structures.ball(radius, norm))
+    assert distance.match(structures.rectangle(3, 5)) is None
+    assert distance.match(np.array([[1, 0, 1], [0, 0, 0], [1, 0, 0]])) is None
@@ -0,0 +1,44 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+
+
+# Does not contain its origin: plain dilate-and-mask oscillates on it
+ORIGINLESS = np.array([[1, 0, 1], [0, 0, 0], [1, 0, 0]], dtype=bool)
+
+
+def _run_with_timeout(function, *args, timeout=10.0):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=function(*args)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"{function.__name__} did not terminate"
+    return result["value"]
+
+
+def _random_mask(seed, shape=(24, 31), density=0.5):
+    return np.random.default_rng(seed).random(shape) < density
+
+
+def test_reconstruct_terminates_without_origin():
+    mask = _random_mask(0)
+    marker = np.zeros_like(mask)
+    marker[::5, ::7] = True
+    result = _run_with_timeout(engine.reconstruct, marker, mask, ORIGINLESS).to_array()
+    assert not (result & ~mask).any()
+    assert (result >= (marker & mask)).all()
+
+
+def test_fill_holes_and_clear_border_terminate_without_origin():
+    for seed in range(3):
+        mask = _random_mask(seed)
+        filled = _run_with_timeout(engine.apply_operation, mask, ORIGINLESS, "Fill Holes")
+        cleared = _run_with_timeout(engine.apply_operation, mask, ORIGINLESS, "Clear Border")
+        assert (filled >= mask).all()
+        assert not (cleared & ~mask).any()
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grayscale
+import structures
+
+
+ELEMENTS = {
+    "square": structures.rectangle(3),
+    "separable": structures.rectangle(5, 2),
+    "cross": structures.cross(5),
+    "disk": structures.disk(3),
+    "dense": np.random.default_rng(1).random((4, 5)) < 0.5,
+    "origin-less": np.array([[1, 0, 1], [0, 0, 0], [1, 0, 0]], dtype=bool),
+}
+
+DTYPES = (np.uint8, np.uint16, np.float32, np.float64)
+
+
+def _image(dtype, seed=0, shape=(37, 45)):
+    rng = np.random.default_rng(seed)
+    if np.dtype(dtype).kind == "f":
+        # Negative values make the zero border visible to dilation too
+        return rng.uniform(-1, 1, shape).astype(dtype)
+    return rng.integers(0, np.iinfo(dtype).max, shape, endpoint=True).astype(dtype)
+
+
+def _scipy(function, image, structure):
+    return function(image, footprint=np.asarray(structure) != 0, mode="constant", cval=0)
+
+
+@pytest.mark.parametrize("kind", sorted(ELEMENTS))
+@pytest.mark.parametrize("dtype", DTYPES, ids=lambda dtype: np.dtype(dtype).name)
+def test_erosion_and_dilation_match_scipy(kind, dtype):
+    image, structure = _image(dtype), ELEMENTS[kind]
+    eroded = grayscale.erode(image, structure)
+    dilated = grayscale.dilate(image, structure)
+    assert eroded.dtype == dilated.dtype == image.dtype
+    np.testing.assert_array_equal(eroded, _scipy(ndimage.grey_erosion, image, structure))
+    np.testing.assert_array_equal(dilated, _scipy(ndimage.grey_dilation, image, structure))
+
+
+@pytest.mark.parametrize("dtype", DTYPES, ids=lambda dtype: np.dtype(dtype).name)
+def test_composite_operations_match_scipy(dtype):
+    image, structure = _image(dtype, seed=2), ELEMENTS["disk"]
+    eroded = _scipy(ndimage.grey_erosion, image, structure)
+    dilated = _scipy(ndimage.grey_dilation, image, structure)
+    opened = _scipy(ndimage.grey_dilation, eroded, structure)
+    closed = _scipy(ndimage.grey_erosion, dilated, structure)
+    expected = {
+        "Opening": opened,
+        "Closing": closed,
+        "Gradient": dilated - eroded,
+        "Top-Hat": image - np.minimum(image, opened),
+        "Black-Hat": closed - np.minimum(closed, image),
+    }
+    for operation, result in expected.items():
+        np.testing.assert_array_equal(grayscale.apply_operation(image, structure, operation),
+                                      result, err_msg=operation)
+
+
+def test_border_value_matches_scipy_cval():
+    image, structure = _image(np.uint8, seed=3), ELEMENTS["cross"]
+    np.testing.assert_array_equal(
+        grayscale.erode(image, structure, border_value=255),
+        ndimage.grey_erosion(image, footprint=structure, mode="constant", cval=255))
+
+
+@pytest.mark.parametrize("kind", sorted(ELEMENTS))
+def test_binary_images_match_boolean_engine_path(kind):
+    structure = ELEMENTS[kind]
+    mask = np.random.default_rng(4).random((37, 45)) < 0.5
+    for operation in grayscale.OPERATIONS:
+        np.testing.assert_array_equal(
+            grayscale.apply_operation(mask.astype(np.uint8), structure, operation),
+            grayscale.apply_operation(mask, structure, operation), err_msg=operation)
@@ -0,0 +1,184 @@
+import os
+import re
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import pipeline
+import structures
+from pipeline import Step
+
+
+ELEMENTS = [
+    structures.rectangle(3),
+    structures.rectangle(1, 4),
+    structures.cross(5),
+    structures.disk(2),
+    structures.diamond(1),
+    # Asymmetric and without its origin
+    np.array([[1, 0, 1], [0, 0, 0], [1, 0, 0]], dtype=bool),
+    np.array([[0, 1, 1], [0, 0, 1]], dtype=bool),
+]
+
+# Skeleton is left out only because it is slow on random masks
+OPERATIONS = [operation for operation in engine.OPERATIONS if operation != "Skeleton"]
+
+
+def _random_mask(seed, shape=(29, 70), density=0.55):
+    return np.random.default_rng(seed).random(shape) < density
+
+
+def _run(steps, grid, optimize):
+    return pipeline.build_plan(steps, optimize=optimize).run(grid)["result"]
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_random_chains_match_unoptimized(seed):
+    rng = np.random.default_rng(seed)
+    grid = _random_mask(seed)
+    # Mostly erosions and dilations, so that merges and repeats actually occur
+    weighted = OPERATIONS + ["Erosion", "Dilation", "Opening", "Closing"] * 3
+    steps = [Step(weighted[rng.integers(len(weighted))], ELEMENTS[rng.integers(len(ELEMENTS))])
+             for _ in range(rng.integers(2, 7))]
+    optimized = _run(steps, grid, True)
+    np.testing.assert_array_equal(optimized, _run(steps, grid, False))
+
+    expected = grid
+    for step in steps:
+        expected = engine.apply_operation(expected, step.structure, step.operation)
+    np.testing.assert_array_equal(optimized, expected)
+
+
+@pytest.mark.parametrize("operation", ["Erosion", "Dilation"])
+def test_random_same_operation_runs_match_unoptimized(operation):
+    rng = np.random.default_rng(5)
+    for seed in range(20):
+        grid = _random_mask(seed, density=0.8 if operation == "Erosion" else 0.1)
+        steps = [Step(operation, ELEMENTS[rng.integers(len(ELEMENTS))])
+                 for _ in range(rng.integers(2, 5))]
+        np.testing.assert_array_equal(_run(steps, grid, True), _run(steps, grid, False))
+
+
+def test_repeated_idempotent_steps_are_dropped():
+    disk = structures.disk(2)
+    steps = pipeline.parse("open disk:2 | open disk:2 | close | close | thinning | thinning")
+    rewritten = pipeline.simplify(steps)
+    assert [(operation, count) for operation, _, count in rewritten] == [
+        ("Erosion", 2), ("Dilation", 0), ("Dilation", 2), ("Erosion", 0), ("Thinning", 2)]
+    assert np.array_equal(rewritten[0][1], disk)
+
+    # A different element is not a repeat
+    steps = [Step("Opening", disk), Step("Opening", structures.rectangle(3))]
+    assert len(pipeline.simplify(steps)) == 4
+
+    grid = _random_mask(3)
+    steps = pipeline.parse("open disk:2 | open disk:2 | close | close")
+    np.testing.assert_array_equal(_run(steps, grid, True), _run(steps, grid, False))
+
+
+def test_dilations_merge_into_minkowski_sum():
+    steps = pipeline.parse("dilate rect:3x3 | dilate rect:3x3 | dilate rect:1x5")
+    rewritten = pipeline.simplify(steps)
+    assert len(rewritten) == 1
+    operation, structure, count = rewritten[0]
+    assert operation == "Dilation" and count == 3
+    assert np.array_equal(structure, structures.rectangle(5, 9))
+
+    # Merging is skipped when the summed element would cost more
+    steps = pipeline.parse("dilate rect:3x3 | dilate cross:3")
+    assert len(pipeline.simplify(steps)) == 2
+
+    grid = _random_mask(4, density=0.05)
+    np.testing.assert_array_equal(_run(steps, grid, True), _run(steps, grid, False))
+
+
+def test_erosions_merge_into_minkowski_sum():
+    steps = pipeline.parse("erode rect:3x3 | erode rect:3x3")
+    rewritten = pipeline.simplify(steps)
+    assert len(rewritten) == 1
+    assert np.array_equal(rewritten[0][1], structures.rectangle(5))
+
+    grid = _random_mask(6, density=0.9)
+    np.testing.assert_array_equal(_run(steps, grid, True), _run(steps, grid, False))
+
+
+def test_inexact_merge_is_rejected():
+    # Reading one column right and then one left loses column 0 at the zero
+    # border, while the merged element (the origin alone) keeps it
+    right = np.array([[0, 0, 1]], dtype=bool)
+    left = np.array([[1, 0, 0]], dtype=bool)
+    assert not pipeline._merge_is_exact("Erosion", right, left)
+    merged = structures.minkowski_sum(right, left)
+    grid = np.ones((6, 9), dtype=bool)
+    chained = engine.apply_operation(engine.apply_operation(grid, right, "Erosion"), left, "Erosion")
+    assert not np.array_equal(chained, engine.apply_operation(grid, merged, "Erosion"))
+
+    steps = [Step("Erosion", right), Step("Erosion", left)]
+    assert len(pipeline.simplify(steps)) == 2
+    np.testing.assert_array_equal(_run(steps, grid, True), chained)
+
+    # Symmetric elements always pass
+    assert pipeline._merge_is_exact("Erosion", structures.rectangle(3), structures.disk(2))
+    assert pipeline._merge_is_exact("Dilation", structures.rectangle(3), structures.disk(2))
+
+
+def test_shared_prefix_is_computed_once():
+    chains = {
+        "first": pipeline.parse("dilate disk:2 | erode cross:5"),
+        "second": pipeline.parse("dilate disk:2 | erode rect:1x4"),
+        "third": pipeline.parse("dilate disk:2 | erode cross:5"),
+    }
+    plan = pipeline.build_plan(chains)
+    assert len(plan.nodes) == 3
+    assert [node.source for node in plan.nodes] == [None, 0, 0]
+    assert plan.outputs["first"] == plan.outputs["third"]
+
+    grid = _random_mask(7)
+    results = plan.run(grid)
+    unoptimized = pipeline.build_plan(chains, optimize=False)
+    assert len(unoptimized.nodes) == 6
+    for name, result in unoptimized.run(grid).items():
+        np.testing.assert_array_equal(results[name], result)
+
+
+def test_linear_chain_uses_two_buffers():
+    steps = pipeline.parse("erode rect:3x3 | dilate cross:5 | erode disk:2 | dilate rect:1x4 "
+                           "| erode diamond:1 | dilate disk:2")
+    plan = pipeline.build_plan(steps)
+    assert len(plan.nodes) == 6
+    assert plan.buffer_count == 2
+
+    grid = _random_mask(8)
+    np.testing.assert_array_equal(plan.run(grid)["result"], _run(steps, grid, False))
+
+
+def test_describe_lists_the_steps_run(monkeypatch):
+    steps = pipeline.parse("dilate rect:3x3 | dilate rect:3x3 | open cross:5 | open cross:5 "
+                           "| fill holes | gradient disk:2")
+    plan = pipeline.build_plan(steps)
+    described = re.findall(r"^t(\d+) = ([\w -]+)\((input|t\d+), (\d+)x(\d+) element",
+                           plan.describe((29, 70)), flags=re.MULTILINE)
+
+    ran = []
+
+    def recording(operation, function):
+        def run(source, structure, *args, **kwargs):
+            ran.append((operation, structure.shape))
+            return function(source, structure, *args, **kwargs)
+        return run
+
+    for operation, function in list(pipeline._KERNELS.items()):
+        monkeypatch.setitem(pipeline._KERNELS, operation, recording(operation, function))
+    for operation, function in list(engine.OPERATIONS.items()):
+        if operation not in pipeline._KERNELS:
+            monkeypatch.setitem(engine.OPERATIONS, operation, recording(operation, function))
+    plan.run(_random_mask(9))
+
+    assert [int(index) for index, *_ in described] == list(range(len(plan.nodes)))
+    assert [(operation, (int(height), int(width))) for _, operation, _, height, width in described] == ran
+    assert [operation for operation, _ in ran] == [
+        "Dilation", "Erosion", "Dilation", "Fill Holes", "Gradient"]
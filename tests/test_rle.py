@@ -0,0 +1,95 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import rle
+import structures
+
+
+ELEMENTS = {
+    "rect": structures.rectangle(5, 3),
+    "cross": structures.cross(5),
+    "disk": structures.disk(4),
+    "origin-less": np.array([[1, 0, 1], [0, 0, 0], [1, 0, 0]], dtype=bool),
+    "asymmetric": np.array([[0, 1, 1, 0], [0, 0, 0, 1]], dtype=bool),
+}
+
+
+def _masks():
+    rng = np.random.default_rng(0)
+    masks = {"random": rng.random((37, 61)) < 0.4, "sparse": rng.random((40, 300)) < 0.02}
+    edges = rng.random((12, 70)) < 0.5
+    edges[0] = False  # Empty row
+    edges[3] = True  # Fully set row
+    edges[5, 0] = edges[5, -1] = True
+    masks["edge rows"] = edges
+    masks["width 1"] = rng.random((25, 1)) < 0.5
+    masks["height 1"] = rng.random((1, 33)) < 0.5
+    masks["empty"] = np.zeros((9, 14), dtype=bool)
+    masks["full"] = np.ones((9, 14), dtype=bool)
+    return masks
+
+
+MASKS = _masks()
+
+
+@pytest.mark.parametrize("name", sorted(MASKS))
+def test_from_array_round_trip(name):
+    mask = MASKS[name]
+    runs = rle.RunMask.from_array(mask)
+    np.testing.assert_array_equal(runs.to_array(), mask)
+    assert runs.count() == np.count_nonzero(mask)
+    # Banded encoding gives the same runs
+    assert rle.RunMask.from_array(mask, band_rows=2) == runs
+    assert rle.RunMask.from_array(mask.astype(np.uint8) * 7) == runs
+
+
+@pytest.mark.parametrize("name", sorted(MASKS))
+def test_save_load_round_trip(tmp_path, name):
+    runs = rle.RunMask.from_array(MASKS[name])
+    path = str(tmp_path / "mask.rle.npz")
+    runs.save(path)
+    loaded = rle.RunMask.load(path)
+    assert loaded == runs
+    np.testing.assert_array_equal(loaded.to_array(), MASKS[name])
+    assert rle.load_mask(path) == runs
+
+
+def test_wide_rows_round_trip(tmp_path):
+    # Columns past 65535 need a wider integer type on disk
+    mask = np.zeros((3, 70000), dtype=bool)
+    mask[0, :] = True
+    mask[1, 65530:] = True
+    mask[2, [0, 300, 69999]] = True
+    path = str(tmp_path / "wide.rle.npz")
+    rle.RunMask.from_array(mask).save(path)
+    np.testing.assert_array_equal(rle.RunMask.load(path).to_array(), mask)
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = str(tmp_path / "other.npz")
+    np.savez(path, shape=np.array([2, 2]))
+    with pytest.raises(ValueError):
+        rle.RunMask.load(path)
+
+
+@pytest.mark.parametrize("operation", sorted(rle.OPERATIONS))
+@pytest.mark.parametrize("kind", sorted(ELEMENTS))
+@pytest.mark.parametrize("name", sorted(MASKS))
+def test_operations_match_engine(name, kind, operation):
+    mask, structure = MASKS[name], ELEMENTS[kind]
+    result = rle.apply_operation(rle.RunMask.from_array(mask), structure, operation)
+    np.testing.assert_array_equal(result.to_array(),
+                                  engine.apply_operation(mask, structure, operation))
+
+
+def test_union_and_intersection():
+    first, second = MASKS["random"], np.random.default_rng(1).random((37, 61)) < 0.4
+    first_runs, second_runs = rle.RunMask.from_array(first), rle.RunMask.from_array(second)
+    np.testing.assert_array_equal((first_runs | second_runs).to_array(), first | second)
+    np.testing.assert_array_equal((first_runs & second_runs).to_array(), first & second)
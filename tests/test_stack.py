@@ -0,0 +1,89 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import structures
+
+
+ELEMENTS = {
+    "tall": structures.rectangle(7, 3),
+    "disk": structures.disk(3),
+    # Reaches three rows up but only one down
+    "asymmetric": np.array([[1, 0, 0], [1, 1, 0], [0, 1, 0], [0, 1, 1], [0, 0, 0], [0, 0, 0],
+                            [0, 0, 0]], dtype=bool),
+    "origin-less": np.array([[1, 0, 1], [0, 0, 0], [1, 0, 0]], dtype=bool),
+    "even": np.array([[1, 1], [0, 1], [1, 0], [1, 1]], dtype=bool),
+}
+
+
+def _stack(seed=0, count=7, shape=(19, 37)):
+    rng = np.random.default_rng(seed)
+    densities = rng.uniform(0.2, 0.9, size=(count, 1, 1))
+    stack = rng.random((count,) + shape) < densities
+    # Items touching the rows next to the gaps, plus an empty and a full one
+    stack[0, 0] = stack[0, -1] = True
+    stack[1] = False
+    stack[2] = True
+    return stack
+
+
+def _per_image(stack, structure, operation):
+    structures_ = structure if np.ndim(structure) == 3 else [structure] * len(stack)
+    operations = [operation] * len(stack) if isinstance(operation, str) else operation
+    return np.array([engine.apply_operation(image, item_structure, item_operation)
+                     for image, item_structure, item_operation
+                     in zip(stack, structures_, operations)]).reshape(stack.shape)
+
+
+@pytest.mark.parametrize("operation", list(engine.OPERATIONS))
+@pytest.mark.parametrize("kind", sorted(ELEMENTS))
+def test_shared_element_matches_per_image(kind, operation):
+    stack, structure = _stack(), ELEMENTS[kind]
+    np.testing.assert_array_equal(engine.apply_stack(stack, structure, operation),
+                                  _per_image(stack, structure, operation))
+
+
+def _padded_elements(kinds):
+    """The named elements centered in one (N, h, w) stack"""
+    elements = [ELEMENTS[kind] for kind in kinds]
+    height = max(element.shape[0] for element in elements) | 1
+    width = max(element.shape[1] for element in elements) | 1
+    result = np.zeros((len(elements), height, width), dtype=bool)
+    for index, element in enumerate(elements):
+        # Keep each element's own center on the stack's center cell
+        top = height // 2 - element.shape[0] // 2
+        left = width // 2 - element.shape[1] // 2
+        result[index, top : top + element.shape[0], left : left + element.shape[1]] = element
+    return result
+
+
+@pytest.mark.parametrize("operation", engine.BASIC_OPERATIONS + ("Gradient", "Top-Hat", "Black-Hat"))
+@pytest.mark.parametrize("kinds", [
+    # Few distinct elements: one packed pass per group
+    ("tall", "asymmetric", "tall", "asymmetric", "disk", "tall", "disk"),
+    # More than engine._MAX_STACK_GROUPS: one masked pass over the union
+    ("tall", "asymmetric", "disk", "origin-less", "even", "asymmetric", "tall"),
+], ids=["grouped", "masked"])
+def test_per_item_elements_match_per_image(kinds, operation):
+    stack, structure = _stack(1), _padded_elements(kinds)
+    for index, kind in enumerate(kinds):
+        assert np.array_equal(engine._offsets(structure[index]), engine._offsets(ELEMENTS[kind]))
+    np.testing.assert_array_equal(engine.apply_stack(stack, structure, operation),
+                                  _per_image(stack, structure, operation))
+
+
+def test_per_item_operations_match_per_image():
+    stack = _stack(2)
+    operations = ["Opening", "Top-Hat", "Fill Holes", "Black-Hat", "Hit-or-Miss", "Gradient",
+                  "Closing"]
+    structure = _padded_elements(("tall", "asymmetric", "disk", "origin-less", "even",
+                                  "asymmetric", "tall"))
+    np.testing.assert_array_equal(engine.apply_stack(stack, structure, operations),
+                                  _per_image(stack, structure, operations))
+    np.testing.assert_array_equal(engine.apply_stack(stack, ELEMENTS["asymmetric"], operations),
+                                  _per_image(stack, ELEMENTS["asymmetric"], operations))
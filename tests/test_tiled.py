@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import tiled
+
+
+# Asymmetric, taller than wide, and without its origin: seams show up on every side
+ELEMENT = np.array([[0, 1, 0, 0, 1],
+                    [1, 1, 0, 0, 0],
+                    [0, 0, 0, 1, 1],
+                    [0, 0, 1, 0, 0],
+                    [1, 0, 0, 0, 0],
+                    [0, 1, 1, 0, 0],
+                    [0, 0, 0, 0, 1]], dtype=bool)
+
+
+@pytest.mark.parametrize("operation", sorted(engine._REACH_DEPTH))
+def test_tiles_match_the_whole_image(tmp_path, operation):
+    # Dense enough that erosions keep something, sparse enough that dilations do not fill
+    mask = np.random.default_rng(7).random((37, 29)) < 0.85
+    mask[10:20] &= np.random.default_rng(8).random((10, 29)) < 0.2
+    # Exact copies of the element so hit-or-miss has matches, across tile seams too
+    for top, left in ((0, 0), (11, 5), (22, 13), (30, 24)):
+        mask[top : top + 7, left : left + 5] = ELEMENT
+    input_path = str(tmp_path / "input.npy")
+    output_path = str(tmp_path / "output.npy")
+    np.save(input_path, mask)
+    reach = engine.operation_reach(ELEMENT, operation)
+    tile_size = 2
+    assert tile_size < max(reach)
+    tiled.run_tiled(input_path, output_path, ELEMENT, operation, tile_size=tile_size,
+                    workers=1, backend="engine", stream=open(os.devnull, "w"))
+    expected = engine.apply_operation(mask, ELEMENT, operation)
+    np.testing.assert_array_equal(np.load(output_path), expected)
+
+
+def test_parallel_tiles_match_the_whole_image(tmp_path):
+    mask = np.random.default_rng(8).random((40, 33)) < 0.5
+    input_path = str(tmp_path / "input.npy")
+    output_path = str(tmp_path / "output.npy")
+    np.save(input_path, mask)
+    tiled.run_tiled(input_path, output_path, ELEMENT, "Closing", tile_size=4, workers=2,
+                    stream=open(os.devnull, "w"))
+    np.testing.assert_array_equal(np.load(output_path),
+                                  engine.apply_operation(mask, ELEMENT, "Closing"))
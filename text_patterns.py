@@ -0,0 +1,143 @@
+"""Render characters and strings as binary patterns from a 7x5 pixel font.
+
+Glyphs for 0-9 and A-Z are drawn once into an atlas; strings and whole
+batches of strings are then rendered by indexing into it, without Python
+loops over pixels or characters.
+"""
+import numpy as np
+
+
+# Rows of every glyph, top to bottom; "#" is a set pixel
+GLYPHS = {
+    "0": (".###.", "#...#", "#...#", "#...#", "#...#", "#...#", ".###."),
+    "1": (".##..", "..#..", "..#..", "..#..", "..#..", "..#..", ".##.."),
+    "2": ("#####", "....#", "....#", "#####", "#....", "#....", "#####"),
+    "3": ("#####", "....#", "....#", "#####", "....#", "....#", "#####"),
+    "4": ("#...#", "#...#", "#...#", "#####", "....#", "....#", "....#"),
+    "5": ("#####", "#....", "#....", "#####", "....#", "....#", "#####"),
+    "6": ("#####", "#....", "#....", "#####", "#...#", "#...#", "#####"),
+    "7": ("#####", "....#", "....#", "....#", "....#", "....#", "....#"),
+    "8": ("#####", "#...#", "#...#", "#####", "#...#", "#...#", "#####"),
+    "9": ("#####", "#...#", "#...#", "#####", "....#", "....#", "#####"),
+    "A": (".###.", "#...#", "#...#", "#####", "#...#", "#...#", "#...#"),
+    "B": ("####.", "#...#", "#...#", "####.", "#...#", "#...#", "####."),
+    "C": (".####", "#....", "#....", "#....", "#....", "#....", ".####"),
+    "D": ("####.", "#...#", "#...#", "#...#", "#...#", "#...#", "####."),
+    "E": ("#####", "#....", "#....", "#####", "#....", "#....", "#####"),
+    "F": ("#####", "#....", "#....", "#####", "#....", "#....", "#...."),
+    "G": (".####", "#....", "#....", "#..##", "#...#", "#...#", ".####"),
+    "H": ("#...#", "#...#", "#...#", "#####", "#...#", "#...#", "#...#"),
+    "I": ("#####", "..#..", "..#..", "..#..", "..#..", "..#..", "#####"),
+    "J": ("#####", "....#", "....#", "....#", "....#", "#...#", "#####"),
+    "K": ("##...", "#.#..", "#..#.", "#...#", "#..#.", "#.#..", "##..."),
+    "L": ("#....", "#....", "#....", "#....", "#....", "#....", "#####"),
+    "M": ("#.#.#", "#.#.#", "#.#.#", "#...#", "#...#", "#...#", "#...#"),
+    "N": ("#...#", "#...#", "##..#", "#.#.#", "#.#.#", "#..##", "#...#"),
+    "O": (".###.", "#...#", "#...#", "#...#", "#...#", "#...#", ".###."),
+    "P": ("#####", "#...#", "#...#", "#####", "#....", "#....", "#...."),
+    "Q": (".###.", "#...#", "#...#", "#...#", "#...#", "#..##", ".####"),
+    "R": ("#####", "#...#", "#...#", "#####", "##...", "#.#..", "#...#"),
+    "S": ("#####", "#....", "#....", "#####", "....#", "....#", "#####"),
+    "T": ("#####", "..#..", "..#..", "..#..", "..#..", "..#..", "..#.."),
+    "U": ("#...#", "#...#", "#...#", "#...#", "#...#", "#...#", ".###."),
+    "V": ("#...#", "#...#", ".#.#.", "..#..", "..#..", ".#.#.", "..#.."),
+    "W": ("#...#", "#...#", "#...#", "#.#.#", "#.#.#", "#.#.#", "#.#.#"),
+    "X": ("#...#", "#...#", ".#.#.", "..#..", "..#..", ".#.#.", "#...#"),
+    "Y": ("#...#", "#...#", ".#.#.", "..#..", "..#..", "..#..", "..#.."),
+    "Z": ("#####", "....#", "...#.", "..#..", "..#..", ".#...", "#####"),
+}
+
+
+class TextPatternGenerator:
+    # Characters with a glyph; everything else renders as a blank cell
+    characters = "".join(GLYPHS)
+
+    # Height and width of every glyph
+    font_size = (len(GLYPHS["0"]), len(GLYPHS["0"][0]))
+
+    # Atlas shared by every generator
+    _atlas = None
+
+    def __init__(self):
+        self._scaled = {}
+
+    def atlas(self):
+        """(glyphs, lookup): a bool (n, h, w) glyph stack and a byte -> glyph index table
+
+        Glyph 0 is blank. Lower-case letters share the upper-case glyphs and
+        unknown bytes map to the blank glyph. Built once from GLYPHS.
+        """
+        if TextPatternGenerator._atlas is None:
+            glyphs = np.zeros((len(self.characters) + 1,) + self.font_size, dtype=bool)
+            lookup = np.zeros(256, dtype=np.intp)
+            for index, char in enumerate(self.characters, start=1):
+                glyphs[index] = np.array([[pixel == "#" for pixel in row] for row in GLYPHS[char]])
+                lookup[ord(char)] = lookup[ord(char.lower())] = index
+            glyphs.setflags(write=False)
+            lookup.setflags(write=False)
+            TextPatternGenerator._atlas = (glyphs, lookup)
+        return TextPatternGenerator._atlas
+
+    def _cells(self, scale, spacing):
+        """Atlas scaled by an integer factor, each glyph followed by spacing blank columns"""
+        key = (scale, spacing)
+        if key not in self._scaled:
+            glyphs, _ = self.atlas()
+            cells = glyphs.repeat(scale, axis=1).repeat(scale, axis=2)
+            self._scaled[key] = np.pad(cells, ((0, 0), (0, 0), (0, spacing)))
+        return self._scaled[key]
+
+    def encode(self, texts):
+        """(N, L) glyph indices for N strings, padded with blanks to the longest"""
+        raw = np.array([text.encode("ascii", "replace") for text in texts], dtype=bytes)
+        if raw.dtype.itemsize == 0 or not len(raw):
+            return np.zeros((len(raw), 0), dtype=np.intp)
+        codes = raw.view(np.uint8).reshape(len(raw), raw.dtype.itemsize)
+        return self.atlas()[1][codes]
+
+    def render_batch(self, texts, canvas_size=None, scale=1, spacing=1):
+        """Render N strings into a bool (N, H, W) stack in one call
+
+        Glyphs are scaled by the integer ``scale`` and separated by ``spacing``
+        blank columns. Each string is centered on a canvas of ``canvas_size``
+        (rows, cols), cropped if it does not fit; without a canvas size the
+        stack is just tall and wide enough for the longest string, left-aligned.
+        """
+        if scale < 1 or spacing < 0:
+            raise ValueError("scale must be at least 1 and spacing not negative")
+        codes = self.encode(texts)
+        cells = self._cells(scale, spacing)
+        count, length = codes.shape
+        height, pitch = cells.shape[1], cells.shape[2]
+        # (N, L, H, pitch) -> (N, H, L * pitch): glyphs side by side on one line
+        lines = cells[codes].transpose(0, 2, 1, 3).reshape(count, height, length * pitch)
+        widths = np.maximum(np.char.str_len(np.array(texts, dtype=str)) * pitch - spacing, 0)
+
+        if canvas_size is None:
+            return lines[:, :, : int(widths.max(initial=0))].copy()
+
+        rows, cols = canvas_size
+        if not count:
+            return np.zeros((0, rows, cols), dtype=bool)
+        top = (rows - height) // 2
+        lefts = (cols - widths) // 2
+        # Pad so every string's canvas is one contiguous window of the padded lines
+        before = max(0, int(lefts.max(initial=0)))
+        starts = before - lefts
+        after = max(0, int((starts + cols).max(initial=0)) - (before + length * pitch))
+        above, below = max(0, top), max(0, rows - height - top)
+        padded = np.pad(lines, ((0, 0), (above, below), (before, after)))
+        first = above - top
+        windows = np.lib.stride_tricks.sliding_window_view(
+            padded[:, first : first + rows], cols, axis=2)
+        return np.ascontiguousarray(windows[np.arange(count), :, starts])
+
+    def render(self, text, canvas_size=None, scale=1, spacing=1):
+        """Render one string; see render_batch"""
+        return self.render_batch([text], canvas_size, scale, spacing)[0]
+
+    def generate_pattern(self, char, grid_size=(10, 10)):
+        """Single character centered in a grid_size float grid of 0s and 1s"""
+        if not char:
+            return np.zeros(grid_size)
+        return self.render(char[0], grid_size).astype(float)
@@ -0,0 +1,144 @@
+"""Run a morphological operation tile by tile on a memory-mapped mask larger than RAM.
+
+Example:
+    python tiled.py slide.npy slide_opened.npy --operation Opening --structure rect:31x31
+    python tiled.py raw.bin out.npy --shape 200000 150000 --dtype uint8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import backends
+import engine
+import structures
+
+
+# Set once per worker process by _init_worker
+_worker = {}
+
+
+def open_input(path, shape=None, dtype=np.uint8, offset=0):
+    """Memory-map a .npy file, or a headerless raw file of the given shape and dtype"""
+    if path.endswith(".npy"):
+        array = np.load(path, mmap_mode="r")
+    else:
+        if shape is None:
+            raise ValueError("raw input files need an explicit shape")
+        array = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=tuple(shape))
+    if array.ndim != 2:
+        raise ValueError(f"expected a 2-D mask, got shape {array.shape}")
+    return array
+
+
+def tile_windows(shape, tile_size):
+    """(row slice, col slice) of every tile covering shape, in row-major order"""
+    height, width = shape
+    for top in range(0, height, tile_size):
+        for left in range(0, width, tile_size):
+            yield (slice(top, min(top + tile_size, height)),
+                   slice(left, min(left + tile_size, width)))
+
+
+def process_tile(input_grid, output, structure, operation, window, backend="auto"):
+    """Compute one tile from a crop padded by the operation's reach
+
+    The padding is engine.operation_reach, i.e. twice the element radius for
+    opening and closing, which makes every tile match the full-image result.
+    """
+    def compute(crop, structure, operation):
+        return backends.apply_operation(crop, structure, operation, backend)
+
+    output[window] = engine.apply_to_window(input_grid, structure, operation, *window,
+                                            compute=compute)
+
+
+def _init_worker(input_spec, output_path, structure, operation, backend):
+    _worker["input"] = open_input(*input_spec)
+    _worker["output"] = np.load(output_path, mmap_mode="r+")
+    _worker["structure"] = structure
+    _worker["operation"] = operation
+    _worker["backend"] = backend
+
+
+def _run_worker_tile(window):
+    process_tile(_worker["input"], _worker["output"], _worker["structure"],
+                 _worker["operation"], window, _worker["backend"])
+    _worker["output"].flush()
+    return (window[0].stop - window[0].start) * (window[1].stop - window[1].start)
+
+
+def run_tiled(input_path, output_path, structure, operation, tile_size=4096,
+              workers=None, shape=None, dtype=np.uint8, offset=0, backend="auto",
+              calibrate=False, stream=sys.stderr):
+    """Apply operation to a memory-mapped input and write a boolean .npy memmap
+
+    Tiles run in parallel across processes; each worker maps the input and
+    output files itself and writes its disjoint tiles in place. Returns the
+    number of seconds taken.
+    """
+    if operation not in engine.OPERATIONS:
+        raise ValueError(f"unknown operation: {operation!r}")
+    if engine.operation_reach(structure, operation) is None:
+        raise ValueError(f"{operation} depends on the whole image and cannot be tiled")
+    input_spec = (input_path, shape, dtype, offset)
+    input_grid = open_input(*input_spec)
+    output = np.lib.format.open_memmap(output_path, mode="w+", dtype=bool, shape=input_grid.shape)
+    windows = list(tile_windows(input_grid.shape, tile_size))
+    workers = workers or os.cpu_count() or 1
+    if calibrate and backend == "auto":
+        # Calibrate once up front so every worker reads the same table from disk
+        backends.Dispatcher(calibrate=True, stream=stream).load()
+
+    start = time.perf_counter()
+    if workers == 1:
+        for window in windows:
+            process_tile(input_grid, output, structure, operation, window, backend)
+    else:
+        # Workers reopen the files; make sure the header and size are on disk first.
+        output.flush()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(input_spec, output_path, structure, operation,
+                                           backend)) as pool:
+            for _ in pool.map(_run_worker_tile, windows):
+                pass
+    output.flush()
+    del output
+
+    elapsed = time.perf_counter() - start
+    pixels = input_grid.shape[0] * input_grid.shape[1]
+    stream.write(f"done: {len(windows)} tiles, {pixels / max(elapsed, 1e-9) / 1e6:.1f} Mpx/s\n")
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help=".npy file or raw file (raw needs --shape)")
+    parser.add_argument("output", help="output .npy file, written as a boolean memmap")
+    parser.add_argument("--operation", default="Erosion", type=engine.operation_name,
+                        choices=sorted(engine.OPERATIONS))
+    parser.add_argument("--structure", default="rect:3x3",
+                        help='"rect:HxW", "cross:N", "diamond:R" or a .npy/.txt grid file')
+    parser.add_argument("--tile", type=int, default=4096, help="tile side in pixels")
+    parser.add_argument("--backend", default="auto", choices=["auto"] + sorted(backends.BACKENDS))
+    parser.add_argument("--calibrate", action="store_true",
+                        help="calibrate the auto backend first if no valid table is cached")
+    parser.add_argument("--workers", type=int, default=None, help="default: number of CPUs")
+    parser.add_argument("--shape", type=int, nargs=2, metavar=("ROWS", "COLS"),
+                        help="shape of a raw input file")
+    parser.add_argument("--dtype", default="uint8", help="dtype of a raw input file")
+    parser.add_argument("--offset", type=int, default=0, help="header bytes to skip in a raw file")
+    args = parser.parse_args(argv)
+
+    run_tiled(args.input, args.output, structures.from_spec(args.structure), args.operation,
+              tile_size=args.tile, workers=args.workers, shape=args.shape,
+              dtype=np.dtype(args.dtype), offset=args.offset, backend=args.backend,
+              calibrate=args.calibrate)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
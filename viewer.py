@@ -0,0 +1,322 @@
+"""Zoom and pan through masks far larger than the screen, e.g. 50k x 50k pixels.
+
+MaskViewport draws only the visible region, from the MaskPyramid level
+whose cells are closest to one screen pixel, so a frame costs about as many
+pixels as the widget has whatever the size of the mask. MaskViewer shows an
+input mask and its result side by side with linked views; cells can be
+toggled once zoomed in, and both pyramids are updated around the edit.
+
+Example:
+    python main.py --view slide.npy --operation Opening --structure rect:5x5
+"""
+import io
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from PyQt5.QtCore import QPointF, QRectF, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPainter
+from PyQt5.QtWidgets import QHBoxLayout, QLabel, QMainWindow, QVBoxLayout, QWidget
+
+import engine
+from main import ResultWorker
+from pyramid import MaskPyramid
+
+
+# 0xAARRGGBB per pyramid state: EMPTY white, PARTIAL gray, FULL black
+STATE_COLORS = np.array([0xFFFFFFFF, 0xFFA0A0A0, 0xFF000000], dtype=np.uint32)
+
+
+class MaskViewport(QWidget):
+    """Zoomable, pannable view of a MaskPyramid
+
+    The wheel zooms around the cursor, dragging pans, and a click on a cell
+    emits cellToggled once cells are at least edit_cell_size pixels wide.
+    viewChanged carries (scale, left, top): screen pixels per cell and the
+    cell coordinates of the top-left corner, for linking viewports.
+    """
+
+    viewChanged = pyqtSignal(float, float, float)
+    cellToggled = pyqtSignal(int, int)
+
+    max_scale = 64.0
+    edit_cell_size = 4
+    grid_line_cell_size = 6  # Same threshold as EnhancedGridWidget
+
+    def __init__(self, pyramid=None, editable=False):
+        super().__init__()
+        self.pyramid = pyramid
+        self.editable = editable
+        self.scale = 1.0
+        self.left = 0.0
+        self.top = 0.0
+        self.fitted = False
+        self.press_pos = None
+        self.last_pos = None
+        self._pixels = None
+        self.setMinimumSize(200, 200)
+
+    def setPyramid(self, pyramid):
+        self.pyramid = pyramid
+        if not self.fitted:
+            self.fitView()
+        self.update()
+
+    def fitView(self):
+        if self.pyramid is None or not self.width() or not self.height():
+            return
+        rows, cols = self.pyramid.shape
+        self.setView(min(self.width() / cols, self.height() / rows), 0.0, 0.0)
+        self.fitted = True
+        self.viewChanged.emit(self.scale, self.left, self.top)
+
+    def minScale(self):
+        if self.pyramid is None:
+            return 1e-6
+        rows, cols = self.pyramid.shape
+        return 0.25 * min(self.width() / cols, self.height() / rows)
+
+    def setView(self, scale, left, top):
+        self.scale = min(max(scale, self.minScale()), self.max_scale)
+        self.left = left
+        self.top = top
+        self.update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if not self.fitted:
+            self.fitView()
+
+    def cellAt(self, pos):
+        if self.pyramid is None:
+            return None
+        row = int(math.floor(self.top + pos.y() / self.scale))
+        col = int(math.floor(self.left + pos.x() / self.scale))
+        rows, cols = self.pyramid.shape
+        if 0 <= row < rows and 0 <= col < cols:
+            return row, col
+        return None
+
+    def wheelEvent(self, event):
+        # 120 units per notch; trackpads send smaller steps for smooth zooming
+        factor = 1.2 ** (event.angleDelta().y() / 120.0)
+        pos = event.pos()
+        anchor_col = self.left + pos.x() / self.scale
+        anchor_row = self.top + pos.y() / self.scale
+        scale = min(max(self.scale * factor, self.minScale()), self.max_scale)
+        self.setView(scale, anchor_col - pos.x() / scale, anchor_row - pos.y() / scale)
+        self.viewChanged.emit(self.scale, self.left, self.top)
+
+    def mousePressEvent(self, event):
+        if event.button() in (Qt.LeftButton, Qt.MiddleButton):
+            self.press_pos = self.last_pos = event.pos()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.last_pos is not None:
+            delta = event.pos() - self.last_pos
+            self.last_pos = event.pos()
+            self.setView(self.scale, self.left - delta.x() / self.scale,
+                         self.top - delta.y() / self.scale)
+            self.viewChanged.emit(self.scale, self.left, self.top)
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if self.press_pos is not None and event.button() == Qt.LeftButton:
+            moved = (event.pos() - self.press_pos).manhattanLength()
+            cell = self.cellAt(event.pos())
+            if (self.editable and moved < 3 and cell is not None
+                    and self.scale >= self.edit_cell_size):
+                self.cellToggled.emit(*cell)
+        self.press_pos = self.last_pos = None
+        super().mouseReleaseEvent(event)
+
+    def level(self):
+        """Pyramid level with cells closest to, but not smaller than, one screen pixel"""
+        if self.scale >= 1.0:
+            return 0
+        return min(int(math.floor(math.log2(1.0 / self.scale))), self.pyramid.top_level)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#ddd"))
+        if self.pyramid is None:
+            painter.drawText(self.rect(), Qt.AlignCenter, "Loading...")
+            painter.end()
+            return
+
+        level = self.level()
+        block = 1 << level
+        level_rows, level_cols = self.pyramid.level_shape(level)
+        right = self.left + self.width() / self.scale
+        bottom = self.top + self.height() / self.scale
+        first_row = max(0, int(math.floor(self.top / block)))
+        first_col = max(0, int(math.floor(self.left / block)))
+        last_row = min(level_rows, int(math.ceil(bottom / block)))
+        last_col = min(level_cols, int(math.ceil(right / block)))
+        if first_row < last_row and first_col < last_col:
+            states = self.pyramid.region(level, slice(first_row, last_row),
+                                         slice(first_col, last_col))
+            self._pixels = np.ascontiguousarray(STATE_COLORS[states])
+            height, width = self._pixels.shape
+            image = QImage(self._pixels.data, width, height, width * 4, QImage.Format_RGB32)
+            size = block * self.scale
+            target = QRectF((first_col * block - self.left) * self.scale,
+                            (first_row * block - self.top) * self.scale, width * size, height * size)
+            painter.drawImage(target, image)
+
+            if self.scale >= self.grid_line_cell_size:
+                self.paintGridLines(painter, first_row, last_row, first_col, last_col)
+        painter.end()
+
+    def paintGridLines(self, painter, first_row, last_row, first_col, last_col):
+        """Cell borders of the visible cells, only drawn at level 0"""
+        painter.setPen(QColor("gray"))
+        x0 = (first_col - self.left) * self.scale
+        x1 = (last_col - self.left) * self.scale
+        y0 = (first_row - self.top) * self.scale
+        y1 = (last_row - self.top) * self.scale
+        for row in range(first_row, last_row + 1):
+            y = (row - self.top) * self.scale
+            painter.drawLine(QPointF(x0, y), QPointF(x1, y))
+        for col in range(first_col, last_col + 1):
+            x = (col - self.left) * self.scale
+            painter.drawLine(QPointF(x, y0), QPointF(x, y1))
+
+
+def load_mask(path):
+    """.npy files are mapped copy-on-write: edits stay in memory and never reach the file"""
+    if path.endswith(".npy"):
+        mask = np.load(path, mmap_mode="c")
+    else:
+        import animation
+        mask = animation.load_grid(path)
+    if mask.ndim != 2:
+        raise ValueError(f"expected a 2-D mask, got shape {mask.shape}")
+    return mask
+
+
+class MaskViewer(QMainWindow):
+    """Input mask and its result in linked viewports
+
+    The input pyramid and the result are computed on background workers,
+    so the window is usable at once. Results of operations with a finite
+    reach are computed tile by tile into a temporary memory-mapped file
+    and patched around every edit; whole-image operations are recomputed.
+    """
+
+    def __init__(self, path, structure, operation, tile_size=4096):
+        super().__init__()
+        self.path = path
+        self.structure = np.asarray(structure) != 0
+        self.operation = operation
+        self.tile_size = tile_size
+        self.reach = engine.operation_reach(self.structure, operation)
+        self.input_grid = load_mask(path)
+        self.input_pyramid = None
+        self.result = None
+        self.result_pyramid = None
+        # Edits made while the result is being computed, applied when it arrives
+        self.pending_edits = []
+        self.scratch_dir = tempfile.mkdtemp(prefix="morphologic-")
+        self.input_worker = ResultWorker()
+        self.input_worker.resultReady.connect(self.onInputReady)
+        self.result_worker = ResultWorker()
+        self.result_worker.resultReady.connect(self.onResultReady)
+        self.initUI()
+        self.input_worker.submit(MaskPyramid, self.input_grid)
+        self.computeResult()
+
+    def initUI(self):
+        rows, cols = self.input_grid.shape
+        self.setWindowTitle(f"{os.path.basename(self.path)} ({rows} x {cols}), {self.operation}")
+        main_widget = QWidget()
+        layout = QHBoxLayout()
+        self.input_view = MaskViewport(editable=True)
+        self.result_view = MaskViewport()
+        for title, view in (("Input (scroll to zoom, drag to pan, click to toggle)", self.input_view),
+                            ("Result", self.result_view)):
+            panel = QVBoxLayout()
+            panel.addWidget(QLabel(title))
+            panel.addWidget(view, 1)
+            layout.addLayout(panel, 1)
+        main_widget.setLayout(layout)
+        self.setCentralWidget(main_widget)
+        self.resize(1200, 700)
+
+        self.input_view.viewChanged.connect(self.result_view.setView)
+        self.result_view.viewChanged.connect(self.input_view.setView)
+        self.input_view.viewChanged.connect(self.showStatus)
+        self.result_view.viewChanged.connect(self.showStatus)
+        self.input_view.cellToggled.connect(self.onCellToggled)
+        self.statusBar().showMessage("Computing result...")
+
+    def showStatus(self, *view):
+        level = self.input_view.level() if self.input_view.pyramid is not None else 0
+        state = "" if self.result_pyramid is not None else "  computing result..."
+        self.statusBar().showMessage(
+            f"zoom {self.input_view.scale:.4g} px/cell  level {level} ({1 << level} cells/px){state}")
+
+    def computeResult(self):
+        """Submit a full computation of the result; a newer one supersedes it"""
+        self.result_pyramid = None
+        self.result_worker.submit(self.buildResult, len(self.pending_edits))
+
+    def buildResult(self, edits_seen):
+        """(result, its pyramid, edits already included); runs on the worker thread"""
+        if self.reach is not None and self.path.endswith(".npy"):
+            import tiled
+            output = os.path.join(self.scratch_dir, "result.npy")
+            # One worker process: forking a process that runs Qt is not safe
+            tiled.run_tiled(self.path, output, self.structure, self.operation,
+                            tile_size=self.tile_size, workers=1, stream=io.StringIO())
+            result = np.load(output, mmap_mode="r+")
+            # Edits live in the copy-on-write input, not in the file tiled.py read
+            edits_seen = 0
+        else:
+            result = engine.apply_operation(np.asarray(self.input_grid), self.structure,
+                                            self.operation)
+        return result, MaskPyramid(result), edits_seen
+
+    def onInputReady(self, generation, future):
+        self.input_pyramid = future.result()
+        self.input_view.setPyramid(self.input_pyramid)
+        self.showStatus()
+
+    def onResultReady(self, generation, future):
+        if not self.result_worker.isCurrent(generation):
+            return
+        self.result, self.result_pyramid, edits_seen = future.result()
+        for row, col in self.pending_edits[edits_seen:]:
+            self.patchResult(row, col)
+        self.pending_edits.clear()
+        self.result_view.setPyramid(self.result_pyramid)
+        self.showStatus()
+
+    def onCellToggled(self, row, col):
+        self.input_grid[row, col] = not self.input_grid[row, col]
+        self.input_pyramid.update(slice(row, row + 1), slice(col, col + 1))
+        self.input_view.update()
+        if self.reach is None:
+            # Whole-image operations: recompute everything in the background
+            self.pending_edits.append((row, col))
+            self.computeResult()
+        elif self.result_pyramid is None:
+            self.pending_edits.append((row, col))
+        else:
+            self.patchResult(row, col)
+            self.result_view.update()
+
+    def patchResult(self, row, col):
+        window = engine.update_region(self.input_grid, self.structure, self.operation,
+                                      self.result, row, col)
+        self.result_pyramid.update(*window)
+
+    def closeEvent(self, event):
+        self.input_worker.shutdown()
+        self.result_worker.shutdown()
+        self.result = self.result_pyramid = None
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        super().closeEvent(event)